@@ -9,6 +9,7 @@ from PIL import Image, ImageOps
 
 import user_management_db as db
 from app_core.auth import LOGIN_FIELDS, build_authenticator, clear_auth_state
+from app_core.financeiro_mongo import ensure_finance_indexes, missing_finance_indexes
 from app_core.settings import branding_contrast_errors, get_default_branding, normalize_branding
 from app_core.ui import apply_branding, configure_page, money, render_hero, render_logo, render_sidebar
 
@@ -867,6 +868,31 @@ if st.session_state.get("role") == "admin":
         status_3.metric("Perfil atual", "Administrador")
         st.caption("As credenciais permanecem exclusivamente nos Secrets do Streamlit Cloud e não são exibidas nesta tela.")
 
+        with st.expander("Índices do MongoDB financeiro"):
+            st.caption(
+                "Os índices aceleram o Churn de Clientes e a detecção de mudanças no Financeiro. "
+                "A criação exige permissão de escrita e pode levar alguns minutos em coleções grandes."
+            )
+            check_col, create_col = st.columns(2)
+            if check_col.button("Verificar índices", width="stretch"):
+                try:
+                    missing = missing_finance_indexes()
+                except Exception as exc:
+                    st.error(f"Não foi possível consultar os índices: {exc}")
+                else:
+                    if missing:
+                        st.warning("Índices ausentes: " + ", ".join(missing))
+                    else:
+                        st.success("Todos os índices estão criados.")
+            if create_col.button("Criar índices ausentes", width="stretch"):
+                with st.spinner("Criando índices no MongoDB financeiro..."):
+                    created = ensure_finance_indexes()
+                if created:
+                    db.add_log(username, "Criou índices do MongoDB financeiro")
+                    st.success("Índices criados.")
+                else:
+                    st.error("Não foi possível criar os índices; verifique a permissão da conta do Financeiro.")
+
 else:
     st.markdown("---")
     with st.expander("Minha conta"):
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+log = logging.getLogger("SimuladorApp.audit")
+
+# Um lote é gravado ao juntar BATCH_SIZE eventos ou FLUSH_SECONDS após o
+# primeiro evento do lote, o que vier antes.
+BATCH_SIZE = 200
+FLUSH_SECONDS = 2.0
+QUEUE_SIZE = 10_000
+# Com a fila cheia, quem registra espera até PUT_TIMEOUT_SECONDS e o evento é
+# descartado; a página nunca fica presa esperando o banco.
+PUT_TIMEOUT_SECONDS = 0.25
+WRITE_ATTEMPTS = 3
+RETRY_SECONDS = 1.0
+
+
+def start_audit_writer(
+    write_batch: Callable[[list[dict[str, Any]]], int | None],
+    *,
+    batch_size: int = BATCH_SIZE,
+    flush_seconds: float = FLUSH_SECONDS,
+    queue_size: int = QUEUE_SIZE,
+    put_timeout: float = PUT_TIMEOUT_SECONDS,
+    retry_seconds: float = RETRY_SECONDS,
+) -> dict[str, Any]:
+    """Cria a fila de eventos e a thread que grava os lotes com ``write_batch``.
+
+    ``write_batch`` recebe a lista de eventos e pode devolver quantos deles
+    descartou (eventos inválidos); uma exceção faz o lote ser tentado de novo
+    até ``WRITE_ATTEMPTS`` vezes antes de ser descartado.
+    """
+    writer: dict[str, Any] = {
+        "queue": queue.Queue(maxsize=max(1, int(queue_size))),
+        "write_batch": write_batch,
+        "batch_size": max(1, int(batch_size)),
+        "flush_seconds": float(flush_seconds),
+        "put_timeout": float(put_timeout),
+        "retry_seconds": float(retry_seconds),
+        "lock": threading.Lock(),
+        "written": 0,
+        "dropped": 0,
+    }
+    writer["thread"] = threading.Thread(target=_run, args=(writer,), name="audit-log-writer", daemon=True)
+    writer["thread"].start()
+    return writer
+
+
+def enqueue_event(writer: dict[str, Any], event: dict[str, Any]) -> bool:
+    """Coloca o evento na fila; devolve ``False`` se ele foi descartado."""
+    try:
+        writer["queue"].put(event, timeout=writer["put_timeout"])
+        return True
+    except queue.Full:
+        with writer["lock"]:
+            writer["dropped"] += 1
+            dropped = writer["dropped"]
+        if dropped == 1 or dropped % 1_000 == 0:
+            log.warning("Fila de auditoria cheia; %d eventos descartados até agora.", dropped)
+        return False
+
+
+def flush_events(writer: dict[str, Any], timeout: float = 5.0) -> bool:
+    """Espera a gravação de tudo que já estava na fila (usado no encerramento)."""
+    done = threading.Event()
+    try:
+        writer["queue"].put(done, timeout=timeout)
+    except queue.Full:
+        return False
+    return done.wait(timeout)
+
+
+def _write(writer: dict[str, Any], batch: list[dict[str, Any]]) -> None:
+    for attempt in range(1, WRITE_ATTEMPTS + 1):
+        try:
+            discarded = int(writer["write_batch"](batch) or 0)
+        except Exception:
+            if attempt == WRITE_ATTEMPTS:
+                log.exception("Falha ao gravar %d eventos de auditoria; lote descartado.", len(batch))
+                with writer["lock"]:
+                    writer["dropped"] += len(batch)
+                return
+            time.sleep(writer["retry_seconds"] * attempt)
+        else:
+            with writer["lock"]:
+                writer["written"] += len(batch) - discarded
+                writer["dropped"] += discarded
+            return
+
+
+def _run(writer: dict[str, Any]) -> None:
+    events = writer["queue"]
+    while True:
+        batch: list[dict[str, Any]] = []
+        flushed: list[threading.Event] = []
+        item = events.get()
+        deadline = time.monotonic() + writer["flush_seconds"]
+        while True:
+            if isinstance(item, threading.Event):
+                flushed.append(item)
+                break
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= writer["batch_size"] or remaining <= 0:
+                break
+            try:
+                item = events.get(timeout=remaining)
+            except queue.Empty:
+                break
+        if batch:
+            _write(writer, batch)
+        for done in flushed:
+            done.set()
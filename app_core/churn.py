@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from app_core.financeiro_mongo import previous_period
+
+MOVEMENTS = ["Churn total", "Contração", "Estável", "Expansão", "Novo cliente", "Reativação", "Sem dados no mês", "Sem movimento"]
+CHURN_TOTAL = "Churn total"
+# Campos gravados por cliente e período, com o rótulo exibido na página.
+CLASSIFICATION_LABELS = {
+    "cliente": "Cliente",
+    "classificacao": "Classificação",
+    "receita_anterior": "Receita anterior",
+    "receita_atual": "Receita atual",
+    "delta_receita": "Δ Receita",
+    "delta_receita_pct": "Δ Receita %",
+    "veiculos_anterior": "Veículos anterior",
+    "veiculos_atual": "Veículos atual",
+    "delta_veiculos": "Δ Veículos",
+    "ativacoes": "Ativações",
+    "desativacoes": "Desativações",
+    "suspensoes": "Suspensões",
+    "qualidade": "Qualidade",
+}
+COUNT_FIELDS = ("veiculos_faturados", "veiculos_ativos_fim_mes", "ativacoes", "desativacoes", "suspensoes")
+TOTAL_FIELDS = ("receita", "veiculos_ativos_fim_mes", "ativacoes", "desativacoes", "suspensoes")
+# Período posterior a qualquer mês real, para clientes que nunca estiveram ativos.
+_NEVER_ACTIVE = "9999-99"
+
+
+def _numbers(values: pd.Series) -> np.ndarray:
+    numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    return np.where(np.isfinite(numbers), numbers, 0.0)
+
+
+def _texts(values: pd.Series, default: str = "") -> pd.Series:
+    texts = values.where(values.notna(), "").astype(str)
+    return texts.where(texts != "", default)
+
+
+def metrics_frame(raw_metrics: list[dict]) -> pd.DataFrame:
+    """Métricas mensais em colunas, uma linha por mês e cliente, ordenadas por mês.
+
+    Textos repetidos (mês, cliente, qualidade e origem) viram categorias, o que
+    mantém a tabela compacta e barata de copiar do cache.
+    """
+    columns = ["period_key", "cliente", "receita", "valor_total", *COUNT_FIELDS, "data_quality", "source"]
+    raw = pd.DataFrame.from_records(raw_metrics, columns=columns) if raw_metrics else pd.DataFrame(columns=columns)
+    # Registros sem o campo receita usam valor_total; receita nula vale zero.
+    has_revenue = np.fromiter(("receita" in item for item in raw_metrics), dtype=bool, count=len(raw_metrics))
+    frame = pd.DataFrame(
+        {
+            "period_key": _texts(raw["period_key"]),
+            "cliente": _texts(raw["cliente"]).str.strip(),
+            "receita": np.where(has_revenue, _numbers(raw["receita"]), _numbers(raw["valor_total"])),
+            **{field: np.round(_numbers(raw[field])).astype(np.int64) for field in COUNT_FIELDS},
+            "data_quality": _texts(raw["data_quality"], "não informado"),
+            "source": _texts(raw["source"], "analytics"),
+        }
+    )
+    frame = frame[frame["period_key"].ne("") & frame["cliente"].ne("")]
+    frame = frame.drop_duplicates(["period_key", "cliente"], keep="last").sort_values(["period_key", "cliente"])
+    for column in ("period_key", "cliente", "data_quality", "source"):
+        frame[column] = frame[column].astype("category")
+    return frame.reset_index(drop=True)
+
+
+def period_slices(frame: pd.DataFrame) -> dict[str, slice]:
+    """Posição das linhas de cada mês na tabela ordenada."""
+    periods = frame["period_key"].astype(str).to_numpy()
+    keys, starts = np.unique(periods, return_index=True)
+    ends = np.append(starts[1:], len(periods))
+    return {str(key): slice(int(start), int(end)) for key, start, end in zip(keys, starts, ends)}
+
+
+def monthly_totals(frame: pd.DataFrame) -> pd.DataFrame:
+    """Totais por mês, indexados pela chave do período."""
+    grouped = frame.assign(clientes_ativos=frame["veiculos_ativos_fim_mes"].gt(0).astype(np.int64)).groupby(
+        frame["period_key"].astype(str)
+    )
+    totals = grouped[[*TOTAL_FIELDS, "clientes_ativos"]].sum()
+    totals.index.name = "period_key"
+    return totals
+
+
+def is_closed_period(closure: dict | None) -> bool:
+    return str((closure or {}).get("status") or "").lower() == "closed"
+
+
+def period_signatures(frame: pd.DataFrame, closures: dict[str, dict]) -> dict[str, str]:
+    """Assinatura de cada mês para saber quais classificações estão desatualizadas.
+
+    Combina o conteúdo das métricas do mês, o status e o horário do fechamento
+    e a assinatura do mês anterior: a classificação depende de todo o
+    histórico até o mês, então qualquer alteração se propaga para os meses
+    seguintes.
+    """
+    if frame.empty:
+        return {}
+    content_columns = ["cliente", *TOTAL_FIELDS, "data_quality"]
+    row_hashes = pd.util.hash_pandas_object(frame[content_columns], index=False)
+    # Soma módulo 2**64: independe da ordem em que as métricas chegaram.
+    content = row_hashes.groupby(frame["period_key"].astype(str).to_numpy()).sum()
+    signatures: dict[str, str] = {}
+    previous = ""
+    for period in sorted(content.index):
+        closure = closures.get(period) or {}
+        stamp = closure.get("updated_at") or closure.get("closed_at") or ""
+        key = f"{previous}|{int(content[period]):016x}|{is_closed_period(closure)}|{stamp}"
+        previous = signatures[period] = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return signatures
+
+
+def build_metrics_model(raw_metrics: list[dict], closures: dict[str, dict]) -> dict[str, Any]:
+    """Modelo das métricas usado pela página de churn, montado uma vez por leitura.
+
+    ``frame`` traz as métricas ordenadas por mês; ``periods`` dá a fatia de
+    cada mês em O(1); ``first_active`` é o primeiro mês com veículos ativos de
+    cada cliente (pelo código da categoria); ``totals`` e ``signatures`` são os
+    totais e as assinaturas mensais.
+    """
+    frame = metrics_frame(raw_metrics)
+    active = frame[frame["veiculos_ativos_fim_mes"] > 0]
+    first_active = np.full(len(frame["cliente"].cat.categories), _NEVER_ACTIVE, dtype=object)
+    if not active.empty:
+        first = active.groupby(active["cliente"].cat.codes.to_numpy())["period_key"].first().astype(str)
+        first_active[first.index.to_numpy()] = first.to_numpy()
+    return {
+        "frame": frame,
+        "periods": period_slices(frame),
+        "first_active": first_active,
+        "totals": monthly_totals(frame),
+        "signatures": period_signatures(frame, closures),
+    }
+
+
+def period_metrics(model: dict[str, Any], period: str) -> pd.DataFrame:
+    rows = model["periods"].get(period)
+    return model["frame"].iloc[rows] if rows is not None else model["frame"].iloc[:0]
+
+
+def period_totals(model: dict[str, Any], period: str) -> dict[str, Any]:
+    """Totais de um mês com tipos nativos do Python; zeros se o mês não existe."""
+    totals = model["totals"]
+    if period not in totals.index:
+        return {"receita": 0.0, **{field: 0 for field in TOTAL_FIELDS[1:]}, "clientes_ativos": 0}
+    row = totals.loc[period]
+    return {column: float(row[column]) if column == "receita" else int(row[column]) for column in totals.columns}
+
+
+def _aligned(codes: np.ndarray, part: pd.DataFrame, column: str, fill) -> np.ndarray:
+    values = np.full(len(codes), fill, dtype=object if isinstance(fill, str) else type(fill))
+    if not part.empty:
+        values[np.searchsorted(codes, part["cliente"].cat.codes.to_numpy())] = part[column].to_numpy()
+    return values
+
+
+def classify_period(model: dict[str, Any], period: str, *, is_closed: bool) -> pd.DataFrame:
+    """Classificação de cada cliente presente no mês ou no mês anterior.
+
+    Clientes com veículos ativos que ficam sem veículos são churn total (ou
+    "Sem dados no mês" antes do fechamento); clientes sem veículos no mês
+    anterior que voltam a ter são reativação se já estiveram ativos antes
+    disso, ou cliente novo.
+    """
+    prior = previous_period(period)
+    current = period_metrics(model, period)
+    previous = period_metrics(model, prior)
+    # Categorias ordenadas: a ordem dos códigos é a ordem alfabética dos clientes.
+    codes = np.union1d(current["cliente"].cat.codes.to_numpy(), previous["cliente"].cat.codes.to_numpy())
+
+    current_active = _aligned(codes, current, "veiculos_ativos_fim_mes", 0)
+    previous_active = _aligned(codes, previous, "veiculos_ativos_fim_mes", 0)
+    current_revenue = _aligned(codes, current, "receita", 0.0)
+    previous_revenue = _aligned(codes, previous, "receita", 0.0)
+    both_active = (previous_active > 0) & (current_active > 0)
+    reactivated = model["first_active"][codes] < prior
+    classification = np.select(
+        [
+            (previous_active > 0) & (current_active <= 0),
+            (previous_active <= 0) & (current_active > 0) & reactivated,
+            (previous_active <= 0) & (current_active > 0),
+            both_active & ((current_active > previous_active) | (current_revenue > previous_revenue * 1.005)),
+            both_active & ((current_active < previous_active) | (current_revenue < previous_revenue * 0.995)),
+            both_active,
+        ],
+        [CHURN_TOTAL if is_closed else "Sem dados no mês", "Reativação", "Novo cliente", "Expansão", "Contração", "Estável"],
+        default="Sem movimento",
+    )
+    quality = _aligned(codes, current, "data_quality", "")
+    previous_quality = _aligned(codes, previous, "data_quality", "")
+    quality = np.where(quality != "", quality, np.where(previous_quality != "", previous_quality, "sem dados"))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        revenue_pct = np.where(previous_revenue > 0, (current_revenue / previous_revenue - 1) * 100, np.nan)
+    return pd.DataFrame(
+        {
+            "cliente": model["frame"]["cliente"].cat.categories.to_numpy()[codes].astype(object),
+            "classificacao": classification.astype(object),
+            "receita_anterior": previous_revenue,
+            "receita_atual": current_revenue,
+            "delta_receita": current_revenue - previous_revenue,
+            "delta_receita_pct": revenue_pct,
+            "veiculos_anterior": previous_active,
+            "veiculos_atual": current_active,
+            "delta_veiculos": current_active - previous_active,
+            "ativacoes": _aligned(codes, current, "ativacoes", 0),
+            "desativacoes": _aligned(codes, current, "desativacoes", 0),
+            "suspensoes": _aligned(codes, current, "suspensoes", 0),
+            "qualidade": quality.astype(object),
+        }
+    )
+
+
+def classification_documents(classified: pd.DataFrame) -> list[dict[str, Any]]:
+    """Linhas da classificação com ``row_hash``, para regravar só o que mudou."""
+    if classified.empty:
+        return []
+    hashes = pd.util.hash_pandas_object(classified.astype(str), index=False).map("{:016x}".format)
+    documents = classified.astype(object).where(classified.notna(), None)
+    return [{**row, "row_hash": row_hash} for row, row_hash in zip(documents.to_dict("records"), hashes)]
+
+
+def stale_periods(signatures: dict[str, str], stored: dict[str, str]) -> list[str]:
+    """Meses cuja classificação gravada não corresponde mais às métricas."""
+    return sorted(period for period, signature in signatures.items() if stored.get(period) != signature)
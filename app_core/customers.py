@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import re
+
+import numpy as np
+import pandas as pd
+
+EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+CLIENT_MARKER = r"Jurídica|Jurídico|Física|Físico"
+BASE_COLUMNS = ["Nome do Cliente", "CPF/CNPJ", "Tipo Cliente", "Telefone"]
+EMAIL_COLUMN_PREFIX = "E-mail Usuário"
+COLUMN_ALIASES = {
+    "razão social": "nome_cliente",
+    "nome do cliente": "nome_cliente",
+    "cnpj": "cpf_cnpj",
+    "cpf/cnpj": "cpf_cnpj",
+    "tipo cliente": "tipo_cliente",
+    "tipo de cliente": "tipo_cliente",
+    "tipo": "tipo_cliente",
+    "telefone": "telefone",
+    "fone": "telefone",
+}
+REQUIRED_COLUMNS = {"nome_cliente", "cpf_cnpj", "tipo_cliente"}
+
+
+def normalize_customer_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    """Remove colunas e linhas vazias e padroniza os nomes das colunas do relatório."""
+    frame = frame.loc[:, ~frame.columns.astype(str).str.contains(r"^Unnamed", na=False)]
+    frame = frame.dropna(axis="rows", how="all")
+    frame.columns = frame.columns.astype(str).str.strip().str.lower()
+    frame = frame.rename(columns=COLUMN_ALIASES)
+    missing = REQUIRED_COLUMNS - set(frame.columns)
+    if missing:
+        raise ValueError(f"Colunas obrigatórias não encontradas: {', '.join(sorted(missing))}.")
+    return frame
+
+
+def organize_customers(frame: pd.DataFrame) -> pd.DataFrame:
+    """Consolida o relatório em uma linha por cliente.
+
+    Cada cliente começa na linha cujo tipo indica Pessoa Física ou Jurídica;
+    as linhas seguintes trazem os e-mails dos usuários na coluna de CPF/CNPJ,
+    que viram as colunas ``E-mail Usuário N`` sem repetição.
+    """
+    types = frame["tipo_cliente"].astype(str).str.strip()
+    starts_client = types.str.contains(CLIENT_MARKER, case=False, na=False)
+    if not starts_client.any():
+        raise ValueError("Nenhum marcador de Pessoa Física ou Pessoa Jurídica foi encontrado na coluna de tipo.")
+
+    group_ids = starts_client.cumsum()
+    mains = frame[starts_client]
+    main_types = types[starts_client].str.lower()
+    result = pd.DataFrame(
+        {
+            "Nome do Cliente": mains["nome_cliente"].tolist(),
+            "CPF/CNPJ": mains["cpf_cnpj"].tolist(),
+            "Tipo Cliente": np.where(main_types.str.contains("fís|fis", regex=True), "Pessoa Física", "Pessoa Jurídica"),
+            "Telefone": mains["telefone"].tolist() if "telefone" in frame.columns else "",
+        }
+    )
+
+    # Só textos podem ser e-mail; a coluna pode vir numérica (CNPJs sem e-mails).
+    candidates = frame.loc[(group_ids > 0) & ~starts_client, "cpf_cnpj"].astype(object)
+    candidates = candidates.where(candidates.map(type).eq(str)).astype(object).str.strip()
+    valid = candidates.str.fullmatch(EMAIL_RE.pattern).eq(True)
+    emails = pd.DataFrame({"group": group_ids[valid.index[valid]], "email": candidates[valid].str.lower()})
+    emails = emails.drop_duplicates(["group", "email"])
+    if not emails.empty:
+        emails["position"] = emails.groupby("group").cumcount() + 1
+        wide = emails.pivot(index="group", columns="position", values="email")
+        wide.columns = [f"{EMAIL_COLUMN_PREFIX} {position}" for position in wide.columns]
+        result = result.join(wide.reindex(np.arange(1, len(result) + 1)).reset_index(drop=True))
+    return result
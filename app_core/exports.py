@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import importlib.util
+import io
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MIME = "text/csv"
+PARQUET_MIME = "application/vnd.apache.parquet"
+EXPORT_FORMATS = {
+    "xlsx": ("Excel (.xlsx)", XLSX_MIME),
+    "csv": ("CSV (.csv)", CSV_MIME),
+    "parquet": ("Parquet (.parquet)", PARQUET_MIME),
+}
+
+# Limite de linhas de uma aba do Excel, já descontado o cabeçalho.
+EXCEL_MAX_ROWS = 1_048_575
+# A partir deste volume a exportação sugere CSV no lugar do XLSX.
+LARGE_EXPORT_ROWS = 200_000
+WIDTH_SAMPLE_ROWS = 1_000
+MAX_COLUMN_WIDTH = 50
+# Linhas convertidas para objetos Python por vez ao gravar a planilha.
+WRITE_CHUNK_ROWS = 20_000
+
+
+@lru_cache(maxsize=1)
+def parquet_available() -> bool:
+    """Indica se há um mecanismo Parquet (``pyarrow`` ou ``fastparquet``) instalado."""
+    return any(importlib.util.find_spec(name) is not None for name in ("pyarrow", "fastparquet"))
+
+
+def export_formats(rows: int) -> list[str]:
+    """Formatos oferecidos para ``rows`` linhas, com o recomendado primeiro."""
+    formats = ["xlsx", "csv"] if rows < LARGE_EXPORT_ROWS else ["csv", "xlsx"]
+    if rows > EXCEL_MAX_ROWS:
+        formats.remove("xlsx")
+    if parquet_available():
+        formats.append("parquet")
+    return formats
+
+
+def estimate_column_widths(
+    frame: pd.DataFrame,
+    *,
+    sample_rows: int = WIDTH_SAMPLE_ROWS,
+    max_width: int = MAX_COLUMN_WIDTH,
+) -> list[int]:
+    """Largura das colunas a partir de uma amostra distribuída ao longo da tabela.
+
+    Considera o cabeçalho e o maior texto da amostra, com folga de dois
+    caracteres e limitada a ``max_width``.
+    """
+    if len(frame) > sample_rows:
+        sample = frame.iloc[np.unique(np.linspace(0, len(frame) - 1, sample_rows).astype(np.int64))]
+    else:
+        sample = frame
+    widths = []
+    for position, column in enumerate(frame.columns):
+        values = sample.iloc[:, position]
+        longest = values.where(values.notna(), "").astype(str).str.len().max() if len(values) else 0
+        widths.append(int(min(max(len(str(column)), longest) + 2, max_width)))
+    return widths
+
+
+def _column_values(values: pd.Series) -> list:
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def _write_rows(worksheet, frame: pd.DataFrame, formats: dict) -> None:
+    # No modo constant_memory as linhas precisam ser gravadas em ordem, uma
+    # única vez; cada bloco vira objetos Python só enquanto está sendo gravado.
+    row_number = 1
+    for start in range(0, len(frame), WRITE_CHUNK_ROWS):
+        chunk = frame.iloc[start : start + WRITE_CHUNK_ROWS]
+        columns = [_column_values(chunk.iloc[:, position]) for position in range(chunk.shape[1])]
+        for row in zip(*columns):
+            for column_number, value in enumerate(row):
+                if value is None:
+                    continue
+                kind = value.__class__
+                if kind is str:
+                    worksheet.write_string(row_number, column_number, value)
+                elif kind is int or kind is float:
+                    worksheet.write_number(row_number, column_number, value)
+                elif isinstance(value, datetime):
+                    worksheet.write_datetime(row_number, column_number, value, formats["datetime"])
+                elif isinstance(value, date):
+                    worksheet.write_datetime(row_number, column_number, value, formats["date"])
+                elif isinstance(value, time):
+                    worksheet.write_datetime(row_number, column_number, value, formats["time"])
+                elif isinstance(value, (bool, np.bool_)):
+                    worksheet.write_boolean(row_number, column_number, bool(value))
+                elif isinstance(value, (np.integer, np.floating)):
+                    worksheet.write_number(row_number, column_number, float(value))
+                else:
+                    worksheet.write_string(row_number, column_number, str(value))
+            row_number += 1
+
+
+def write_xlsx(
+    sheets: Iterable[tuple[str, pd.DataFrame]],
+    *,
+    column_width: int | None = None,
+    freeze_header: bool = False,
+    autofilter: bool = False,
+) -> bytes:
+    """Grava as abas ``(nome, tabela)`` em um XLSX no modo ``constant_memory``.
+
+    As linhas são descarregadas em disco à medida que são escritas, de modo
+    que o uso de memória não cresce com o tamanho da planilha. Sem
+    ``column_width``, a largura de cada coluna é estimada por amostragem.
+    Textos são gravados como texto, sem virar fórmula ou link.
+    """
+    import xlsxwriter
+
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "nan_inf_to_errors": True})
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    formats = {
+        "datetime": workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"}),
+        "date": workbook.add_format({"num_format": "yyyy-mm-dd"}),
+        "time": workbook.add_format({"num_format": "hh:mm:ss"}),
+    }
+    try:
+        for sheet_name, frame in sheets:
+            worksheet = workbook.add_worksheet(sheet_name)
+            if column_width is not None:
+                worksheet.set_column(0, max(0, frame.shape[1] - 1), column_width)
+            else:
+                for position, width in enumerate(estimate_column_widths(frame)):
+                    worksheet.set_column(position, position, width)
+            if freeze_header:
+                worksheet.freeze_panes(1, 0)
+            if autofilter:
+                worksheet.autofilter(0, 0, max(1, len(frame)), max(0, frame.shape[1] - 1))
+            for column_number, column in enumerate(frame.columns):
+                worksheet.write_string(0, column_number, str(column), header_format)
+            _write_rows(worksheet, frame, formats)
+    finally:
+        workbook.close()
+    return output.getvalue()
+
+
+def to_csv_bytes(frame: pd.DataFrame, *, sep: str = ";") -> bytes:
+    """CSV com BOM, para o Excel abrir acentos corretamente."""
+    return frame.to_csv(index=False, sep=sep).encode("utf-8-sig")
+
+
+def to_parquet_bytes(frame: pd.DataFrame) -> bytes:
+    if not parquet_available():
+        raise ValueError("Exportação em Parquet indisponível: instale o pacote pyarrow.")
+    output = io.BytesIO()
+    # Colunas com tipos mistos (texto e número) não têm tipo Parquet único.
+    frame.astype({column: str for column in frame.columns[frame.dtypes == object]}).where(
+        frame.notna(), None
+    ).to_parquet(output, index=False)
+    return output.getvalue()
+
+
+def export_frame(frame: pd.DataFrame, export_format: str, *, sheet_name: str) -> bytes:
+    """Exporta uma única tabela no formato escolhido (``xlsx``, ``csv`` ou ``parquet``)."""
+    if export_format == "xlsx":
+        return write_xlsx([(sheet_name, frame)])
+    if export_format == "csv":
+        return to_csv_bytes(frame)
+    if export_format == "parquet":
+        return to_parquet_bytes(frame)
+    raise ValueError(f"Formato de exportação desconhecido: {export_format}.")
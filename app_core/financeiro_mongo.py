@@ -4,15 +4,51 @@ import logging
 import math
 import os
 import re
+import threading
+import time
 import unicodedata
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Sequence
 
 import streamlit as st
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
 
 log = logging.getLogger("SimuladorApp.financeiro.mongo")
 DEFAULT_FINANCE_DB = "financeiro_verdio"
+# Os dados do Financeiro ficam em cache até mudarem (ver sync_finance_cache);
+# o TTL é só uma rede de segurança.
+FINANCE_CACHE_TTL = 12 * 60 * 60
+# Intervalo mínimo entre duas leituras da marca d'água das coleções.
+WATERMARK_POLL_SECONDS = 15
+# Sem ix_updated_at e sem change stream, a marca d'água só vê inclusões e
+# exclusões; os caches voltam a expirar neste prazo, como antes.
+FALLBACK_CACHE_SECONDS = 180
+# Espera para reabrir o change stream após uma falha (dobra até o máximo).
+WATCH_RETRY_SECONDS = 30
+WATCH_RETRY_MAX_SECONDS = 600
+WATCHED_COLLECTIONS = (
+    "billing_month_closures",
+    "billing_monthly_metrics",
+    "billing_terminal_snapshots",
+    "billing_history",
+)
+# Índices usados pelas consultas do Simulador: (coleção, nome, chaves).
+FINANCE_INDEXES = (
+    (
+        "billing_terminal_snapshots",
+        "ix_snapshots_period_client_run",
+        [("period_key", ASCENDING), ("cliente", ASCENDING), ("run_id", ASCENDING)],
+    ),
+    ("billing_monthly_metrics", "ix_metrics_period_client", [("period_key", ASCENDING), ("cliente", ASCENDING)]),
+    *((name, "ix_updated_at", [("updated_at", DESCENDING)]) for name in WATCHED_COLLECTIONS),
+)
+# Saúde da conexão: validade de um ping bem-sucedido e espera do circuito
+# aberto após falhas (dobra a cada falha seguida, até o máximo).
+HEALTH_TTL_SECONDS = 30
+CIRCUIT_BASE_SECONDS = 15
+CIRCUIT_MAX_SECONDS = 300
 
 MONTHS_PT = {
     "janeiro": 1,
@@ -175,6 +211,45 @@ def get_finance_db():
     return get_finance_client()[_finance_db_name()]
 
 
+# Campos lidos pela página de churn; o restante dos documentos não trafega.
+CLOSURE_FIELDS = ("period_key", "status", "closed_at", "updated_at")
+METRIC_FIELDS = (
+    "period_key",
+    "periodo_relatorio",
+    "cliente",
+    "receita",
+    "valor_total",
+    "veiculos_faturados",
+    "veiculos_ativos_fim_mes",
+    "ativacoes",
+    "desativacoes",
+    "suspensoes",
+    "data_quality",
+    "source_run_id",
+)
+TERMINAL_SNAPSHOT_FIELDS = (
+    "period_key",
+    "cliente",
+    "run_id",
+    "terminal",
+    "equipamento",
+    "placa",
+    "frota",
+    "modelo",
+    "tipo",
+    "condicao",
+    "categoria",
+    "data_ativacao",
+    "data_desativacao",
+    "suspenso_dias_mes",
+    "dias_a_faturar",
+    "valor_unitario",
+    "valor_faturado",
+)
+# Documentos por lote do cursor; o padrão do driver começa com só 101.
+STREAM_BATCH_SIZE = 5_000
+
+
 def _public(document: dict[str, Any]) -> dict[str, Any]:
     data = dict(document or {})
     if "_id" in data:
@@ -191,29 +266,225 @@ def _stream_collection(
     *,
     query: dict[str, Any] | None = None,
     sort: list[tuple[str, int]] | None = None,
+    fields: Sequence[str] | None = None,
+    batch_size: int = STREAM_BATCH_SIZE,
 ) -> list[dict[str, Any]]:
+    """Lê até ``limit`` documentos em lotes de ``batch_size``.
+
+    Com ``fields``, o servidor devolve só esses campos (sem ``_id``) e os
+    documentos chegam prontos, sem passar por ``_public``.
+    """
     db = get_finance_db()
     safe_limit = max(1, min(int(limit), 50_000))
-    cursor = db[collection_name].find(query or {})
+    projection = None if fields is None else {"_id": 0, **{field: 1 for field in fields}}
+    cursor = db[collection_name].find(query or {}, projection, batch_size=max(1, min(int(batch_size), safe_limit)))
     if sort:
         cursor = cursor.sort(sort)
     cursor = cursor.limit(safe_limit)
+    if fields is not None:
+        return list(cursor)
     return [_public(document) for document in cursor]
 
 
-@st.cache_data(ttl=180, show_spinner=False)
+@st.cache_data(ttl=FINANCE_CACHE_TTL, show_spinner=False)
 def get_month_closures(limit: int = 240) -> list[dict[str, Any]]:
     try:
-        return _stream_collection("billing_month_closures", limit)
+        return _stream_collection("billing_month_closures", limit, fields=CLOSURE_FIELDS)
     except Exception:
         log.exception("Falha ao buscar fechamentos mensais no MongoDB.")
         return []
 
 
-@st.cache_data(ttl=180, show_spinner=False)
+# Categorias de itens_detalhados, comparadas sem acento e sem diferenciar
+# maiúsculas; as classes cobrem as formas acentuadas e a acentuação decomposta.
+_COMBINING = "[\u0300-\u036f]*"
+ACTIVATED_PATTERN = f"ativado no m[eéêèëEÉÊÈË]{_COMBINING}s|ativado e desativado"
+DEACTIVATED_PATTERN = r"^\s*desativado\s*$|ativado e desativado"
+SUSPENDED_PATTERN = r"^\s*suspenso\s*$"
+SUSPENDED_DAYS_FIELDS = ("Suspenso Dias Mes", "Suspenso Dias Mês")
+LEGACY_SUMMARY_FIELDS = (
+    "period_key",
+    "periodo_relatorio",
+    "cliente",
+    "valor_total",
+    "terminais_cheio",
+    "terminais_proporcional",
+    "terminais_suspensos",
+)
+
+
+def _matches(text: dict[str, Any], pattern: str) -> dict[str, Any]:
+    return {"$regexMatch": {"input": text, "regex": pattern, "options": "i"}}
+
+
+def _as_number(value: Any) -> dict[str, Any]:
+    """Expressão equivalente a ``_safe_float`` para números e textos como ``"1.234,5"``."""
+    text = {
+        "$replaceAll": {
+            "input": {"$replaceAll": {"input": {"$trim": {"input": value}}, "find": "R$", "replacement": ""}},
+            "find": " ",
+            "replacement": "",
+        }
+    }
+    decimal_comma = {
+        "$replaceAll": {
+            "input": {"$replaceAll": {"input": "$$text", "find": ".", "replacement": ""}},
+            "find": ",",
+            "replacement": ".",
+        }
+    }
+    return {
+        "$cond": [
+            {"$eq": [{"$type": value}, "string"]},
+            {
+                "$let": {
+                    "vars": {"text": text},
+                    "in": {
+                        "$convert": {
+                            "input": {"$cond": [{"$gte": [{"$indexOfCP": ["$$text", ","]}, 0]}, decimal_comma, "$$text"]},
+                            "to": "double",
+                            "onError": 0,
+                            "onNull": 0,
+                        }
+                    },
+                }
+            },
+            {"$convert": {"input": value, "to": "double", "onError": 0, "onNull": 0}},
+        ]
+    }
+
+
+def _legacy_history_pipeline(limit: int) -> list[dict[str, Any]]:
+    """Resume ``billing_history`` no servidor, sem trafegar ``itens_detalhados``.
+
+    Cada documento vira as contagens de ativações, desativações e suspensões
+    calculadas com ``$reduce``; o ``$group`` mantém o primeiro registro de cada
+    período e cliente, como a leitura sequencial fazia.
+    """
+    first_days, second_days = (f"$$item.{field}" for field in SUSPENDED_DAYS_FIELDS)
+    suspended_days = {
+        "$cond": [
+            {"$in": [{"$ifNull": [first_days, None]}, [None, 0, "", False]]},
+            second_days,
+            first_days,
+        ]
+    }
+    category = {"$convert": {"input": "$$item.Categoria", "to": "string", "onError": "", "onNull": ""}}
+    counts = {
+        "$reduce": {
+            "input": "$$details",
+            "initialValue": {"ativacoes": 0, "desativacoes": 0, "suspensoes": 0},
+            "in": {
+                "$let": {
+                    "vars": {"item": "$$this"},
+                    "in": {
+                        "$let": {
+                            "vars": {"category": category},
+                            "in": {
+                                "ativacoes": {
+                                    "$add": ["$$value.ativacoes", {"$cond": [_matches("$$category", ACTIVATED_PATTERN), 1, 0]}]
+                                },
+                                "desativacoes": {
+                                    "$add": [
+                                        "$$value.desativacoes",
+                                        {"$cond": [_matches("$$category", DEACTIVATED_PATTERN), 1, 0]},
+                                    ]
+                                },
+                                "suspensoes": {
+                                    "$add": [
+                                        "$$value.suspensoes",
+                                        {
+                                            "$cond": [
+                                                {
+                                                    "$or": [
+                                                        _matches("$$category", SUSPENDED_PATTERN),
+                                                        # round() do Python: só acima de 0,5 arredonda para 1 ou mais.
+                                                        {"$gt": [_as_number(suspended_days), 0.5]},
+                                                    ]
+                                                },
+                                                1,
+                                                0,
+                                            ]
+                                        },
+                                    ]
+                                },
+                            },
+                        }
+                    },
+                }
+            },
+        }
+    }
+    summary = {
+        "$let": {
+            "vars": {"details": {"$cond": [{"$isArray": "$itens_detalhados"}, "$itens_detalhados", []]}},
+            "in": {"$mergeObjects": [counts, {"itens": {"$size": "$$details"}}]},
+        }
+    }
+    return [
+        {"$limit": max(1, min(int(limit), 50_000))},
+        {"$project": {"_id": 1, **{field: 1 for field in LEGACY_SUMMARY_FIELDS}, "resumo": summary}},
+        {
+            "$group": {
+                "_id": {"period_key": "$period_key", "periodo_relatorio": "$periodo_relatorio", "cliente": "$cliente"},
+                "ordem": {"$first": "$_id"},
+                **{field: {"$first": f"${field}"} for field in LEGACY_SUMMARY_FIELDS},
+                "resumo": {"$first": "$resumo"},
+            }
+        },
+        {"$sort": {"ordem": 1}},
+        {"$project": {"_id": 0, "ordem": 0}},
+    ]
+
+
+def _legacy_history_summaries(limit: int) -> list[dict[str, Any]]:
+    collection = get_finance_db()["billing_history"]
+    return list(collection.aggregate(_legacy_history_pipeline(limit), allowDiskUse=True))
+
+
+def legacy_history_metric(summary: dict[str, Any]) -> dict[str, Any] | None:
+    """Métrica mensal no formato de ``billing_monthly_metrics`` a partir do resumo legado."""
+    period_key = _safe_text(summary.get("period_key")) or period_key_from_label(
+        summary.get("periodo_relatorio", "")
+    )
+    cliente = _safe_text(summary.get("cliente"))
+    if not period_key or not cliente:
+        return None
+
+    counts = summary.get("resumo") or {}
+    items = _safe_int(counts.get("itens"))
+    deactivations = _safe_int(counts.get("desativacoes"))
+    if items:
+        active_end = items - deactivations
+    else:
+        active_end = (
+            _safe_int(summary.get("terminais_cheio"))
+            + _safe_int(summary.get("terminais_proporcional"))
+            + _safe_int(summary.get("terminais_suspensos"))
+        )
+
+    return {
+        "period_key": period_key,
+        "periodo_relatorio": summary.get("periodo_relatorio") or period_display(period_key),
+        "cliente": cliente,
+        "receita": _safe_float(summary.get("valor_total")),
+        "veiculos_faturados": items if items else max(active_end, 0),
+        "veiculos_ativos_fim_mes": max(active_end, 0),
+        "ativacoes": _safe_int(counts.get("ativacoes")),
+        "desativacoes": deactivations,
+        "suspensoes": _safe_int(counts.get("suspensoes")),
+        "terminais_cheio": _safe_int(summary.get("terminais_cheio")),
+        "terminais_proporcional": _safe_int(summary.get("terminais_proporcional")),
+        "terminais_suspensos": _safe_int(summary.get("terminais_suspensos")),
+        "data_quality": "historico_detalhado" if items else "resumo_legado",
+        "source": "billing_history_mongo",
+    }
+
+
+@st.cache_data(ttl=FINANCE_CACHE_TTL, show_spinner=False)
 def get_monthly_metrics(limit: int = 30_000) -> list[dict[str, Any]]:
     try:
-        metrics = _stream_collection("billing_monthly_metrics", limit)
+        metrics = _stream_collection("billing_monthly_metrics", limit, fields=METRIC_FIELDS)
     except Exception:
         log.exception("Falha ao buscar métricas analíticas no MongoDB.")
         metrics = []
@@ -221,8 +492,9 @@ def get_monthly_metrics(limit: int = 30_000) -> list[dict[str, Any]]:
     # Compatibilidade: enquanto o primeiro lote ainda não criou as projeções,
     # aproveita billing_history. Após os novos uploads, analytics prevalece.
     try:
-        history = _stream_collection("billing_history", limit)
+        history = _legacy_history_summaries(limit)
     except Exception:
+        log.exception("Falha ao resumir billing_history no MongoDB.")
         history = []
 
     by_key: dict[tuple[str, str], dict[str, Any]] = {}
@@ -240,58 +512,96 @@ def get_monthly_metrics(limit: int = 30_000) -> list[dict[str, Any]]:
         normalized["source"] = "analytics_mongo"
         by_key[(period_key, cliente)] = normalized
 
-    for record in history:
-        period_key = _safe_text(record.get("period_key")) or period_key_from_label(
-            record.get("periodo_relatorio", "")
-        )
-        cliente = _safe_text(record.get("cliente"))
-        key = (period_key, cliente)
-        if not period_key or not cliente or key in by_key:
+    for summary in history:
+        metric = legacy_history_metric(summary)
+        if metric is None:
             continue
-
-        details = record.get("itens_detalhados")
-        details = details if isinstance(details, list) else []
-        activations = deactivations = suspensions = active_end = 0
-        for detail in details:
-            category = _strip_accents(_safe_text(detail.get("Categoria"))).lower()
-            activated = "ativado no mes" in category or "ativado e desativado" in category
-            deactivated = category == "desativado" or "ativado e desativado" in category
-            suspended = category == "suspenso" or _safe_int(
-                detail.get("Suspenso Dias Mes") or detail.get("Suspenso Dias Mês")
-            ) > 0
-            activations += int(activated)
-            deactivations += int(deactivated)
-            suspensions += int(suspended)
-            active_end += int(not deactivated)
-
-        if not details:
-            active_end = (
-                _safe_int(record.get("terminais_cheio"))
-                + _safe_int(record.get("terminais_proporcional"))
-                + _safe_int(record.get("terminais_suspensos"))
-            )
-
-        by_key[key] = {
-            "period_key": period_key,
-            "periodo_relatorio": record.get("periodo_relatorio") or period_display(period_key),
-            "cliente": cliente,
-            "receita": _safe_float(record.get("valor_total")),
-            "veiculos_faturados": len(details) if details else max(active_end, 0),
-            "veiculos_ativos_fim_mes": max(active_end, 0),
-            "ativacoes": activations,
-            "desativacoes": deactivations,
-            "suspensoes": suspensions,
-            "terminais_cheio": _safe_int(record.get("terminais_cheio")),
-            "terminais_proporcional": _safe_int(record.get("terminais_proporcional")),
-            "terminais_suspensos": _safe_int(record.get("terminais_suspensos")),
-            "data_quality": "historico_detalhado" if details else "resumo_legado",
-            "source": "billing_history_mongo",
-        }
+        by_key.setdefault((metric["period_key"], metric["cliente"]), metric)
 
     return list(by_key.values())
 
 
-@st.cache_data(ttl=180, show_spinner=False)
+def missing_finance_indexes() -> list[str]:
+    """Índices de ``FINANCE_INDEXES`` ausentes, como ``coleção.índice``."""
+    db = get_finance_db()
+    return [
+        f"{collection}.{name}"
+        for collection, name, _keys in FINANCE_INDEXES
+        if name not in db[collection].index_information()
+    ]
+
+
+def ensure_finance_indexes() -> bool:
+    """Cria os índices das consultas do Simulador, se a conta tiver permissão.
+
+    Ação de administração (aba Ambiente): a criação pode demorar em coleções
+    grandes e nunca roda ao abrir uma página. O banco pertence ao Financeiro;
+    sem permissão de escrita as consultas continuam funcionando, apenas sem
+    o índice.
+    """
+    try:
+        db = get_finance_db()
+        for collection, name, keys in FINANCE_INDEXES:
+            db[collection].create_index(keys, name=name)
+        return True
+    except PyMongoError as exc:
+        log.warning("Índices do MongoDB financeiro não criados: %s", exc)
+        return False
+
+
+@st.cache_data(ttl=FINANCE_CACHE_TTL, show_spinner=False)
+def get_latest_run_ids(period_key: str) -> dict[str, str]:
+    """Execução (``source_run_id``) mais recente de cada cliente no período.
+
+    Métricas antigas sem ``period_key`` entram pelo ``periodo_relatorio``,
+    como em ``get_monthly_metrics``.
+    """
+    if not period_key:
+        return {}
+    try:
+        metrics = _stream_collection(
+            "billing_monthly_metrics",
+            50_000,
+            query={
+                "source_run_id": {"$nin": [None, ""]},
+                "$or": [{"period_key": period_key}, {"period_key": {"$in": [None, ""]}}],
+            },
+            fields=("period_key", "periodo_relatorio", "cliente", "source_run_id"),
+        )
+    except Exception:
+        log.exception("Falha ao buscar as execuções do período %s.", period_key)
+        return {}
+    return {
+        _safe_text(item.get("cliente")): _safe_text(item.get("source_run_id"))
+        for item in metrics
+        if _safe_text(item.get("source_run_id"))
+        and (_safe_text(item.get("period_key")) or period_key_from_label(item.get("periodo_relatorio", ""))) == period_key
+    }
+
+
+@st.cache_data(ttl=FINANCE_CACHE_TTL, show_spinner=False)
+def get_client_terminal_snapshots(period_key: str, cliente: str, limit: int = 30_000) -> list[dict[str, Any]]:
+    """Terminais de um único cliente no período, só da execução mais recente.
+
+    Usa o índice ``(period_key, cliente, run_id)``: apenas os terminais do
+    cliente trafegam. O nome é comparado sem os espaços das pontas, como nas
+    métricas; a busca percorre só as chaves do índice daquele período.
+    """
+    cliente = _safe_text(cliente)
+    if not period_key or not cliente:
+        return []
+    query: dict[str, Any] = {"period_key": period_key, "cliente": {"$regex": rf"^\s*{re.escape(cliente)}\s*$"}}
+    run_id = get_latest_run_ids(period_key).get(cliente)
+    if run_id:
+        query["run_id"] = run_id
+    try:
+        return _stream_collection("billing_terminal_snapshots", limit, query=query, fields=TERMINAL_SNAPSHOT_FIELDS)
+    except Exception:
+        log.exception("Falha ao buscar snapshots MongoDB de %s no período %s.", cliente, period_key)
+        return []
+
+
+@st.cache_data(ttl=FINANCE_CACHE_TTL, show_spinner=False)
 def get_terminal_snapshots(period_key: str, limit: int = 30_000) -> list[dict[str, Any]]:
     if not period_key:
         return []
@@ -300,14 +610,10 @@ def get_terminal_snapshots(period_key: str, limit: int = 30_000) -> list[dict[st
             "billing_terminal_snapshots",
             limit,
             query={"period_key": period_key},
+            fields=TERMINAL_SNAPSHOT_FIELDS,
         )
 
-        latest_runs = {
-            _safe_text(item.get("cliente")): _safe_text(item.get("source_run_id"))
-            for item in get_monthly_metrics()
-            if _safe_text(item.get("period_key")) == period_key
-            and _safe_text(item.get("source_run_id"))
-        }
+        latest_runs = get_latest_run_ids(period_key)
         if latest_runs:
             result = [
                 item
@@ -325,21 +631,141 @@ def get_terminal_snapshots(period_key: str, limit: int = 30_000) -> list[dict[st
 def clear_finance_cache() -> None:
     get_month_closures.clear()
     get_monthly_metrics.clear()
+    get_latest_run_ids.clear()
+    get_client_terminal_snapshots.clear()
     get_terminal_snapshots.clear()
 
 
-def connection_diagnostics() -> dict[str, Any]:
+def finance_watermark() -> tuple[tuple[str, int, Any, bool], ...]:
+    """Marca d'água barata dos dados do Financeiro.
+
+    Para cada coleção lida pelo Simulador: a contagem estimada (metadado da
+    coleção, percebe exclusões), o maior ``updated_at`` (uma leitura pelo
+    índice ``ix_updated_at``, percebe inclusões e alterações) e se o índice
+    existe. Sem o índice (a conta somente leitura não o cria), a ordenação
+    varreria a coleção inteira; nesse caso vale só a contagem.
+    """
+    db = get_finance_db()
+    marks = []
+    for name in WATCHED_COLLECTIONS:
+        collection = db[name]
+        latest = None
+        indexed = _has_updated_at_index(collection)
+        if indexed:
+            latest = collection.find_one({}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", DESCENDING)])
+        marks.append((name, collection.estimated_document_count(), (latest or {}).get("updated_at"), indexed))
+    return tuple(marks)
+
+
+def _has_updated_at_index(collection: Collection) -> bool:
     try:
-        client = get_finance_client()
-        client.admin.command("ping")
-        db = get_finance_db()
-        return {
-            "ok": True,
-            "database": db.name,
-            "billing_history": db["billing_history"].estimated_document_count(),
-            "billing_monthly_metrics": db["billing_monthly_metrics"].estimated_document_count(),
-            "checked_at": datetime.now(timezone.utc),
-        }
+        return "ix_updated_at" in collection.index_information()
+    except PyMongoError:
+        return False
+
+
+@st.cache_resource(show_spinner=False)
+def _finance_cache_state() -> dict[str, Any]:
+    return {
+        "lock": threading.Lock(),
+        "watermark": None,
+        "checked_at": None,
+        "cleared_at": None,
+        "events": 0,
+        "events_seen": 0,
+        "stream_live": False,
+        "version": 0,
+    }
+
+
+@st.cache_resource(show_spinner=False)
+def _start_change_watcher() -> threading.Thread:
+    """Acompanha as coleções por change stream, quando o servidor oferece.
+
+    Cada alteração só marca o estado; a limpeza acontece na próxima chamada de
+    ``sync_finance_cache``. Em servidor standalone, sem permissão ou se o
+    stream cair, vale a marca d'água enquanto a thread espera para reabrir o
+    stream, com espera crescente até ``WATCH_RETRY_MAX_SECONDS``.
+    """
+    state = _finance_cache_state()
+    db = get_finance_db()
+
+    def watch() -> None:
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}}]
+        failures = 0
+        while True:
+            try:
+                with db.watch(pipeline) as stream:
+                    with state["lock"]:
+                        # Ao reabrir, o que mudou durante a queda não chegou por evento.
+                        if failures:
+                            state["events"] += 1
+                        state["stream_live"] = True
+                    failures = 0
+                    for _change in stream:
+                        with state["lock"]:
+                            state["events"] += 1
+            except PyMongoError as exc:
+                failures += 1
+                if failures == 1:
+                    log.info("Change streams indisponíveis no MongoDB financeiro; usando a marca d'água: %s", exc)
+            else:
+                failures += 1
+            with state["lock"]:
+                state["stream_live"] = False
+            time.sleep(min(WATCH_RETRY_SECONDS * 2 ** (failures - 1), WATCH_RETRY_MAX_SECONDS))
+
+    thread = threading.Thread(target=watch, name="financeiro-change-stream", daemon=True)
+    thread.start()
+    return thread
+
+
+def sync_finance_cache() -> int:
+    """Limpa os caches do Financeiro se os dados mudaram e devolve a versão atual.
+
+    A marca d'água é relida no máximo a cada ``WATERMARK_POLL_SECONDS`` (ou
+    logo após um evento do change stream). Se nem o change stream nem o
+    índice de ``updated_at`` estão disponíveis, alterações no lugar passariam
+    despercebidas: os caches expiram a cada ``FALLBACK_CACHE_SECONDS``.
+    Caches derivados fora deste módulo devem usar a versão devolvida como
+    parte da chave.
+    """
+    state = _finance_cache_state()
+    try:
+        _start_change_watcher()
+    except Exception:
+        log.exception("Falha ao iniciar o change stream do MongoDB financeiro.")
+    with state["lock"]:
+        now = time.monotonic()
+        notified = state["events"] != state["events_seen"]
+        if not notified and state["checked_at"] is not None and now - state["checked_at"] < WATERMARK_POLL_SECONDS:
+            return state["version"]
+        state["events_seen"] = state["events"]
+        state["checked_at"] = now
+        previous = state["watermark"]
+    # A leitura fica fora da trava: quem chegar enquanto isso usa a versão atual.
+    try:
+        watermark = finance_watermark()
+    except Exception:
+        log.exception("Falha ao ler a marca d'água do MongoDB financeiro.")
+        watermark = previous
+    with state["lock"]:
+        blind = not state["stream_live"] and (watermark is None or not all(mark[-1] for mark in watermark))
+        if state["cleared_at"] is None:
+            state["cleared_at"] = now
+        expired = blind and now - state["cleared_at"] >= FALLBACK_CACHE_SECONDS
+        if notified or expired or (state["watermark"] is not None and watermark != state["watermark"]):
+            state["version"] += 1
+            state["cleared_at"] = now
+            clear_finance_cache()
+        state["watermark"] = watermark
+        return state["version"]
+
+
+def _probe_connection() -> dict[str, Any]:
+    try:
+        get_finance_client().admin.command("ping")
+        return {"ok": True, "database": _finance_db_name(), "checked_at": datetime.now(timezone.utc)}
     except Exception as exc:
         return {
             "ok": False,
@@ -348,3 +774,55 @@ def connection_diagnostics() -> dict[str, Any]:
             "error": str(exc)[:1200],
             "checked_at": datetime.now(timezone.utc),
         }
+
+
+@st.cache_resource(show_spinner=False)
+def _health_state() -> dict[str, Any]:
+    return {"lock": threading.Lock(), "result": None, "failures": 0, "retry_at": 0.0, "probing": False}
+
+
+def _record_probe(state: dict[str, Any], result: dict[str, Any]) -> None:
+    now = time.monotonic()
+    with state["lock"]:
+        state["result"] = result
+        state["probing"] = False
+        if result["ok"]:
+            state["failures"] = 0
+            state["retry_at"] = now + HEALTH_TTL_SECONDS
+        else:
+            state["failures"] += 1
+            state["retry_at"] = now + min(CIRCUIT_BASE_SECONDS * 2 ** (state["failures"] - 1), CIRCUIT_MAX_SECONDS)
+
+
+def _probe_in_background(state: dict[str, Any]) -> None:
+    thread = threading.Thread(
+        target=lambda: _record_probe(state, _probe_connection()),
+        name="financeiro-health",
+        daemon=True,
+    )
+    thread.start()
+
+
+def connection_diagnostics() -> dict[str, Any]:
+    """Saúde da conexão com o MongoDB financeiro, sem travar a página.
+
+    Só a primeira chamada do processo espera o ``ping``. Depois, devolve o
+    último resultado e renova em segundo plano: um resultado bom vale
+    ``HEALTH_TTL_SECONDS``; após falhas o circuito fica aberto por um intervalo
+    que dobra a cada falha (até ``CIRCUIT_MAX_SECONDS``) e a falha anterior é
+    devolvida na hora, sem esperar o ``serverSelectionTimeoutMS``.
+    """
+    state = _health_state()
+    with state["lock"]:
+        result = state["result"]
+        failures = state["failures"]
+        renew = result is not None and time.monotonic() >= state["retry_at"] and not state["probing"]
+        if renew:
+            state["probing"] = True
+    if result is None:
+        result = _probe_connection()
+        _record_probe(state, result)
+        return {**result, "failures": state["failures"]}
+    if renew:
+        _probe_in_background(state)
+    return {**result, "failures": failures}
@@ -0,0 +1,458 @@
+from __future__ import annotations
+
+import csv
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, time, timedelta
+from typing import BinaryIO, Iterator
+
+import numpy as np
+import pandas as pd
+
+from app_core.spreadsheet import read_excel_sheet
+
+# Posição das colunas no relatório "Jornada de motorista" exportado pela
+# plataforma. A coluna 1 alterna entre o nome do motorista e o dia do mês.
+DAY_COLUMN = 1
+JOURNEY_COLUMNS: dict[int, str] = {
+    2: "Semana",
+    3: "Início da jornada",
+    4: "Fim da jornada",
+    5: "Jornada total",
+    6: "Condução total",
+    9: "Máxima condução contínua",
+    10: "Espera",
+    11: "Refeição",
+    12: "Descanso",
+    13: "Interjornada",
+}
+REPORT_COLUMNS = ["Motorista", "Dia", *JOURNEY_COLUMNS.values()]
+HEADER_LABELS = {"dia do mês", "nome", "jornada de motorista"}
+
+SNIFF_BYTES = 64 * 1024
+CSV_CHUNK_ROWS = 50_000
+CSV_DELIMITERS = ";,\t|"
+
+# Referências gerenciais: 5h30 de direção contínua e 11h de interjornada.
+MAX_CONTINUOUS_DRIVING_MINUTES = 330
+MIN_INTERJOURNEY_MINUTES = 660
+ANALYSIS_COLUMNS = [
+    "Motorista",
+    "Data de referência",
+    "Status",
+    "Ocorrência crítica",
+    "Ponto de atenção",
+    "Tem crítica",
+    "Tem atenção",
+    "Jornada total (min)",
+    "Condução contínua (min)",
+    "Máxima condução contínua",
+    "Interjornada",
+]
+
+
+def sniff_csv_format(sample: bytes) -> tuple[str, str]:
+    """Detecta separador e codificação a partir dos primeiros bytes do CSV."""
+    encoding = "utf-8-sig" if sample.startswith(b"\xef\xbb\xbf") else "utf-8"
+    try:
+        text = sample.decode(encoding)
+    except UnicodeDecodeError as exc:
+        # Um caractere multibyte cortado no fim da amostra não indica latin-1.
+        if exc.start < len(sample) - 3:
+            encoding = "latin-1"
+        text = sample.decode(encoding, errors="ignore")
+
+    lines = [line for line in text.splitlines()[:-1] if line.strip()] or text.splitlines()
+    try:
+        separator = csv.Sniffer().sniff("\n".join(lines[:200]), delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        counts = {delimiter: text.count(delimiter) for delimiter in CSV_DELIMITERS}
+        separator = max(counts, key=counts.get) if any(counts.values()) else ","
+    return separator, encoding
+
+
+def _csv_width(sample: bytes, separator: str, encoding: str) -> int:
+    text = sample.decode(encoding, errors="ignore")
+    rows = csv.reader(io.StringIO(text), delimiter=separator)
+    return max((len(row) for row in rows), default=0)
+
+
+def iter_journey_csv(source: BinaryIO, *, chunk_rows: int = CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Lê o CSV bruto em blocos com o engine C.
+
+    Separador, codificação e largura são detectados uma única vez nos primeiros
+    ``SNIFF_BYTES``. Todas as células são lidas como texto para que a inferência
+    de tipos não varie entre blocos.
+    """
+    start = source.tell()
+    sample = source.read(SNIFF_BYTES)
+    source.seek(start)
+    if not sample.strip():
+        return
+    separator, encoding = sniff_csv_format(sample)
+    width = max(_csv_width(sample, separator, encoding), max(JOURNEY_COLUMNS) + 1)
+    yield from pd.read_csv(
+        source,
+        header=None,
+        names=range(width),
+        sep=separator,
+        encoding=encoding,
+        dtype=str,
+        engine="c",
+        chunksize=max(1, int(chunk_rows)),
+    )
+
+
+def read_journey_sheet(file_bytes: bytes, filename: str) -> pd.DataFrame:
+    """Lê o relatório bruto, sem cabeçalho, a partir de XLSX ou CSV."""
+    buffer = io.BytesIO(file_bytes)
+    if filename.lower().endswith(".csv"):
+        chunks = list(iter_journey_csv(buffer))
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    return read_excel_sheet(file_bytes, header=None)
+
+
+def _text_column(raw: pd.DataFrame, position: int) -> pd.Series:
+    """Texto sem espaços nas bordas; vazio para células nulas.
+
+    O relatório repete poucos valores distintos (horários, dias da semana),
+    então o ``strip`` é aplicado somente aos valores únicos.
+    """
+    column = raw.iloc[:, position]
+    text = column.astype(object).where(column.notna(), "").astype(str)
+    codes, uniques = pd.factorize(text)
+    stripped = np.array([value.strip() for value in uniques], dtype=object)
+    return pd.Series(stripped[codes], index=raw.index)
+
+
+def _parse_journey_chunk(raw: pd.DataFrame, current_driver: str | None) -> tuple[pd.DataFrame, str | None]:
+    """Extrai os dias de um bloco do relatório.
+
+    ``current_driver`` é o motorista em vigor antes da primeira linha do bloco;
+    o retorno inclui o motorista em vigor ao final, para o bloco seguinte.
+    """
+    width = raw.shape[1]
+    if width <= max(JOURNEY_COLUMNS) or raw.empty:
+        return pd.DataFrame(columns=REPORT_COLUMNS), current_driver
+
+    first = _text_column(raw, DAY_COLUMN)
+    second = _text_column(raw, 2)
+
+    is_driver = (
+        first.ne("")
+        & ~first.str.lower().isin(HEADER_LABELS)
+        & ~first.str[:1].str.isdigit()
+        & second.eq("")
+    )
+    if not is_driver.any() and current_driver is None:
+        return pd.DataFrame(columns=REPORT_COLUMNS), current_driver
+    # Equivale a um ffill do nome: cada linha recebe o último cabeçalho visto,
+    # ou o motorista herdado do bloco anterior antes do primeiro cabeçalho.
+    names = np.array([current_driver, *first[is_driver]], dtype=object)
+    driver = pd.Series(names[is_driver.cumsum().to_numpy()], index=raw.index)
+    last_driver = names[-1]
+
+    day = pd.to_numeric(first.where(first.str.isdigit()), errors="coerce")
+    is_day = ~is_driver & driver.notna() & day.between(1, 31)
+    if not is_day.any():
+        return pd.DataFrame(columns=REPORT_COLUMNS), last_driver
+
+    days = raw[is_day.to_numpy()].reset_index(drop=True)
+    result = pd.DataFrame(
+        {
+            "Motorista": driver[is_day].to_numpy(),
+            "Dia": day[is_day].astype("int64").to_numpy(),
+        }
+    )
+    for position, name in JOURNEY_COLUMNS.items():
+        result[name] = _text_column(days, position)
+    return result, last_driver
+
+
+def parse_journey_frame(raw: pd.DataFrame) -> pd.DataFrame:
+    """Converte o relatório bruto em uma linha por motorista e dia.
+
+    As linhas de cabeçalho de motorista são localizadas por máscara e o nome é
+    propagado para as linhas de dia seguintes, sem iterar linha a linha.
+    """
+    return _parse_journey_chunk(raw, None)[0]
+
+
+def iter_journey_report(
+    source: BinaryIO,
+    filename: str,
+    *,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """Entrega os dias do relatório incrementalmente, bloco a bloco.
+
+    Para CSV, o motorista corrente atravessa as fronteiras entre blocos e a
+    memória fica limitada ao bloco em leitura. XLSX é lido de uma só vez,
+    pelo mesmo leitor de ``read_journey_sheet``.
+    """
+    if not filename.lower().endswith(".csv"):
+        frame = parse_journey_frame(read_excel_sheet(source.read(), header=None))
+        if not frame.empty:
+            yield frame
+        return
+
+    current_driver: str | None = None
+    for chunk in iter_journey_csv(source, chunk_rows=chunk_rows):
+        frame, current_driver = _parse_journey_chunk(chunk, current_driver)
+        if not frame.empty:
+            yield frame
+
+
+def duration_to_minutes(value: object) -> int:
+    """Converte uma duração isolada do relatório em minutos inteiros."""
+    if value is None or pd.isna(value):
+        return 0
+    if isinstance(value, pd.Timedelta):
+        return max(0, int(value.total_seconds() // 60))
+    if isinstance(value, timedelta):
+        return max(0, int(value.total_seconds() // 60))
+    if isinstance(value, (datetime, time, pd.Timestamp)):
+        return int(value.hour * 60 + value.minute)
+    if isinstance(value, (float, int)):
+        # Valores de duração do Excel são frações de um dia.
+        return max(0, int(round(float(value) * 24 * 60)))
+
+    text = str(value).strip()
+    if not text or text.lower() in {"nan", "nat", "00:00:00"}:
+        return 0
+    try:
+        if "day" in text:
+            return max(0, int(pd.to_timedelta(text).total_seconds() // 60))
+        parts = text.split(":")
+        if len(parts) >= 2:
+            return max(0, int(float(parts[0])) * 60 + int(float(parts[1])))
+    except (TypeError, ValueError):
+        return 0
+    return 0
+
+
+def _text_minutes(text: pd.Series) -> pd.Series:
+    # Durações repetem poucos valores distintos: converte somente os únicos.
+    codes, uniques = pd.factorize(text)
+    distinct = pd.Series(uniques, dtype=object).str.strip()
+    minutes = pd.Series(0.0, index=distinct.index)
+
+    has_days = distinct.str.contains("day", regex=False)
+    if has_days.any():
+        delta = pd.to_timedelta(distinct[has_days], errors="coerce")
+        minutes[has_days] = (delta.dt.total_seconds() // 60).clip(lower=0)
+
+    clock = distinct[~has_days].str.split(":", n=2, expand=True)
+    if clock.shape[1] >= 2:
+        hours = np.trunc(pd.to_numeric(clock[0], errors="coerce"))
+        rest = np.trunc(pd.to_numeric(clock[1], errors="coerce"))
+        clock_minutes = hours * 60 + rest
+        minutes[~has_days] = clock_minutes.where(np.isfinite(clock_minutes)).clip(lower=0)
+    lookup = minutes.fillna(0).astype("int64").to_numpy()
+    return pd.Series(np.where(codes >= 0, lookup[codes], 0), index=text.index)
+
+
+def _duration_kind(value: object) -> str:
+    if value is None or pd.isna(value):
+        return "null"
+    if isinstance(value, timedelta):
+        return "timedelta"
+    if isinstance(value, (datetime, time)):
+        return "clock"
+    if isinstance(value, (float, int)):
+        return "number"
+    return "text"
+
+
+def durations_to_minutes(values: pd.Series) -> pd.Series:
+    """Versão vetorizada de :func:`duration_to_minutes` para uma coluna inteira.
+
+    Aceita frações de dia do Excel, ``timedelta``, horários e textos nos
+    formatos ``HH:MM[:SS]`` ou ``N days HH:MM:SS``. Valores inválidos valem 0.
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    if series.empty:
+        return pd.Series(0, index=series.index, dtype="int64")
+    if pd.api.types.is_timedelta64_dtype(series):
+        return (series.dt.total_seconds() // 60).clip(lower=0).fillna(0).astype("int64")
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return (series.dt.hour * 60 + series.dt.minute).fillna(0).astype("int64")
+    if pd.api.types.is_numeric_dtype(series):
+        return np.round(series.astype(float) * 24 * 60).clip(lower=0).fillna(0).astype("int64")
+
+    present = series.notna()
+    if pd.api.types.infer_dtype(series, skipna=True) in {"string", "empty"}:
+        return _text_minutes(series.where(present, ""))
+
+    # Colunas mistas (comuns em XLSX editados à mão): cada tipo segue a regra
+    # correspondente e o resultado é recomposto na ordem original.
+    kinds = series.map(_duration_kind)
+    result = pd.Series(0, index=series.index, dtype="int64")
+    for kind in ("timedelta", "clock", "number", "text"):
+        mask = kinds.eq(kind)
+        if not mask.any():
+            continue
+        subset = series[mask]
+        if kind == "timedelta":
+            result[mask] = durations_to_minutes(pd.to_timedelta(subset))
+        elif kind == "clock":
+            result[mask] = subset.map(lambda value: value.hour * 60 + value.minute).astype("int64")
+        elif kind == "number":
+            result[mask] = durations_to_minutes(subset.astype(float))
+        else:
+            result[mask] = _text_minutes(subset.astype(str))
+    return result
+
+
+def _clock_label(minutes: int) -> str:
+    hours, rest = divmod(int(minutes), 60)
+    return f"{hours}h{rest:02d}" if rest else f"{hours}h"
+
+
+def analyze_compliance(
+    frame: pd.DataFrame,
+    *,
+    max_continuous_minutes: int = MAX_CONTINUOUS_DRIVING_MINUTES,
+    min_interjourney_minutes: int = MIN_INTERJOURNEY_MINUTES,
+) -> pd.DataFrame:
+    """Classifica cada dia como Crítico, Atenção ou Conforme.
+
+    Crítico: condução contínua acima de ``max_continuous_minutes``.
+    Atenção: interjornada registrada, porém abaixo de ``min_interjourney_minutes``.
+    """
+    if frame.empty:
+        return pd.DataFrame(columns=ANALYSIS_COLUMNS)
+
+    continuous = frame["Máxima condução contínua"]
+    interjourney = frame["Interjornada"]
+    continuous_minutes = durations_to_minutes(continuous)
+    interjourney_minutes = durations_to_minutes(interjourney)
+
+    has_critical = continuous_minutes.gt(max_continuous_minutes).to_numpy()
+    has_attention = (interjourney_minutes.gt(0) & interjourney_minutes.lt(min_interjourney_minutes)).to_numpy()
+    critical_text = (
+        "Direção contínua de "
+        + continuous.astype(str)
+        + f" — referência de {_clock_label(max_continuous_minutes)} excedida"
+    )
+    attention_text = (
+        "Interjornada de "
+        + interjourney.astype(str)
+        + f" — referência mínima de {_clock_label(min_interjourney_minutes)} não atingida"
+    )
+
+    result = pd.DataFrame(
+        {
+            "Motorista": frame["Motorista"],
+            "Data de referência": frame["Dia"].astype(str) + " (" + frame["Semana"].astype(str) + ")",
+            "Status": np.select([has_critical, has_attention], ["Crítico", "Atenção"], default="Conforme"),
+            "Ocorrência crítica": np.where(has_critical, critical_text, ""),
+            "Ponto de atenção": np.where(has_attention, attention_text, ""),
+            "Tem crítica": has_critical,
+            "Tem atenção": has_attention,
+            "Jornada total (min)": durations_to_minutes(frame["Jornada total"]),
+            "Condução contínua (min)": continuous_minutes,
+            "Máxima condução contínua": continuous,
+            "Interjornada": interjourney,
+        }
+    )
+    return result.reset_index(drop=True)
+
+
+def audit_report_file(
+    file_bytes: bytes,
+    filename: str,
+    max_continuous_minutes: int = MAX_CONTINUOUS_DRIVING_MINUTES,
+    min_interjourney_minutes: int = MIN_INTERJOURNEY_MINUTES,
+) -> pd.DataFrame:
+    """Lê e analisa um relatório completo. Função de topo para uso em subprocessos."""
+    flat = parse_journey_frame(read_journey_sheet(file_bytes, filename))
+    return analyze_compliance(
+        flat,
+        max_continuous_minutes=max_continuous_minutes,
+        min_interjourney_minutes=min_interjourney_minutes,
+    )
+
+
+def iter_batch_audit(
+    files: list[tuple[str, bytes]],
+    *,
+    max_continuous_minutes: int = MAX_CONTINUOUS_DRIVING_MINUTES,
+    min_interjourney_minutes: int = MIN_INTERJOURNEY_MINUTES,
+    workers: int | None = None,
+) -> Iterator[tuple[str, pd.DataFrame, str]]:
+    """Audita vários relatórios em paralelo, entregando cada um ao terminar.
+
+    Cada item é ``(arquivo, análise, erro)``; ``erro`` fica vazio quando o
+    arquivo foi processado. A ordem segue a conclusão, não a lista recebida.
+    """
+    thresholds = (max_continuous_minutes, min_interjourney_minutes)
+    worker_count = max(1, min(len(files), workers or os.cpu_count() or 1))
+    if worker_count == 1:
+        yield from _audit_inline(files, thresholds)
+        return
+
+    # "spawn" evita herdar, via fork, as threads do servidor Streamlit.
+    context = multiprocessing.get_context("spawn")
+    pending: list[tuple[str, bytes]] = []
+    with ProcessPoolExecutor(max_workers=worker_count, mp_context=context) as executor:
+        futures = {
+            executor.submit(audit_report_file, file_bytes, filename, *thresholds): (filename, file_bytes)
+            for filename, file_bytes in files
+        }
+        try:
+            for future in as_completed(futures):
+                filename, file_bytes = futures[future]
+                try:
+                    yield filename, future.result(), ""
+                except BrokenProcessPool:
+                    pending.append((filename, file_bytes))
+                except Exception as exc:
+                    yield filename, pd.DataFrame(columns=ANALYSIS_COLUMNS), str(exc)
+        finally:
+            # Interrompido pelo consumidor: descarta o que ainda não começou.
+            for future in futures:
+                future.cancel()
+
+    # Sem subprocessos disponíveis (ambiente restrito), conclui no processo atual.
+    yield from _audit_inline(pending, thresholds)
+
+
+def _audit_inline(files: list[tuple[str, bytes]], thresholds: tuple[int, int]) -> Iterator[tuple[str, pd.DataFrame, str]]:
+    for filename, file_bytes in files:
+        try:
+            yield filename, audit_report_file(file_bytes, filename, *thresholds), ""
+        except Exception as exc:
+            yield filename, pd.DataFrame(columns=ANALYSIS_COLUMNS), str(exc)
+
+
+def journey_day_documents(flat: pd.DataFrame, analysis: pd.DataFrame, period_key: str) -> list[dict]:
+    """Monta os documentos do histórico, um por motorista e dia do período.
+
+    ``row_hash`` resume o conteúdo do dia e permite regravar apenas os dias
+    que mudaram quando o mesmo mês é enviado novamente.
+    """
+    if flat.empty:
+        return []
+    frame = pd.DataFrame(
+        {
+            "motorista": flat["Motorista"].astype(str).to_numpy(),
+            "dia": flat["Dia"].astype("int64").to_numpy(),
+            "semana": flat["Semana"].astype(str).to_numpy(),
+            "status": analysis["Status"].to_numpy(),
+            "tem_critica": analysis["Tem crítica"].astype(bool).to_numpy(),
+            "tem_atencao": analysis["Tem atenção"].astype(bool).to_numpy(),
+            "jornada_total_min": analysis["Jornada total (min)"].astype("int64").to_numpy(),
+            "conducao_continua_min": analysis["Condução contínua (min)"].astype("int64").to_numpy(),
+            "maxima_conducao_continua": flat["Máxima condução contínua"].astype(str).to_numpy(),
+            "interjornada": flat["Interjornada"].astype(str).to_numpy(),
+            "ocorrencia_critica": analysis["Ocorrência crítica"].to_numpy(),
+            "ponto_atencao": analysis["Ponto de atenção"].to_numpy(),
+        }
+    ).drop_duplicates(["motorista", "dia"], keep="last")
+    frame["row_hash"] = pd.util.hash_pandas_object(frame, index=False).map("{:016x}".format)
+    frame.insert(1, "periodo", period_key)
+    return frame.to_dict("records")
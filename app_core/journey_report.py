@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import hashlib
+
+import pandas as pd
+from fpdf import FPDF
+
+ROW_HEIGHT = 5.0
+TEXT_BASELINE = 3.6
+CELL_PADDING = 1.0
+# Motorista, data de referência e ocorrência, em milímetros (A4 retrato).
+COLUMN_WIDTHS = (60.0, 25.0, 105.0)
+COLUMN_TITLES = ("Motorista", "Data", "Ocorrencia")
+SECTIONS = (
+    ("Ocorrencias criticas", "Ocorrência crítica"),
+    ("Pontos de atencao", "Ponto de atenção"),
+)
+
+
+def _ascii(values: pd.Series) -> pd.Series:
+    """Remove acentos e símbolos fora do latin-1 suportado pelas fontes padrão."""
+    return (
+        values.astype(str)
+        .str.normalize("NFKD")
+        .str.encode("latin-1", "ignore")
+        .str.decode("latin-1")
+    )
+
+
+def report_fingerprint(critical: pd.DataFrame, attention: pd.DataFrame, total_days: int, total_drivers: int) -> str:
+    """Identificador do conteúdo do relatório, usado como chave de cache do PDF."""
+    digest = hashlib.sha256(f"{total_days}:{total_drivers}".encode("utf-8"))
+    for frame, (_, message_column) in zip((critical, attention), SECTIONS):
+        columns = ["Motorista", "Data de referência", message_column]
+        digest.update(f"|{len(frame)}|".encode("utf-8"))
+        if not frame.empty:
+            hashed = pd.util.hash_pandas_object(frame[columns].astype(str), index=False)
+            digest.update(hashed.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class _AuditPDF(FPDF):
+    def header(self):
+        self.set_font("helvetica", "B", 14)
+        self.cell(0, 10, "Relatorio de Auditoria de Jornada", new_x="LMARGIN", new_y="NEXT", align="C")
+        self.ln(3)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font("helvetica", "I", 8)
+        self.cell(0, 10, f"Pagina {self.page_no()}", align="C")
+
+
+def _fit(pdf: FPDF, text: str, width: float) -> str:
+    available = width - 2 * CELL_PADDING
+    if pdf.get_string_width(text) <= available:
+        return text
+    while text and pdf.get_string_width(text + "...") > available:
+        text = text[:-1]
+    return text + "..."
+
+
+def _draw_grid(pdf: FPDF, top: float, rows: int) -> None:
+    left = pdf.l_margin
+    width = sum(COLUMN_WIDTHS)
+    height = rows * ROW_HEIGHT
+    pdf.rect(left, top, width, height)
+    for row in range(1, rows):
+        pdf.line(left, top + row * ROW_HEIGHT, left + width, top + row * ROW_HEIGHT)
+    x = left
+    for column_width in COLUMN_WIDTHS[:-1]:
+        x += column_width
+        pdf.line(x, top, x, top + height)
+
+
+def _draw_rows(pdf: FPDF, top: float, rows: list[tuple[str, ...]], fitted: dict[tuple[str, float], str]) -> None:
+    for index, row in enumerate(rows):
+        x = pdf.l_margin
+        y = top + index * ROW_HEIGHT + TEXT_BASELINE
+        for column_width, text in zip(COLUMN_WIDTHS, row):
+            key = (text, column_width)
+            if key not in fitted:
+                fitted[key] = _fit(pdf, text, column_width)
+            pdf.text(x + CELL_PADDING, y, fitted[key])
+            x += column_width
+    _draw_grid(pdf, top, len(rows))
+    pdf.set_y(top + len(rows) * ROW_HEIGHT)
+
+
+def _add_table(pdf: FPDF, title: str, frame: pd.DataFrame, message_column: str) -> None:
+    """Desenha a seção em lotes do tamanho da página.
+
+    Cada lote escreve o texto com ``FPDF.text`` e a grade com uma única série de
+    linhas, evitando a quebra de linha e o cálculo de bordas de ``multi_cell``
+    a cada ocorrência.
+    """
+    if frame.empty:
+        return
+    rows = list(
+        zip(
+            _ascii(frame["Motorista"]),
+            _ascii(frame["Data de referência"]),
+            _ascii(frame[message_column]),
+        )
+    )
+    if pdf.will_page_break(8 + 2 * ROW_HEIGHT):
+        pdf.add_page()
+    pdf.set_font("helvetica", "B", 11)
+    pdf.cell(0, 8, title, new_x="LMARGIN", new_y="NEXT")
+
+    # Motoristas, datas e mensagens se repetem muito: mede cada texto uma vez.
+    fitted: dict[tuple[str, float], str] = {}
+    bottom = pdf.h - pdf.b_margin
+    position = 0
+    while position < len(rows):
+        if bottom - pdf.get_y() < 2 * ROW_HEIGHT:
+            pdf.add_page()
+        capacity = int((bottom - pdf.get_y()) // ROW_HEIGHT) - 1
+        pdf.set_font("helvetica", "B", 8)
+        _draw_rows(pdf, pdf.get_y(), [COLUMN_TITLES], fitted)
+        pdf.set_font("helvetica", size=8)
+        batch = rows[position : position + capacity]
+        _draw_rows(pdf, pdf.get_y(), batch, fitted)
+        position += len(batch)
+    pdf.ln(4)
+
+
+def create_pdf_report(critical: pd.DataFrame, attention: pd.DataFrame, total_days: int, total_drivers: int) -> bytes:
+    pdf = _AuditPDF()
+    pdf.add_page()
+    pdf.set_font("helvetica", "B", 12)
+    pdf.cell(0, 9, "Resumo executivo", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("helvetica", size=10)
+    for line in (
+        f"Dias analisados: {total_days}",
+        f"Motoristas auditados: {total_drivers}",
+        f"Ocorrencias criticas: {len(critical)}",
+        f"Pontos de atencao: {len(attention)}",
+    ):
+        pdf.cell(0, 7, line, new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(5)
+
+    for frame, (title, message_column) in zip((critical, attention), SECTIONS):
+        _add_table(pdf, title, frame, message_column)
+    return bytes(pdf.output())
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import importlib.util
+import io
+from functools import lru_cache
+from typing import BinaryIO, Iterator
+
+import numpy as np
+import pandas as pd
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+# Relatórios exportados pela plataforma: dados do cliente na linha 9 e
+# cabeçalho da tabela na linha 12 (índices 8 e 11 a partir de zero).
+CLIENT_INFO_ROW = 8
+TABLE_HEADER_ROW = 11
+
+# Valores que o openpyxl devolve para células com erro de fórmula.
+EXCEL_ERROR_CODES = frozenset({"#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A"})
+
+
+@lru_cache(maxsize=1)
+def calamine_available() -> bool:
+    """Indica se o leitor ``python-calamine`` (opcional) está instalado."""
+    return importlib.util.find_spec("python_calamine") is not None
+
+
+def default_engine() -> str:
+    return "calamine" if calamine_available() else "openpyxl"
+
+
+def _cell_value(value):
+    """Mesma conversão aplicada pelo leitor openpyxl do pandas."""
+    if value is None:
+        return ""
+    if value.__class__ is float:
+        return int(value) if value.is_integer() else value
+    if value.__class__ is str and value in EXCEL_ERROR_CODES:
+        return np.nan
+    return value
+
+
+def iter_sheet_rows(source: bytes | BinaryIO, *, max_rows: int | None = None) -> Iterator[list]:
+    """Percorre a primeira aba em modo somente leitura, devolvendo só os valores.
+
+    As linhas saem sem as células vazias do final; ``max_rows`` interrompe a
+    leitura do XML assim que as linhas necessárias foram lidas.
+    """
+    from openpyxl import load_workbook
+
+    buffer = io.BytesIO(source) if isinstance(source, bytes) else source
+    workbook = load_workbook(buffer, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook.worksheets[0]
+        # Exportações costumam gravar uma dimensão incorreta da planilha.
+        sheet.reset_dimensions()
+        for number, values in enumerate(sheet.iter_rows(values_only=True)):
+            if max_rows is not None and number >= max_rows:
+                break
+            row = [_cell_value(value) for value in values]
+            while row and row[-1] == "":
+                row.pop()
+            yield row
+    finally:
+        workbook.close()
+
+
+def read_sheet_grid(source: bytes | BinaryIO, *, max_rows: int | None = None) -> list[list]:
+    """Linhas da primeira aba, retangulares e sem as linhas vazias do final."""
+    rows = list(iter_sheet_rows(source, max_rows=max_rows))
+    last_with_data = max((number for number, row in enumerate(rows) if row), default=-1)
+    rows = rows[: last_with_data + 1]
+    width = max((len(row) for row in rows), default=0)
+    return [row + [""] * (width - len(row)) if len(row) < width else row for row in rows]
+
+
+def load_sheet_grid(file_bytes: bytes, *, max_rows: int | None = None, engine: str | None = None) -> list[list]:
+    """Grade bruta da primeira aba, com ``""`` nas células vazias, lida uma única vez."""
+    engine = engine or default_engine()
+    if engine == "openpyxl":
+        return read_sheet_grid(file_bytes, max_rows=max_rows)
+    if engine not in {"calamine", "pandas"}:
+        raise ValueError(f"Leitor de planilha desconhecido: {engine}.")
+    frame = pd.read_excel(
+        io.BytesIO(file_bytes),
+        header=None,
+        nrows=max_rows,
+        dtype=object,
+        engine="calamine" if engine == "calamine" else "openpyxl",
+    )
+    return frame.where(frame.notna(), "").to_numpy().tolist()
+
+
+def grid_to_frame(
+    grid: list[list],
+    *,
+    header: int | None = 0,
+    skiprows: int | None = None,
+    nrows: int | None = None,
+) -> pd.DataFrame:
+    """Converte linhas brutas em DataFrame com a mesma inferência de ``read_excel``."""
+    if not grid:
+        return pd.DataFrame()
+    try:
+        parser = TextParser(grid, header=header, skiprows=skiprows, nrows=nrows, skip_blank_lines=False)
+        return parser.read(nrows=nrows)
+    except EmptyDataError:
+        return pd.DataFrame()
+
+
+def _rows_needed(header: int | None, skiprows: int | None, nrows: int | None) -> int | None:
+    if nrows is None:
+        return None
+    header_rows = 1 if header is None else header + 1
+    return header_rows + nrows + (skiprows or 0)
+
+
+def read_excel_sheet(
+    file_bytes: bytes,
+    *,
+    header: int | None = 0,
+    skiprows: int | None = None,
+    nrows: int | None = None,
+    engine: str | None = None,
+) -> pd.DataFrame:
+    """Lê a primeira aba de um XLSX com o leitor mais rápido disponível.
+
+    Equivale a ``pd.read_excel(..., header=, skiprows=, nrows=)``. Usa o
+    calamine quando instalado; caso contrário, percorre a planilha com o
+    openpyxl em modo streaming. ``engine="pandas"`` força o ``read_excel``.
+    """
+    engine = engine or default_engine()
+    if engine in {"calamine", "pandas"}:
+        return pd.read_excel(
+            io.BytesIO(file_bytes),
+            header=header,
+            skiprows=skiprows,
+            nrows=nrows,
+            engine="calamine" if engine == "calamine" else "openpyxl",
+        )
+    if engine != "openpyxl":
+        raise ValueError(f"Leitor de planilha desconhecido: {engine}.")
+    grid = read_sheet_grid(file_bytes, max_rows=_rows_needed(header, skiprows, nrows))
+    return grid_to_frame(grid, header=header, skiprows=skiprows, nrows=nrows)
+
+
+def read_report_sheet(
+    file_bytes: bytes,
+    *,
+    info_row: int = CLIENT_INFO_ROW,
+    header: int = TABLE_HEADER_ROW,
+    engine: str | None = None,
+) -> tuple[list, pd.DataFrame]:
+    """Lê numa única passada a linha de identificação e a tabela do relatório.
+
+    Retorna os valores da linha ``info_row`` (vazia se a planilha for menor) e
+    a tabela com cabeçalho em ``header``, como ``read_excel_sheet`` faria.
+    """
+    grid = load_sheet_grid(file_bytes, engine=engine)
+    info = list(grid[info_row]) if len(grid) > info_row else []
+    return info, grid_to_frame(grid, header=header)
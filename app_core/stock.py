@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import re
+
+import numpy as np
+import pandas as pd
+
+STATUS_UNKNOWN = "Não encontrado no sistema"
+MODEL_UNKNOWN = "Não identificado"
+# Equipamentos com este status no sistema não precisam estar na prateleira.
+STATUS_UNAVAILABLE = "indisponível"
+
+_FLOAT_SUFFIX = re.compile(r"\.0$")
+LEDGER_COLUMNS = {"serial": "Serial", "status": "Status", "modelo": "Modelo", "local": "Local"}
+
+
+def normalize_serials(values: pd.Series) -> pd.Series:
+    """Número de série como texto, sem espaços e sem o ``.0`` de células numéricas.
+
+    Seriais se repetem entre os arquivos e dentro deles, então a normalização
+    é feita uma vez por valor distinto. Colunas lidas como número inteiro
+    (ou float sem casas decimais) são convertidas direto de int64.
+    """
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.astype(str).astype(object)
+    if pd.api.types.is_float_dtype(values.dtype):
+        numbers = values.to_numpy()
+        # Acima de 1e16 o float vira notação científica ao ser convertido em texto.
+        if np.all(np.isfinite(numbers) & (numbers == np.trunc(numbers)) & (np.abs(numbers) < 1e16)):
+            return pd.Series(numbers.astype(np.int64).astype(str).astype(object), index=values.index)
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    normalized = np.array([_FLOAT_SUFFIX.sub("", str(value).strip()) for value in uniques], dtype=object)
+    return pd.Series(normalized[codes], index=values.index, dtype=object)
+
+
+def _serial_codes(system: pd.Series, physical: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Chaves int64 compartilhadas pelos dois lados, para o merge não comparar textos."""
+    codes, _ = pd.factorize(pd.concat([system, physical], ignore_index=True))
+    return codes[: len(system)], codes[len(system) :]
+
+
+def _expected_in_stock(statuses: pd.Series) -> np.ndarray:
+    codes, uniques = pd.factorize(statuses, use_na_sentinel=False)
+    unavailable = np.array([str(status).casefold() == STATUS_UNAVAILABLE for status in uniques], dtype=bool)
+    return ~unavailable[codes] if len(uniques) else np.ones(len(statuses), dtype=bool)
+
+
+def reconcile_stock(system_stock: pd.DataFrame, physical_stock: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Concilia o estoque do sistema com a contagem física em um único merge.
+
+    Retorna a conciliação (uma linha por serial contado, com status e modelo
+    do sistema), os seriais contados que não constam no sistema e os
+    equipamentos esperados em estoque que não foram contados.
+    """
+    system_codes, physical_codes = _serial_codes(system_stock["Serial"], physical_stock["Serial"])
+    merged = pd.merge(
+        pd.DataFrame({"key": physical_codes, "physical_row": np.arange(len(physical_stock))}),
+        pd.DataFrame({"key": system_codes, "system_row": np.arange(len(system_stock))}),
+        on="key",
+        how="outer",
+        indicator=True,
+        sort=False,
+    )
+    counted = merged[merged["_merge"] != "right_only"]
+    # Mesma ordem do merge "left" anterior: contagem física, depois sistema.
+    order = np.lexsort((counted["system_row"].to_numpy(), counted["physical_row"].to_numpy()))
+    physical_rows = counted["physical_row"].to_numpy()[order].astype(np.int64)
+    matched = counted["_merge"].eq("both").to_numpy()[order]
+    matched_rows = counted["system_row"].to_numpy()[order][matched].astype(np.int64)
+
+    reconciled = physical_stock.iloc[physical_rows].reset_index(drop=True)
+    for column, fallback in (("Status", STATUS_UNKNOWN), ("Modelo", MODEL_UNKNOWN)):
+        found = system_stock[column].to_numpy(dtype=object)[matched_rows]
+        values = np.full(len(reconciled), fallback, dtype=object)
+        values[matched] = np.where(pd.isna(found), fallback, found)
+        reconciled[column] = values
+    unknown_mask = reconciled["Status"].eq(STATUS_UNKNOWN)
+
+    counted_system = np.zeros(len(system_stock), dtype=bool)
+    counted_system[matched_rows] = True
+    missing_physical = system_stock[_expected_in_stock(system_stock["Status"]) & ~counted_system].copy()
+    return reconciled, reconciled[unknown_mask].copy(), missing_physical
+
+
+def ledger_documents(system_stock: pd.DataFrame) -> list[dict]:
+    """Documentos do inventário a partir do relatório do sistema, um por serial.
+
+    ``esperado`` indica se o equipamento deveria estar fisicamente no estoque
+    e ``row_hash`` permite regravar só os seriais alterados.
+    """
+    frame = system_stock[["Serial", "Status", "Modelo"]].drop_duplicates("Serial", keep="last")
+    frame = frame.rename(columns={column: field for field, column in LEDGER_COLUMNS.items()})
+    frame["esperado"] = _expected_in_stock(frame["status"])
+    for column in ("status", "modelo"):
+        frame[column] = frame[column].astype(object).where(frame[column].notna(), None)
+    frame["row_hash"] = pd.util.hash_pandas_object(frame.astype(str), index=False).map("{:016x}".format)
+    return frame.to_dict("records")
+
+
+def ledger_reconciliation(counted: list[dict], pending: list[dict]) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Conciliação de um local de contagem a partir do inventário persistido.
+
+    ``counted`` são os seriais contados no local e ``pending`` os esperados em
+    estoque que ainda não foram contados em nenhum local. O retorno segue o de
+    ``reconcile_stock``.
+    """
+    ledger = pd.DataFrame(counted, columns=["serial", "no_sistema", "status", "modelo", "local"])
+    in_system = ledger["no_sistema"].fillna(False).astype(bool).to_numpy()
+    system_stock = ledger.loc[in_system, ["serial", "status", "modelo"]].rename(columns=LEDGER_COLUMNS)
+    physical_stock = ledger[["serial", "local"]].rename(columns=LEDGER_COLUMNS)
+    reconciled, unknown, _ = reconcile_stock(system_stock.reset_index(drop=True), physical_stock)
+    missing = pd.DataFrame(pending, columns=["serial", "status", "modelo"]).rename(columns=LEDGER_COLUMNS)
+    return reconciled, unknown, missing
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app_core.spreadsheet import read_report_sheet
+
+# Coluna (zero-based) da linha de identificação com o nome do cliente.
+CLIENT_NAME_COLUMN = 4
+UNKNOWN_CLIENT = "Cliente não identificado"
+COLUMN_ALIASES = {
+    "Última Transmissão": "Data Transmissão",
+    "Rastreador Modelo": "Modelo",
+}
+REQUIRED_COLUMNS = {"Terminal", "Placa", "Rastreador", "Modelo", "Data Transmissão"}
+STATUS_UPDATED = "Atualizado"
+STATUS_STALE = "Desatualizado"
+
+
+def _client_name(info_row: list) -> str:
+    if len(info_row) <= CLIENT_NAME_COLUMN:
+        return UNKNOWN_CLIENT
+    value = info_row[CLIENT_NAME_COLUMN]
+    if value == "" or pd.isna(value):
+        return UNKNOWN_CLIENT
+    return str(value).strip()
+
+
+def parse_terminal_report(file_bytes: bytes) -> tuple[str, pd.DataFrame]:
+    """Lê o relatório ``lista_de_terminais.xlsx`` em uma única passada.
+
+    Retorna o nome do cliente (linha 9, coluna E) e os terminais com data de
+    transmissão válida.
+    """
+    info_row, terminals = read_report_sheet(file_bytes)
+    terminals = terminals.rename(columns=COLUMN_ALIASES)
+    missing = REQUIRED_COLUMNS - set(terminals.columns)
+    if missing:
+        raise ValueError(f"Colunas ausentes: {', '.join(sorted(missing))}.")
+
+    terminals = terminals.dropna(subset=["Terminal"]).copy()
+    terminals["Data Transmissão"] = pd.to_datetime(terminals["Data Transmissão"], errors="coerce", dayfirst=True)
+    terminals = terminals.dropna(subset=["Data Transmissão"])
+    return _client_name(info_row), terminals
+
+
+def classify_transmissions(terminals: pd.DataFrame, stale_days: int, *, now: datetime | None = None) -> pd.DataFrame:
+    """Marca como desatualizados os terminais sem transmitir há mais de ``stale_days`` dias."""
+    now = pd.Timestamp(now or datetime.now())
+    transmitted = terminals["Data Transmissão"]
+    result = terminals.copy()
+    result["Status"] = np.where(transmitted >= now - pd.Timedelta(days=stale_days), STATUS_UPDATED, STATUS_STALE)
+    result["Dias sem transmitir"] = (now - transmitted).dt.days.clip(lower=0)
+    return result
+
+
+CHANGE_NEWLY_STALE = "Passou a desatualizado"
+CHANGE_RECOVERED = "Recuperado"
+CHANGE_STILL_STALE = "Continua desatualizado"
+SNAPSHOT_FIELDS = {
+    "Terminal": "terminal",
+    "Placa": "placa",
+    "Rastreador": "rastreador",
+    "Modelo": "modelo",
+    "Data Transmissão": "data_transmissao",
+    "Status": "status",
+}
+# A data da última transmissão muda a cada exportação; só estes campos
+# contam como alteração do terminal no snapshot.
+SNAPSHOT_HASH_FIELDS = ("terminal", "placa", "rastreador", "modelo", "status", "limite_dias")
+
+
+def terminal_keys(values: pd.Series) -> pd.Series:
+    """Identificador textual do terminal; ``1001.0`` e ``1001`` são o mesmo equipamento."""
+    return values.astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+
+
+def compare_with_snapshot(analysis: pd.DataFrame, previous: pd.DataFrame) -> pd.DataFrame:
+    """Adiciona a coluna ``Mudança`` comparando o status atual com o último snapshot.
+
+    ``previous`` traz as colunas ``terminal`` e ``status`` gravadas na carga
+    anterior do cliente. Terminais que não existiam antes e já chegam
+    desatualizados contam como recém-desatualizados.
+    """
+    result = analysis.copy()
+    if previous.empty:
+        previous_status = pd.Series("", index=result.index)
+    else:
+        lookup = previous.drop_duplicates("terminal", keep="last").set_index("terminal")["status"]
+        previous_status = terminal_keys(result["Terminal"]).map(lookup).fillna("")
+    stale_now = result["Status"].eq(STATUS_STALE).to_numpy()
+    stale_before = previous_status.eq(STATUS_STALE).to_numpy()
+    result["Mudança"] = np.select(
+        [stale_now & ~stale_before, stale_now & stale_before, ~stale_now & stale_before],
+        [CHANGE_NEWLY_STALE, CHANGE_STILL_STALE, CHANGE_RECOVERED],
+        default="",
+    )
+    return result
+
+
+def snapshot_documents(client_name: str, analysis: pd.DataFrame, stale_days: int) -> list[dict]:
+    """Documentos do snapshot do cliente, um por terminal, com hash dos campos acompanhados."""
+    frame = analysis[list(SNAPSHOT_FIELDS)].rename(columns=SNAPSHOT_FIELDS)
+    frame = frame.assign(terminal=terminal_keys(frame["terminal"])).drop_duplicates("terminal", keep="last")
+    for column in ("placa", "rastreador", "modelo"):
+        frame[column] = frame[column].astype(object).where(frame[column].notna(), None)
+    frame["limite_dias"] = int(stale_days)
+    hashed = frame[list(SNAPSHOT_HASH_FIELDS)].astype(str)
+    frame["row_hash"] = pd.util.hash_pandas_object(hashed, index=False).map("{:016x}".format)
+    frame.insert(0, "cliente", client_name)
+    return frame.to_dict("records")
@@ -680,3 +680,30 @@ def money(value: Any) -> str:
     except (TypeError, ValueError):
         number = 0.0
     return f"R$ {number:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def page_cursor(key: str, scope: Any = None) -> dict[str, str]:
+    """Cursor (``after`` ou ``before``) da página exibida, guardado na sessão.
+
+    Volta à primeira página quando ``scope`` (filtros, tamanho da página) muda.
+    """
+    state = st.session_state.get(key)
+    if not isinstance(state, dict) or state.get("scope") != scope:
+        state = {"scope": scope, "cursor": {}}
+        st.session_state[key] = state
+    return dict(state["cursor"])
+
+
+def render_pager(key: str, page: dict[str, Any]) -> None:
+    """Botões para navegar entre páginas retornadas por consultas com cursor."""
+    newer, first, older = st.columns(3)
+    target = None
+    if newer.button("← Mais recentes", key=f"{key}_previous", disabled=not page.get("previous"), width="stretch"):
+        target = {"before": page["previous"]}
+    if first.button("Início", key=f"{key}_first", disabled=not page.get("previous"), width="stretch"):
+        target = {}
+    if older.button("Mais antigos →", key=f"{key}_next", disabled=not page.get("next"), width="stretch"):
+        target = {"after": page["next"]}
+    if target is not None:
+        st.session_state[key]["cursor"] = target
+        st.rerun()
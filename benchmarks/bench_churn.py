@@ -0,0 +1,120 @@
+"""Benchmark da página de churn com métricas sintéticas.
+
+Execução, a partir da raiz do projeto::
+
+    python -m benchmarks.bench_churn --clients 3000 --years 5
+
+Compara a varredura da lista de métricas feita anteriormente pela página
+(classificação cliente a cliente e totais mês a mês) com o modelo em colunas
+de ``app_core.churn``, montado uma vez e apenas fatiado a cada rerun.
+"""
+from __future__ import annotations
+
+import argparse
+import pickle
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from app_core.churn import build_metrics_model, classify_period, period_totals
+from app_core.financeiro_mongo import previous_period
+
+
+def synthetic_metrics(clients: int, years: int, *, seed: int = 17) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    periods = [f"{2020 + year}-{month:02d}" for year in range(years) for month in range(1, 13)]
+    metrics = []
+    for period in periods:
+        present = rng.random(clients) < 0.9
+        active = rng.integers(0, 40, clients)
+        for client in np.flatnonzero(present):
+            metrics.append(
+                {
+                    "period_key": period,
+                    "cliente": f"Cliente {client:05d}",
+                    "receita": float(active[client] * 79.9),
+                    "veiculos_ativos_fim_mes": int(active[client]),
+                    "ativacoes": int(rng.integers(0, 3)),
+                    "desativacoes": int(rng.integers(0, 3)),
+                    "suspensoes": 0,
+                    "data_quality": "detalhado",
+                }
+            )
+    return metrics
+
+
+def legacy_page(metrics: list[dict], selected_period: str) -> tuple[dict, list[dict]]:
+    selected_previous = previous_period(selected_period)
+    by_period_client = {(item["period_key"], item["cliente"]): item for item in metrics}
+    historical_active_periods: dict[str, set[str]] = defaultdict(set)
+    for item in metrics:
+        if item["veiculos_ativos_fim_mes"] > 0:
+            historical_active_periods[item["cliente"]].add(item["period_key"])
+    current_clients = {item["cliente"] for item in metrics if item["period_key"] == selected_period}
+    previous_clients = {item["cliente"] for item in metrics if item["period_key"] == selected_previous}
+    classification = {}
+    for client in sorted(current_clients | previous_clients):
+        current = by_period_client.get((selected_period, client), {})
+        previous = by_period_client.get((selected_previous, client), {})
+        current_active = current.get("veiculos_ativos_fim_mes", 0)
+        previous_active = previous.get("veiculos_ativos_fim_mes", 0)
+        current_revenue = current.get("receita", 0.0)
+        previous_revenue = previous.get("receita", 0.0)
+        if previous_active > 0 and current_active <= 0:
+            classification[client] = "Churn total"
+        elif previous_active <= 0 and current_active > 0:
+            older = {item for item in historical_active_periods[client] if item < selected_period} - {selected_previous}
+            classification[client] = "Reativação" if older else "Novo cliente"
+        elif previous_active > 0 and current_active > 0:
+            if current_active > previous_active or current_revenue > previous_revenue * 1.005:
+                classification[client] = "Expansão"
+            elif current_active < previous_active or current_revenue < previous_revenue * 0.995:
+                classification[client] = "Contração"
+            else:
+                classification[client] = "Estável"
+        else:
+            classification[client] = "Sem movimento"
+    monthly = []
+    for period in sorted({item["period_key"] for item in metrics}):
+        records = [item for item in metrics if item["period_key"] == period]
+        monthly.append({"period_key": period, "receita": sum(item["receita"] for item in records)})
+    return classification, monthly
+
+
+def model_page(model: dict, selected_period: str) -> tuple[dict, list[dict]]:
+    classified = classify_period(model, selected_period, is_closed=True)
+    monthly = [{"period_key": period, "receita": period_totals(model, period)["receita"]} for period in model["periods"]]
+    return dict(zip(classified["cliente"], classified["classificacao"])), monthly
+
+
+def _timed(label: str, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    print(f"{label:<34} {(time.perf_counter() - started) * 1000:10.1f} ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=3_000)
+    parser.add_argument("--years", type=int, default=5)
+    args = parser.parse_args()
+
+    metrics = synthetic_metrics(args.clients, args.years)
+    selected = metrics[-1]["period_key"]
+    print(f"{len(metrics)} métricas, mês analisado {selected}")
+    legacy = _timed("página anterior (por rerun)", legacy_page, metrics, selected)
+    model = _timed("montagem do modelo (por leitura)", build_metrics_model, metrics, {})
+    payload = pickle.dumps(model)
+    _timed("cópia do modelo pelo cache", pickle.loads, payload)
+    current = _timed("modelo (por rerun)", model_page, model, selected)
+
+    assert current[0] == legacy[0]
+    assert [item["period_key"] for item in current[1]] == [item["period_key"] for item in legacy[1]]
+    assert np.allclose([item["receita"] for item in current[1]], [item["receita"] for item in legacy[1]])
+    print("classificação e totais idênticos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark da exportação da base de clientes organizada.
+
+Execução, a partir da raiz do projeto::
+
+    python -m benchmarks.bench_exports --rows 500000
+
+Compara ``app_core.exports.write_xlsx`` (modo ``constant_memory`` e largura
+por amostragem) com o ``to_excel`` usado anteriormente pela página de
+clientes, medindo tempo e pico de memória alocada pelo Python.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from app_core.exports import export_frame, write_xlsx
+
+
+def synthetic_customers(rows: int, *, emails: int = 4, seed: int = 13) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(
+        {
+            "Nome do Cliente": [f"Cliente {number:07d} Transportes" for number in range(rows)],
+            "CPF/CNPJ": rng.integers(10**13, 10**14, rows).astype(str),
+            "Tipo Cliente": rng.choice(["Pessoa Física", "Pessoa Jurídica"], rows),
+            "Telefone": rng.integers(10**10, 10**11, rows).astype(str),
+        }
+    )
+    for position in range(1, emails + 1):
+        values = pd.Series([f"usuario{number}.{position}@exemplo.com.br" for number in range(rows)], dtype=object)
+        frame[f"E-mail Usuário {position}"] = values.where(rng.random(rows) < 1 / position, None)
+    return frame
+
+
+def legacy_to_excel(frame: pd.DataFrame) -> bytes:
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        frame.to_excel(writer, index=False, sheet_name="Clientes_Organizados")
+        worksheet = writer.sheets["Clientes_Organizados"]
+        for index, column in enumerate(frame.columns):
+            width = min(max(len(str(column)) + 2, frame[column].astype(str).map(len).max() + 2), 50)
+            worksheet.set_column(index, index, width)
+    return output.getvalue()
+
+
+def _timed(label: str, function, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:8.2f} s   pico {peak / 2**20:8.1f} MiB   arquivo {len(result) / 2**20:6.1f} MiB")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--check-rows", type=int, default=2_000, help="linhas usadas na conferência do conteúdo")
+    args = parser.parse_args()
+
+    frame = synthetic_customers(args.rows)
+    print(f"{len(frame)} clientes, {frame.shape[1]} colunas")
+    _timed("to_excel (anterior)", legacy_to_excel, frame)
+    _timed("write_xlsx", lambda data: write_xlsx([("Clientes_Organizados", data)]), frame)
+    _timed("csv", lambda data: export_frame(data, "csv", sheet_name="Clientes_Organizados"), frame)
+
+    sample = frame.head(args.check_rows)
+    legacy = pd.read_excel(io.BytesIO(legacy_to_excel(sample)))
+    current = pd.read_excel(io.BytesIO(write_xlsx([("Clientes_Organizados", sample)])))
+    pd.testing.assert_frame_equal(current, legacy)
+    print("conteúdo idêntico ao da exportação anterior")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Benchmark da análise de jornada com um relatório sintético.
+
+Execução, a partir da raiz do projeto::
+
+    python -m benchmarks.bench_journey --rows 250000
+
+Compara o parser e o motor de conformidade vetorizados de
+``app_core.journey`` com as implementações linha a linha anteriores.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app_core.journey import analyze_compliance, duration_to_minutes, parse_journey_frame
+
+
+def synthetic_report(rows: int, *, seed: int = 7) -> pd.DataFrame:
+    """Gera um relatório bruto com ~``rows`` linhas de dia (31 por motorista)."""
+    rng = np.random.default_rng(seed)
+    drivers = max(1, rows // 31)
+    weekdays = np.array(["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"], dtype=object)
+
+    def clock(minutes: np.ndarray) -> np.ndarray:
+        return np.array([f"{value // 60:02d}:{value % 60:02d}" for value in minutes], dtype=object)
+
+    day_count = drivers * 31
+    body = np.full((day_count, 14), None, dtype=object)
+    body[:, 1] = np.tile(np.arange(1, 32), drivers)
+    body[:, 2] = weekdays[np.arange(day_count) % 7]
+    body[:, 3] = clock(rng.integers(300, 540, day_count))
+    body[:, 4] = clock(rng.integers(960, 1_320, day_count))
+    body[:, 5] = clock(rng.integers(420, 780, day_count))
+    body[:, 6] = clock(rng.integers(300, 600, day_count))
+    body[:, 9] = clock(rng.integers(120, 420, day_count))
+    body[:, 10] = clock(rng.integers(0, 90, day_count))
+    body[:, 11] = clock(rng.integers(30, 90, day_count))
+    body[:, 12] = clock(rng.integers(0, 60, day_count))
+    body[:, 13] = clock(rng.integers(480, 900, day_count))
+
+    header = np.full((drivers, 14), None, dtype=object)
+    header[:, 1] = [f"Motorista {index:05d}" for index in range(drivers)]
+    frame = np.empty((drivers * 32, 14), dtype=object)
+    positions = np.arange(drivers) * 32
+    frame[positions] = header
+    frame[np.setdiff1d(np.arange(drivers * 32), positions)] = body
+    return pd.DataFrame(frame)
+
+
+def legacy_parse(raw: pd.DataFrame) -> pd.DataFrame:
+    records: list[dict] = []
+    current_driver: str | None = None
+    for _, row in raw.iterrows():
+        values = ["" if pd.isna(value) else str(value).strip() for value in row.values]
+        if len(values) > 2 and values[1] and values[1].lower() not in {"dia do mês", "nome", "jornada de motorista"}:
+            if not values[1][0].isdigit() and values[2] == "":
+                current_driver = values[1]
+                continue
+        if len(values) > 13 and current_driver:
+            day = values[1]
+            if day.isdigit() and 1 <= int(day) <= 31:
+                records.append(
+                    {
+                        "Motorista": current_driver,
+                        "Dia": int(day),
+                        "Semana": values[2],
+                        "Início da jornada": values[3],
+                        "Fim da jornada": values[4],
+                        "Jornada total": values[5],
+                        "Condução total": values[6],
+                        "Máxima condução contínua": values[9],
+                        "Espera": values[10],
+                        "Refeição": values[11],
+                        "Descanso": values[12],
+                        "Interjornada": values[13],
+                    }
+                )
+    return pd.DataFrame(records)
+
+
+def legacy_compliance(frame: pd.DataFrame) -> pd.DataFrame:
+    records: list[dict] = []
+    for _, row in frame.iterrows():
+        continuous_minutes = duration_to_minutes(row["Máxima condução contínua"])
+        interjourney_minutes = duration_to_minutes(row["Interjornada"])
+        journey_minutes = duration_to_minutes(row["Jornada total"])
+        critical_message = ""
+        attention_message = ""
+        status = "Conforme"
+        if continuous_minutes > 330:
+            critical_message = f"Direção contínua de {row['Máxima condução contínua']} — referência de 5h30 excedida"
+            status = "Crítico"
+        if 0 < interjourney_minutes < 660:
+            attention_message = f"Interjornada de {row['Interjornada']} — referência mínima de 11h não atingida"
+            if status == "Conforme":
+                status = "Atenção"
+        records.append(
+            {
+                "Motorista": row["Motorista"],
+                "Data de referência": f"{row['Dia']} ({row['Semana']})",
+                "Status": status,
+                "Ocorrência crítica": critical_message,
+                "Ponto de atenção": attention_message,
+                "Tem crítica": bool(critical_message),
+                "Tem atenção": bool(attention_message),
+                "Jornada total (min)": journey_minutes,
+                "Condução contínua (min)": continuous_minutes,
+                "Máxima condução contínua": row["Máxima condução contínua"],
+                "Interjornada": row["Interjornada"],
+            }
+        )
+    return pd.DataFrame(records)
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=250_000, help="linhas de dia no relatório sintético")
+    parser.add_argument("--skip-legacy", action="store_true", help="mede somente a versão vetorizada")
+    args = parser.parse_args()
+
+    raw = synthetic_report(args.rows)
+    flat, parse_seconds = _timed(parse_journey_frame, raw)
+    analysis, compliance_seconds = _timed(analyze_compliance, flat)
+    print(f"Relatório sintético: {len(raw):,} linhas brutas, {len(flat):,} dias")
+    print(f"parse vetorizado:        {parse_seconds:8.3f} s")
+    print(f"conformidade vetorizada: {compliance_seconds:8.3f} s")
+    if args.skip_legacy:
+        return
+
+    legacy_flat, legacy_parse_seconds = _timed(legacy_parse, raw)
+    legacy_analysis, legacy_compliance_seconds = _timed(legacy_compliance, flat)
+    pd.testing.assert_frame_equal(flat, legacy_flat)
+    pd.testing.assert_frame_equal(analysis, legacy_analysis)
+    print(f"parse linha a linha:        {legacy_parse_seconds:8.3f} s ({legacy_parse_seconds / parse_seconds:,.0f}x)")
+    print(
+        f"conformidade linha a linha: {legacy_compliance_seconds:8.3f} s "
+        f"({legacy_compliance_seconds / compliance_seconds:,.0f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark dos leitores de XLSX usados pelas páginas de upload.
+
+Execução, a partir da raiz do projeto::
+
+    python -m benchmarks.bench_spreadsheet --rows 50000
+
+Gera uma exportação sintética no layout da plataforma (cliente na linha 9,
+cabeçalho na linha 12) e compara ``pd.read_excel`` com os leitores de
+``app_core.spreadsheet``. O calamine só é medido quando está instalado.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+from openpyxl import Workbook
+
+from app_core.spreadsheet import CLIENT_INFO_ROW, TABLE_HEADER_ROW, calamine_available, read_excel_sheet
+
+
+def synthetic_export(rows: int) -> bytes:
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Lista de terminais"])
+    for _ in range(CLIENT_INFO_ROW - 1):
+        sheet.append([])
+    sheet.append([None, None, None, "Cliente:", "Transportes Exemplo"])
+    for _ in range(TABLE_HEADER_ROW - CLIENT_INFO_ROW - 1):
+        sheet.append([])
+    sheet.append(["Terminal", "Placa", "Rastreador", "Rastreador Modelo", "Última Transmissão", "Nº Série", "Status"])
+    start = datetime(2024, 5, 1)
+    for index in range(rows):
+        sheet.append(
+            [
+                100_000 + index,
+                f"ABC{index % 9_999:04d}",
+                f"R{index}",
+                "ST-340",
+                start - timedelta(minutes=7 * index),
+                float(800_000 + index),
+                "Ativo",
+            ]
+        )
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000, help="linhas da tabela sintética")
+    args = parser.parse_args()
+
+    data = synthetic_export(args.rows)
+    print(f"Planilha sintética: {args.rows:,} linhas, {len(data) / 1_048_576:.1f} MB")
+    engines = ["pandas", "openpyxl"] + (["calamine"] if calamine_available() else [])
+    reference = None
+    for engine in engines:
+        table, table_seconds = _timed(read_excel_sheet, data, header=TABLE_HEADER_ROW, engine=engine)
+        _, client_seconds = _timed(read_excel_sheet, data, header=None, skiprows=CLIENT_INFO_ROW, nrows=1, engine=engine)
+        if reference is None:
+            reference = table
+        else:
+            pd.testing.assert_frame_equal(table, reference)
+        print(f"{engine:<9} tabela: {table_seconds:8.3f} s   linha do cliente: {client_seconds:8.3f} s")
+    if not calamine_available():
+        print("calamine não instalado (pip install python-calamine) — medição ignorada.")
+
+
+if __name__ == "__main__":
+    main()
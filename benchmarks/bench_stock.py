@@ -0,0 +1,97 @@
+"""Benchmark da conciliação de estoque com seriais sintéticos.
+
+Execução, a partir da raiz do projeto::
+
+    python -m benchmarks.bench_stock --serials 200000
+
+Compara ``app_core.stock`` com a normalização por regex e a conciliação por
+conjuntos usadas anteriormente pela página de estoque.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from app_core.stock import normalize_serials, reconcile_stock
+
+
+def synthetic_inventory(serials: int, *, seed: int = 11) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Exportação do sistema (seriais numéricos lidos como float) e contagem física em texto."""
+    rng = np.random.default_rng(seed)
+    numbers = rng.choice(serials * 10, int(serials * 1.1), replace=False) + 800_000_000
+    system = pd.DataFrame(
+        {
+            "Serial": numbers[:serials].astype(float),
+            "Status": rng.choice(["Disponível", "Em uso", "Indisponível", "Manutenção"], serials),
+            "Modelo": rng.choice(["ST-340", "ST-390", "J16", "GV-75"], serials),
+        }
+    )
+    counted = rng.permutation(numbers[serials // 10 :])[: int(serials * 0.95)]
+    physical = pd.DataFrame({"Serial": [f" {value} " for value in counted]})
+    return system, physical
+
+
+def legacy_normalize(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+
+
+def legacy_reconcile(system_stock: pd.DataFrame, physical_stock: pd.DataFrame):
+    reconciled = physical_stock.merge(system_stock[["Serial", "Status", "Modelo"]], on="Serial", how="left")
+    reconciled["Status"] = reconciled["Status"].fillna("Não encontrado no sistema")
+    reconciled["Modelo"] = reconciled["Modelo"].fillna("Não identificado")
+    expected_in_stock = system_stock[~system_stock["Status"].astype(str).str.casefold().eq("indisponível")]
+    missing_serials = set(expected_in_stock["Serial"]) - set(physical_stock["Serial"])
+    missing_physical = expected_in_stock[expected_in_stock["Serial"].isin(missing_serials)].copy()
+    unknown_system = reconciled[reconciled["Status"] == "Não encontrado no sistema"].copy()
+    return reconciled, unknown_system, missing_physical
+
+
+def _measured(function, *args):
+    """Tempo de uma execução limpa e pico de memória de outra, sob tracemalloc."""
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 1_048_576
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _prepare(normalize, system_raw: pd.DataFrame, physical_raw: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    system = system_raw.assign(Serial=normalize(system_raw["Serial"]))
+    physical = physical_raw.assign(Serial=normalize(physical_raw["Serial"])).drop_duplicates("Serial")
+    return system, physical
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--serials", type=int, default=200_000, help="seriais no relatório do sistema")
+    args = parser.parse_args()
+
+    system_raw, physical_raw = synthetic_inventory(args.serials)
+    print(f"Sistema: {len(system_raw):,} seriais   contagem física: {len(physical_raw):,} seriais")
+    rows = []
+    for label, normalize, reconcile in (
+        ("anterior", legacy_normalize, legacy_reconcile),
+        ("chaves int64", normalize_serials, reconcile_stock),
+    ):
+        (system, physical), normalize_seconds, normalize_peak = _measured(_prepare, normalize, system_raw, physical_raw)
+        result, reconcile_seconds, reconcile_peak = _measured(reconcile, system, physical)
+        rows.append(result)
+        print(
+            f"{label:<13} normalização: {normalize_seconds:7.3f} s ({normalize_peak:6.1f} MB)   "
+            f"conciliação: {reconcile_seconds:7.3f} s ({reconcile_peak:6.1f} MB)"
+        )
+    for legacy, current in zip(*rows):
+        pd.testing.assert_frame_equal(current, legacy)
+    reconciled, unknown, missing = rows[1]
+    print(f"Conciliados: {len(reconciled):,}   não cadastrados: {len(unknown):,}   faltantes: {len(missing):,}")
+
+
+if __name__ == "__main__":
+    main()
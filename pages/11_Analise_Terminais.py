@@ -1,13 +1,20 @@
 from __future__ import annotations
 
-import io
-from datetime import datetime, timedelta
-
 import pandas as pd
 import streamlit as st
 
 import user_management_db as db
 from app_core.auth import require_auth
+from app_core.terminals import (
+    CHANGE_NEWLY_STALE,
+    CHANGE_RECOVERED,
+    CHANGE_STILL_STALE,
+    UNKNOWN_CLIENT,
+    classify_transmissions,
+    compare_with_snapshot,
+    parse_terminal_report,
+    snapshot_documents,
+)
 from app_core.ui import apply_branding, configure_page, render_hero, render_sidebar
 
 configure_page("Análise de Terminais")
@@ -18,87 +25,107 @@ render_hero("Análise de terminais", "Identifique equipamentos sem transmissão
 
 
 @st.cache_data(show_spinner=False)
-def process_terminal_report(file_bytes: bytes, stale_days: int) -> tuple[str, pd.DataFrame]:
-    source = io.BytesIO(file_bytes)
-    client_frame = pd.read_excel(source, header=None, skiprows=8, nrows=1, engine="openpyxl")
-    client_name = "Cliente não identificado"
-    if not client_frame.empty and len(client_frame.columns) > 4:
-        raw_name = client_frame.iloc[0, 4]
-        if pd.notna(raw_name):
-            client_name = str(raw_name).strip()
-
-    source.seek(0)
-    terminals = pd.read_excel(source, header=11, engine="openpyxl")
-    terminals.rename(
-        columns={
-            "Última Transmissão": "Data Transmissão",
-            "Rastreador Modelo": "Modelo",
-        },
-        inplace=True,
+def process_terminal_report(file_bytes: bytes) -> tuple[str, pd.DataFrame]:
+    return parse_terminal_report(file_bytes)
+
+
+def load_reports(uploads: list, stale_days: int) -> tuple[list[tuple[str, str, pd.DataFrame]], list[tuple[str, str]]]:
+    """Analisa cada arquivo e compara com o snapshot salvo do cliente."""
+    parsed, failures = [], []
+    for upload in uploads:
+        try:
+            client_name, terminals = process_terminal_report(upload.getvalue())
+            parsed.append((upload.name, client_name, classify_transmissions(terminals, stale_days)))
+        except Exception as exc:
+            failures.append((upload.name, str(exc)))
+
+    previous = pd.DataFrame(db.get_terminal_snapshots(tuple(sorted({client for _, client, _ in parsed}))))
+    reports = []
+    for filename, client_name, analysis in parsed:
+        client_previous = previous[previous["cliente"] == client_name] if not previous.empty else previous
+        reports.append((filename, client_name, compare_with_snapshot(analysis, client_previous)))
+    return reports, failures
+
+
+def summarize_reports(reports: list[tuple[str, str, pd.DataFrame]]) -> pd.DataFrame:
+    rows = []
+    for filename, client_name, analysis in reports:
+        changes = analysis["Mudança"].value_counts()
+        rows.append(
+            {
+                "Cliente": client_name,
+                "Arquivo": filename,
+                "Terminais": len(analysis),
+                "Desatualizados": int((analysis["Status"] == "Desatualizado").sum()),
+                CHANGE_NEWLY_STALE: int(changes.get(CHANGE_NEWLY_STALE, 0)),
+                CHANGE_RECOVERED: int(changes.get(CHANGE_RECOVERED, 0)),
+                CHANGE_STILL_STALE: int(changes.get(CHANGE_STILL_STALE, 0)),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def render_client(client_name: str, analysis: pd.DataFrame) -> None:
+    updated = analysis[analysis["Status"] == "Atualizado"]
+    stale = analysis[analysis["Status"] == "Desatualizado"].sort_values("Dias sem transmitir", ascending=False)
+
+    st.markdown(f"### Cliente: {client_name}")
+    metric_1, metric_2, metric_3 = st.columns(3)
+    metric_1.metric("Terminais analisados", len(analysis))
+    metric_2.metric("Atualizados", len(updated))
+    metric_3.metric("Desatualizados", len(stale))
+
+    tab_stale, tab_changes, tab_all, tab_message = st.tabs(
+        ["Desatualizados", "Mudanças desde a última carga", "Todos os terminais", "Comunicação ao cliente"]
     )
-    required = {"Terminal", "Placa", "Rastreador", "Modelo", "Data Transmissão"}
-    missing = required - set(terminals.columns)
-    if missing:
-        raise ValueError(f"Colunas ausentes: {', '.join(sorted(missing))}.")
-
-    terminals = terminals.dropna(subset=["Terminal"]).copy()
-    terminals["Data Transmissão"] = pd.to_datetime(terminals["Data Transmissão"], errors="coerce", dayfirst=True)
-    terminals = terminals.dropna(subset=["Data Transmissão"])
-    limit = datetime.now() - timedelta(days=stale_days)
-    terminals["Status"] = terminals["Data Transmissão"].apply(lambda value: "Atualizado" if value >= limit else "Desatualizado")
-    terminals["Dias sem transmitir"] = (pd.Timestamp.now() - terminals["Data Transmissão"]).dt.days.clip(lower=0)
-    return client_name, terminals
-
-
-threshold_col, upload_col = st.columns([1, 3])
-stale_days = threshold_col.number_input("Limite sem transmissão (dias)", min_value=1, max_value=180, value=10, step=1)
-uploaded = upload_col.file_uploader("Relatório lista_de_terminais.xlsx", type=["xlsx"])
-
-if uploaded:
-    try:
-        file_bytes = uploaded.getvalue()
-        client_name, analysis = process_terminal_report(file_bytes, int(stale_days))
-        updated = analysis[analysis["Status"] == "Atualizado"]
-        stale = analysis[analysis["Status"] == "Desatualizado"].sort_values("Dias sem transmitir", ascending=False)
-
-        st.markdown(f"### Cliente: {client_name}")
-        metric_1, metric_2, metric_3 = st.columns(3)
-        metric_1.metric("Terminais analisados", len(analysis))
-        metric_2.metric("Atualizados", len(updated))
-        metric_3.metric("Desatualizados", len(stale))
-
-        tab_stale, tab_all, tab_message = st.tabs(["Desatualizados", "Todos os terminais", "Comunicação ao cliente"])
-        with tab_stale:
-            if stale.empty:
-                st.success("Todos os terminais transmitiram dentro do período definido.")
-            else:
-                st.warning(f"{len(stale)} terminal(is) precisam de verificação.")
-                st.dataframe(
-                    stale[["Terminal", "Placa", "Rastreador", "Modelo", "Data Transmissão", "Dias sem transmitir"]],
-                    width="stretch",
-                    hide_index=True,
-                    column_config={
-                        "Data Transmissão": st.column_config.DatetimeColumn("Última transmissão", format="DD/MM/YYYY HH:mm:ss"),
-                        "Dias sem transmitir": st.column_config.NumberColumn("Dias sem transmitir", format="%d"),
-                    },
-                )
-        with tab_all:
+    with tab_stale:
+        if stale.empty:
+            st.success("Todos os terminais transmitiram dentro do período definido.")
+        else:
+            st.warning(f"{len(stale)} terminal(is) precisam de verificação.")
             st.dataframe(
-                analysis,
+                stale[["Terminal", "Placa", "Rastreador", "Modelo", "Data Transmissão", "Dias sem transmitir"]],
+                width="stretch",
+                hide_index=True,
+                column_config={
+                    "Data Transmissão": st.column_config.DatetimeColumn("Última transmissão", format="DD/MM/YYYY HH:mm:ss"),
+                    "Dias sem transmitir": st.column_config.NumberColumn("Dias sem transmitir", format="%d"),
+                },
+            )
+    with tab_changes:
+        changes = analysis[analysis["Mudança"] != ""]
+        change_counts = changes["Mudança"].value_counts()
+        change_cols = st.columns(3)
+        for column, label in zip(change_cols, (CHANGE_NEWLY_STALE, CHANGE_RECOVERED, CHANGE_STILL_STALE)):
+            column.metric(label, int(change_counts.get(label, 0)))
+        if changes.empty:
+            st.info("Nenhuma mudança de status em relação ao último snapshot salvo.")
+        else:
+            st.dataframe(
+                changes.sort_values(["Mudança", "Dias sem transmitir"], ascending=[True, False])[
+                    ["Mudança", "Terminal", "Placa", "Modelo", "Data Transmissão", "Dias sem transmitir"]
+                ],
                 width="stretch",
                 hide_index=True,
                 column_config={"Data Transmissão": st.column_config.DatetimeColumn("Última transmissão", format="DD/MM/YYYY HH:mm:ss")},
             )
-        with tab_message:
-            if stale.empty:
-                st.info("Não há terminais desatualizados para comunicar.")
-            else:
-                vehicle_lines = "\n".join(
-                    f"- Placa {row['Placa']} — última comunicação em {row['Data Transmissão'].strftime('%d/%m/%Y às %H:%M')}"
-                    for _, row in stale.iterrows()
-                )
-                subject = "Verificação necessária no sistema de rastreamento"
-                body = f"""Prezado(a) cliente,
+    with tab_all:
+        st.dataframe(
+            analysis,
+            width="stretch",
+            hide_index=True,
+            column_config={"Data Transmissão": st.column_config.DatetimeColumn("Última transmissão", format="DD/MM/YYYY HH:mm:ss")},
+        )
+    with tab_message:
+        if stale.empty:
+            st.info("Não há terminais desatualizados para comunicar.")
+        else:
+            vehicle_lines = "\n".join(
+                f"- Placa {row['Placa']} — última comunicação em {row['Data Transmissão'].strftime('%d/%m/%Y às %H:%M')}"
+                for _, row in stale.iterrows()
+            )
+            subject = "Verificação necessária no sistema de rastreamento"
+            body = f"""Prezado(a) cliente,
 
 Identificamos ausência de comunicação recente nos seguintes veículos:
 
@@ -114,18 +141,81 @@ Canais de atendimento:
 
 Atenciosamente,
 Equipe de Monitoramento"""
-                st.text_input("Assunto", value=subject)
-                st.text_area("Mensagem", value=body, height=360)
+            st.text_input("Assunto", value=subject)
+            st.text_area("Mensagem", value=body, height=360)
+
+
+def render_fleet_summary() -> None:
+    fleets = pd.DataFrame(db.get_terminal_fleet_summary())
+    if fleets.empty:
+        return
+    with st.expander(f"Frotas monitoradas ({len(fleets)})"):
+        st.dataframe(
+            fleets.rename(
+                columns={
+                    "cliente": "Cliente",
+                    "terminais": "Terminais",
+                    "desatualizados": "Desatualizados",
+                    "ultima_alteracao": "Última alteração",
+                }
+            ),
+            width="stretch",
+            hide_index=True,
+            column_config={"Última alteração": st.column_config.DatetimeColumn("Última alteração", format="DD/MM/YYYY HH:mm")},
+        )
+
+
+threshold_col, upload_col = st.columns([1, 3])
+stale_days = threshold_col.number_input("Limite sem transmissão (dias)", min_value=1, max_value=180, value=10, step=1)
+uploads = upload_col.file_uploader("Relatórios lista_de_terminais.xlsx", type=["xlsx"], accept_multiple_files=True)
+render_fleet_summary()
+
+if uploads:
+    reports, failures = load_reports(uploads, int(stale_days))
+    for filename, error in failures:
+        st.error(f"Não foi possível processar {filename}: {error}")
+    if reports:
+        summary = summarize_reports(reports)
+        if len(reports) > 1:
+            st.markdown("### Resumo das frotas")
+            st.dataframe(summary.sort_values(CHANGE_NEWLY_STALE, ascending=False), width="stretch", hide_index=True)
+
+        if st.button("Salvar snapshots", type="primary", help="Grava o status atual como referência para a próxima carga."):
+            saved = 0
+            for filename, client_name, analysis in reports:
+                if client_name == UNKNOWN_CLIENT:
+                    st.warning(f"{filename} não identifica o cliente; o snapshot deste arquivo não foi salvo.")
+                    continue
+                counts = db.save_terminal_snapshot(client_name, snapshot_documents(client_name, analysis, int(stale_days)))
+                if counts is None:
+                    st.error(f"Não foi possível salvar o snapshot de {client_name}.")
+                    continue
+                saved += 1
+                db.add_log(
+                    st.session_state.get("username", "sistema"),
+                    "Salvou snapshot de terminais",
+                    {"cliente": client_name, "limite_dias": int(stale_days), **counts},
+                )
+            if saved:
+                st.success(f"Snapshot atualizado para {saved} cliente(s).")
+
+        labels = [f"{client_name} — {filename}" for filename, client_name, _ in reports]
+        selected = st.selectbox("Cliente", range(len(reports)), format_func=labels.__getitem__) if len(reports) > 1 else 0
+        _, client_name, analysis = reports[selected]
+        render_client(client_name, analysis)
 
-        signature = f"{uploaded.name}:{len(file_bytes)}:{stale_days}"
+        signature = f"{sorted((upload.name, upload.size) for upload in uploads)}:{stale_days}"
         if st.session_state.get("terminal_analysis_logged") != signature:
             db.add_log(
                 st.session_state.get("username", "sistema"),
                 "Analisou terminais",
-                {"cliente": client_name, "total": len(analysis), "desatualizados": len(stale), "limite_dias": stale_days},
+                {
+                    "clientes": summary["Cliente"].tolist(),
+                    "total": int(summary["Terminais"].sum()),
+                    "desatualizados": int(summary["Desatualizados"].sum()),
+                    "limite_dias": stale_days,
+                },
             )
             st.session_state.terminal_analysis_logged = signature
-    except Exception as exc:
-        st.error(f"Não foi possível processar o relatório: {exc}")
 else:
-    st.caption("Carregue o relatório para iniciar a análise.")
+    st.caption("Carregue um ou mais relatórios para iniciar a análise.")
@@ -129,9 +129,12 @@ def render_proposal_details(proposal: dict) -> None:
     elif proposal.get("status") == "approved" and proposal.get("approved_by_name"):
         st.success(f"Aprovada por {proposal.get('approved_by_name')}.")
 
-    if proposal.get("status") == "approved" and proposal.get("document_context"):
+    if proposal.get("status") != "approved":
+        return
+    stored = db.get_commercial_proposal(str(proposal.get("_id")), view="document") or {}
+    if stored.get("document_context"):
         try:
-            document = generate_pj_proposal(proposal["document_context"])
+            document = generate_pj_proposal(stored["document_context"])
             company = "_".join(str(proposal.get("empresa") or "Cliente").split())
             code = str(proposal.get("proposal_code") or "PJ")
             st.download_button(
@@ -146,6 +149,15 @@ def render_proposal_details(proposal: dict) -> None:
             st.error(f"Não foi possível gerar o documento aprovado: {exc}")
 
 
+def render_selected_proposal(summary: dict) -> None:
+    # As listagens trazem só o resumo; o detalhe vem da proposta escolhida.
+    proposal = db.get_commercial_proposal(str(summary.get("_id")))
+    if proposal is None:
+        st.error("Não foi possível carregar os detalhes da proposta.")
+        return
+    render_proposal_details(proposal)
+
+
 if IS_APPROVER:
     pending = db.get_commercial_proposals(status="pending_approval", limit=2_000)
     history = db.get_commercial_proposals(status=None, limit=5_000)
@@ -189,7 +201,7 @@ if IS_APPROVER:
                 key="approval_pending_select",
             )
             selected = pending_map[selected_label]
-            render_proposal_details(selected)
+            render_selected_proposal(selected)
 
             rejection_reason = st.text_area(
                 "Justificativa da rejeição",
@@ -274,7 +286,7 @@ if IS_APPROVER:
                     list(history_map),
                     key="approval_history_select",
                 )
-                render_proposal_details(history_map[history_label])
+                render_selected_proposal(history_map[history_label])
         else:
             st.info("Ainda não há propostas no histórico comercial.")
 else:
@@ -307,4 +319,4 @@ else:
         )
         own_map = {proposal_label(item): item for item in own_proposals}
         own_label = st.selectbox("Visualizar proposta", list(own_map), key="own_proposal_select")
-        render_proposal_details(own_map[own_label])
+        render_selected_proposal(own_map[own_label])
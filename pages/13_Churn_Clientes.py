@@ -1,20 +1,34 @@
 from __future__ import annotations
 
-import io
-from collections import defaultdict
+from functools import partial
 
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 
+import user_management_db as db
 from app_core.auth import require_auth
+from app_core.churn import (
+    CHURN_TOTAL,
+    CLASSIFICATION_LABELS,
+    MOVEMENTS,
+    build_metrics_model,
+    classification_documents,
+    classify_period,
+    is_closed_period,
+    period_totals,
+    stale_periods,
+)
+from app_core.exports import XLSX_MIME, write_xlsx
 from app_core.financeiro_mongo import (
+    FINANCE_CACHE_TTL,
     connection_diagnostics,
+    get_client_terminal_snapshots,
     get_month_closures,
     get_monthly_metrics,
-    get_terminal_snapshots,
     period_display,
     previous_period,
+    sync_finance_cache,
 )
 from app_core.ui import (
     apply_branding,
@@ -35,39 +49,6 @@ render_hero(
 )
 
 
-def _safe_float(value, default=0.0) -> float:
-    try:
-        return float(value or 0.0)
-    except (TypeError, ValueError):
-        return float(default)
-
-
-def _safe_int(value, default=0) -> int:
-    try:
-        return int(round(float(value or 0)))
-    except (TypeError, ValueError):
-        return int(default)
-
-
-def _metric_record(item: dict) -> dict:
-    return {
-        "period_key": str(item.get("period_key") or ""),
-        "cliente": str(item.get("cliente") or "").strip(),
-        "receita": _safe_float(item.get("receita") if "receita" in item else item.get("valor_total")),
-        "veiculos_faturados": _safe_int(item.get("veiculos_faturados")),
-        "veiculos_ativos_fim_mes": _safe_int(item.get("veiculos_ativos_fim_mes")),
-        "ativacoes": _safe_int(item.get("ativacoes")),
-        "desativacoes": _safe_int(item.get("desativacoes")),
-        "suspensoes": _safe_int(item.get("suspensoes")),
-        "data_quality": str(item.get("data_quality") or "não informado"),
-        "source": str(item.get("source") or "analytics"),
-    }
-
-
-def _sum_metric(records: list[dict], field: str) -> float:
-    return sum(_safe_float(record.get(field)) for record in records)
-
-
 def _money_delta(value: float) -> str:
     prefix = "+" if value > 0 else ""
     return f"{prefix}{money(value)}"
@@ -77,49 +58,19 @@ def _pct(value: float) -> str:
     return f"{value:+.2f}%".replace(".", ",")
 
 
-def _classification(
-    *,
-    cliente: str,
-    current: dict,
-    previous: dict,
-    selected_period: str,
-    is_closed: bool,
-    historical_active_periods: dict[str, set[str]],
-) -> str:
-    current_active = _safe_int(current.get("veiculos_ativos_fim_mes"))
-    previous_active = _safe_int(previous.get("veiculos_ativos_fim_mes"))
-    current_revenue = _safe_float(current.get("receita"))
-    previous_revenue = _safe_float(previous.get("receita"))
-
-    if previous_active > 0 and current_active <= 0:
-        return "Churn total" if is_closed else "Sem dados no mês"
-
-    if previous_active <= 0 and current_active > 0:
-        older_periods = {period for period in historical_active_periods.get(cliente, set()) if period < selected_period}
-        prior_period = previous_period(selected_period)
-        older_periods.discard(prior_period)
-        return "Reativação" if older_periods else "Novo cliente"
-
-    if previous_active > 0 and current_active > 0:
-        if current_active > previous_active or current_revenue > previous_revenue * 1.005:
-            return "Expansão"
-        if current_active < previous_active or current_revenue < previous_revenue * 0.995:
-            return "Contração"
-        return "Estável"
-
-    return "Sem movimento"
+def _build_excel(detail: pd.DataFrame, monthly: pd.DataFrame) -> bytes:
+    return write_xlsx(
+        [("Churn_Clientes", detail), ("Evolucao_Mensal", monthly)],
+        column_width=18,
+        freeze_header=True,
+        autofilter=True,
+    )
 
 
-def _build_excel(detail: pd.DataFrame, monthly: pd.DataFrame) -> bytes:
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        detail.to_excel(writer, index=False, sheet_name="Churn_Clientes")
-        monthly.to_excel(writer, index=False, sheet_name="Evolucao_Mensal")
-        for worksheet in writer.sheets.values():
-            worksheet.freeze_panes(1, 0)
-            worksheet.autofilter(0, 0, max(1, worksheet.dim_rowmax), max(0, worksheet.dim_colmax))
-            worksheet.set_column(0, max(0, worksheet.dim_colmax), 18)
-    return output.getvalue()
+@st.cache_data(ttl=FINANCE_CACHE_TTL, show_spinner=False)
+def load_metrics_model(closures: dict[str, dict], finance_version: int) -> dict:
+    # Montado uma vez por versão dos dados do Financeiro; os reruns só fatiam o modelo.
+    return build_metrics_model(get_monthly_metrics(), closures)
 
 
 def _snapshot_dataframe(records: list[dict]) -> pd.DataFrame:
@@ -174,22 +125,20 @@ if not diagnostics.get("ok"):
     with st.expander("Diagnóstico técnico"):
         st.write(diagnostics.get("error", "Falha não identificada."))
     st.stop()
+finance_version = sync_finance_cache()
 
-raw_metrics = get_monthly_metrics()
-metrics = [_metric_record(item) for item in raw_metrics]
-metrics = [item for item in metrics if item["period_key"] and item["cliente"]]
-if not metrics:
+closures = {str(item.get("period_key") or ""): item for item in get_month_closures() if item.get("period_key")}
+model = load_metrics_model(closures, finance_version)
+metrics = model["frame"]
+if metrics.empty:
     st.info(
         "Ainda não há histórico financeiro suficiente para a análise. No Financeiro, salve um faturamento "
         "ou use a ação de reconstrução do histórico existente."
     )
     st.stop()
 
-closures = {str(item.get("period_key") or ""): item for item in get_month_closures() if item.get("period_key")}
-periods = sorted({item["period_key"] for item in metrics})
-closed_periods = sorted(
-    period for period, item in closures.items() if str(item.get("status") or "").lower() == "closed" and period in periods
-)
+periods = list(model["periods"])
+closed_periods = sorted(period for period, item in closures.items() if is_closed_period(item) and period in periods)
 default_period = closed_periods[-1] if closed_periods else periods[-1]
 
 filter_1, filter_2, filter_3 = st.columns([1.2, 1.8, 1.4])
@@ -200,89 +149,63 @@ selected_period = filter_1.selectbox(
     format_func=period_display,
 )
 selected_previous = previous_period(selected_period)
-clients = sorted({item["cliente"] for item in metrics})
+clients = metrics["cliente"].cat.categories.tolist()
 selected_clients = filter_2.multiselect("Clientes", clients, default=[])
-classification_filter = filter_3.multiselect(
-    "Movimentos",
-    ["Churn total", "Contração", "Estável", "Expansão", "Novo cliente", "Reativação", "Sem dados no mês", "Sem movimento"],
-    default=[],
-)
+classification_filter = filter_3.multiselect("Movimentos", MOVEMENTS, default=[])
 
-is_closed = str(closures.get(selected_period, {}).get("status") or "").lower() == "closed"
+is_closed = is_closed_period(closures.get(selected_period))
 if not is_closed:
     st.warning(
         f"{period_display(selected_period)} não possui fechamento mensal registrado. Clientes ausentes no mês não serão "
         "tratados como churn total para evitar falso positivo."
     )
 
-by_period_client = {(item["period_key"], item["cliente"]): item for item in metrics}
-historical_active_periods: dict[str, set[str]] = defaultdict(set)
-for item in metrics:
-    if _safe_int(item.get("veiculos_ativos_fim_mes")) > 0:
-        historical_active_periods[item["cliente"]].add(item["period_key"])
-
-current_clients = {item["cliente"] for item in metrics if item["period_key"] == selected_period}
-previous_clients = {item["cliente"] for item in metrics if item["period_key"] == selected_previous}
-comparison_clients = current_clients | previous_clients
-
-rows = []
-for cliente in sorted(comparison_clients):
-    current = by_period_client.get((selected_period, cliente), {})
-    previous = by_period_client.get((selected_previous, cliente), {})
-    classification = _classification(
-        cliente=cliente,
-        current=current,
-        previous=previous,
-        selected_period=selected_period,
-        is_closed=is_closed,
-        historical_active_periods=historical_active_periods,
-    )
-    current_revenue = _safe_float(current.get("receita"))
-    previous_revenue = _safe_float(previous.get("receita"))
-    previous_active = _safe_int(previous.get("veiculos_ativos_fim_mes"))
-    current_active = _safe_int(current.get("veiculos_ativos_fim_mes"))
-    rows.append(
-        {
-            "Cliente": cliente,
-            "Classificação": classification,
-            "Receita anterior": previous_revenue,
-            "Receita atual": current_revenue,
-            "Δ Receita": current_revenue - previous_revenue,
-            "Δ Receita %": ((current_revenue / previous_revenue - 1) * 100) if previous_revenue > 0 else None,
-            "Veículos anterior": previous_active,
-            "Veículos atual": current_active,
-            "Δ Veículos": current_active - previous_active,
-            "Ativações": _safe_int(current.get("ativacoes")),
-            "Desativações": _safe_int(current.get("desativacoes")),
-            "Suspensões": _safe_int(current.get("suspensoes")),
-            "Qualidade": str(current.get("data_quality") or previous.get("data_quality") or "sem dados"),
-        }
-    )
-
-detail_all = pd.DataFrame(rows)
+signatures = model["signatures"]
+# Sem o banco do app, nada é regravado: só o mês selecionado é classificado.
+stored = db.churn_storage_available()
+if stored:
+    for period in stale_periods(signatures, db.get_churn_signatures()):
+        # Só os meses com métricas ou fechamento alterados desde a última gravação.
+        classified = classify_period(model, period, is_closed=is_closed_period(closures.get(period)))
+        if not db.save_churn_period(period, signatures[period], classification_documents(classified), period_totals(model, period)):
+            stored = False
+            break
+if stored:
+    removed_periods = sorted(set(db.get_churn_signatures()) - set(signatures))
+    if removed_periods:
+        db.delete_churn_periods(removed_periods)
+
+rows = db.get_churn_classifications(selected_period) if stored else []
+if rows:
+    detail_all = pd.DataFrame(rows, columns=list(CLASSIFICATION_LABELS))
+else:
+    # Sem a tabela materializada (ou sem gravar), classifica o mês na hora.
+    detail_all = classify_period(model, selected_period, is_closed=is_closed)
+detail_all = detail_all.rename(columns=CLASSIFICATION_LABELS)
+comparison_clients = set(detail_all["Cliente"])
 detail = detail_all.copy()
 if selected_clients:
     detail = detail[detail["Cliente"].isin(selected_clients)]
 if classification_filter:
     detail = detail[detail["Classificação"].isin(classification_filter)]
 
-current_records = [item for item in metrics if item["period_key"] == selected_period]
-previous_records = [item for item in metrics if item["period_key"] == selected_previous]
-current_revenue = _sum_metric(current_records, "receita")
-previous_revenue = _sum_metric(previous_records, "receita")
+current_totals = period_totals(model, selected_period)
+previous_totals = period_totals(model, selected_previous)
+current_revenue = current_totals["receita"]
+previous_revenue = previous_totals["receita"]
 revenue_delta = current_revenue - previous_revenue
 revenue_delta_pct = (revenue_delta / previous_revenue * 100) if previous_revenue else 0.0
-current_active = int(_sum_metric(current_records, "veiculos_ativos_fim_mes"))
-previous_active = int(_sum_metric(previous_records, "veiculos_ativos_fim_mes"))
-deactivations = int(_sum_metric(current_records, "desativacoes"))
-activations = int(_sum_metric(current_records, "ativacoes"))
-client_churn = int((detail_all["Classificação"] == "Churn total").sum()) if not detail_all.empty else 0
+current_active = current_totals["veiculos_ativos_fim_mes"]
+previous_active = previous_totals["veiculos_ativos_fim_mes"]
+deactivations = current_totals["desativacoes"]
+activations = current_totals["ativacoes"]
+client_churn = int((detail_all["Classificação"] == CHURN_TOTAL).sum()) if not detail_all.empty else 0
 vehicle_churn_rate = (deactivations / previous_active * 100) if previous_active else 0.0
 
 metric_1, metric_2, metric_3, metric_4, metric_5, metric_6 = st.columns(6)
 metric_1.metric("Faturamento", money(current_revenue), _money_delta(revenue_delta))
 metric_2.metric("Variação M/M", _pct(revenue_delta_pct))
-metric_3.metric("Clientes ativos", sum(1 for item in current_records if _safe_int(item.get("veiculos_ativos_fim_mes")) > 0))
+metric_3.metric("Clientes ativos", current_totals["clientes_ativos"])
 metric_4.metric("Churn clientes", client_churn)
 metric_5.metric("Base ativa", current_active, f"{current_active - previous_active:+d} veículos")
 metric_6.metric("Churn veículos", _pct(vehicle_churn_rate), f"{deactivations} desativações")
@@ -302,21 +225,22 @@ if not impact.empty:
     fig_impact.update_layout(xaxis_title="", yaxis_title="Variação de receita", margin=dict(l=10, r=10, t=55, b=10))
     st.plotly_chart(fig_impact, width="stretch")
 
-monthly_rows = []
-for period in periods:
-    period_records = [item for item in metrics if item["period_key"] == period]
-    monthly_rows.append(
-        {
-            "Período": period,
-            "Mês": period_display(period),
-            "Faturamento": _sum_metric(period_records, "receita"),
-            "Base ativa": int(_sum_metric(period_records, "veiculos_ativos_fim_mes")),
-            "Ativações": int(_sum_metric(period_records, "ativacoes")),
-            "Desativações": int(_sum_metric(period_records, "desativacoes")),
-            "Suspensões": int(_sum_metric(period_records, "suspensoes")),
+monthly = (
+    model["totals"]
+    .rename(
+        columns={
+            "receita": "Faturamento",
+            "veiculos_ativos_fim_mes": "Base ativa",
+            "ativacoes": "Ativações",
+            "desativacoes": "Desativações",
+            "suspensoes": "Suspensões",
         }
     )
-monthly = pd.DataFrame(monthly_rows).sort_values("Período")
+    .drop(columns="clientes_ativos")
+    .rename_axis("Período")
+    .reset_index()
+)
+monthly.insert(1, "Mês", monthly["Período"].map(period_display))
 
 chart_1, chart_2 = st.columns(2)
 with chart_1:
@@ -365,9 +289,9 @@ else:
     )
     st.download_button(
         "Exportar análise em Excel",
-        data=_build_excel(detail_sorted, monthly),
+        data=partial(_build_excel, detail_sorted, monthly),
         file_name=f"churn_comercial_{selected_period}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        mime=XLSX_MIME,
         type="primary",
     )
 
@@ -376,20 +300,17 @@ st.markdown("### Drill-down por cliente")
 drill_clients = sorted(detail["Cliente"].tolist()) if not detail.empty else sorted(comparison_clients)
 selected_client = st.selectbox("Cliente", drill_clients, index=None, placeholder="Selecione um cliente")
 if selected_client:
-    row = next((item for item in rows if item["Cliente"] == selected_client), None)
-    if row:
+    selected_rows = detail_all[detail_all["Cliente"] == selected_client]
+    if not selected_rows.empty:
+        row = selected_rows.iloc[0]
         d1, d2, d3, d4 = st.columns(4)
         d1.metric("Classificação", row["Classificação"])
         d2.metric("Receita", money(row["Receita atual"]), _money_delta(row["Δ Receita"]))
-        d3.metric("Base ativa", row["Veículos atual"], f"{row['Δ Veículos']:+d}")
+        d3.metric("Base ativa", int(row["Veículos atual"]), f"{int(row['Δ Veículos']):+d}")
         d4.metric("Ativações / desativações", f"{row['Ativações']} / {row['Desativações']}")
 
-    current_snapshots = [
-        item for item in get_terminal_snapshots(selected_period) if str(item.get("cliente") or "").strip() == selected_client
-    ]
-    previous_snapshots = [
-        item for item in get_terminal_snapshots(selected_previous) if str(item.get("cliente") or "").strip() == selected_client
-    ]
+    current_snapshots = get_client_terminal_snapshots(selected_period, selected_client)
+    previous_snapshots = get_client_terminal_snapshots(selected_previous, selected_client)
 
     tab_current, tab_previous = st.tabs(
         [f"{period_display(selected_period)}", f"{period_display(selected_previous)}"]
@@ -428,9 +349,8 @@ if selected_client:
             )
 
 with st.expander("Qualidade e origem dos dados", expanded=False):
-    quality = pd.DataFrame(metrics)
     summary = (
-        quality.groupby("data_quality", as_index=False)
+        metrics.groupby("data_quality", as_index=False, observed=True)
         .agg(Registros=("cliente", "count"), Clientes=("cliente", "nunique"), Periodos=("period_key", "nunique"))
         .sort_values("Registros", ascending=False)
     )
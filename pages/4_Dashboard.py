@@ -6,7 +6,15 @@ import streamlit as st
 
 import user_management_db as db
 from app_core.auth import require_auth
-from app_core.ui import apply_branding, configure_page, money, render_hero, render_sidebar
+from app_core.ui import (
+    apply_branding,
+    configure_page,
+    money,
+    page_cursor,
+    render_hero,
+    render_pager,
+    render_sidebar,
+)
 
 configure_page("Dashboard de Propostas")
 branding = apply_branding()
@@ -24,37 +32,18 @@ STATUS_LABELS = {
     "legacy": "Legado / sem aprovação",
 }
 
-proposals = db.get_all_proposals()
-if not proposals:
+HISTORY_PAGE_SIZE = 50
+
+options = db.get_proposal_filter_options()
+if not options:
     st.info("Ainda não há propostas registradas.")
     st.stop()
 
-df = pd.DataFrame(proposals)
-df["_id"] = df["_id"].astype(str)
-df["data_geracao"] = pd.to_datetime(df["data_geracao"], errors="coerce")
-df["valor_total"] = pd.to_numeric(df["valor_total"], errors="coerce").fillna(0.0)
-df = df.dropna(subset=["data_geracao"])
-for text_column, fallback in (
-    ("consultor", "Não informado"),
-    ("tipo", "Não informado"),
-    ("empresa", "Não informado"),
-):
-    if text_column not in df.columns:
-        df[text_column] = fallback
-    else:
-        df[text_column] = df[text_column].fillna(fallback).astype(str)
-df["mes"] = df["data_geracao"].dt.to_period("M").astype(str)
-if "status" not in df.columns:
-    df["status"] = "legacy"
-else:
-    df["status"] = df["status"].fillna("legacy").astype(str)
-df["status_label"] = df["status"].map(STATUS_LABELS).fillna(df["status"])
-
 with st.expander("Filtros", expanded=False):
     filter_1, filter_2, filter_3, filter_4 = st.columns(4)
-    consultants = sorted(df["consultor"].dropna().astype(str).unique().tolist())
-    types = sorted(df["tipo"].dropna().astype(str).unique().tolist())
-    statuses = sorted(df["status"].dropna().astype(str).unique().tolist())
+    consultants = options["consultores"]
+    types = options["tipos"]
+    statuses = options["status"]
     selected_consultants = filter_1.multiselect("Consultores", consultants, default=consultants)
     selected_types = filter_2.multiselect("Tipos", types, default=types)
     selected_statuses = filter_3.multiselect(
@@ -63,8 +52,8 @@ with st.expander("Filtros", expanded=False):
         default=statuses,
         format_func=lambda value: STATUS_LABELS.get(value, value),
     )
-    min_date = df["data_geracao"].min().date()
-    max_date = df["data_geracao"].max().date()
+    min_date = options["inicio"]
+    max_date = options["fim"]
     selected_dates = filter_4.date_input(
         "Período",
         value=(min_date, max_date),
@@ -72,35 +61,28 @@ with st.expander("Filtros", expanded=False):
         max_value=max_date,
     )
 
-filtered = df[
-    df["consultor"].isin(selected_consultants)
-    & df["tipo"].isin(selected_types)
-    & df["status"].isin(selected_statuses)
-].copy()
+# Os filtros viram a chave do cache; o agrupamento é feito no MongoDB.
+filters = (tuple(selected_consultants), tuple(selected_types), tuple(selected_statuses))
 if isinstance(selected_dates, tuple) and len(selected_dates) == 2:
-    start_date, end_date = selected_dates
-    filtered = filtered[
-        (filtered["data_geracao"].dt.date >= start_date)
-        & (filtered["data_geracao"].dt.date <= end_date)
-    ]
+    filters += tuple(selected_dates)
+rollups = db.get_proposal_rollups(*filters)
+totals = rollups["totals"]
 
-if filtered.empty:
+if not totals["propostas"]:
     st.warning("Nenhuma proposta corresponde aos filtros selecionados.")
     st.stop()
 
-average_ticket = filtered["valor_total"].mean()
-top_consultant = filtered.groupby("consultor")["valor_total"].sum().sort_values(ascending=False).index[0]
-pending_count = int((filtered["status"] == "pending_approval").sum())
+consultant_summary = pd.DataFrame(rollups["by_consultant"])
 metric_1, metric_2, metric_3, metric_4, metric_5 = st.columns(5)
-metric_1.metric("Propostas", len(filtered))
-metric_2.metric("Valor total", money(filtered["valor_total"].sum()))
-metric_3.metric("Ticket médio", money(average_ticket))
-metric_4.metric("Pendentes", pending_count)
-metric_5.metric("Consultor líder", top_consultant)
+metric_1.metric("Propostas", totals["propostas"])
+metric_2.metric("Valor total", money(totals["valor_total"]))
+metric_3.metric("Ticket médio", money(totals["valor_total"] / totals["propostas"]))
+metric_4.metric("Pendentes", totals["pendentes"])
+metric_5.metric("Consultor líder", consultant_summary["consultor"].iloc[0])
 
 chart_1, chart_2 = st.columns(2)
 with chart_1:
-    monthly = filtered.groupby("mes", as_index=False)["valor_total"].sum()
+    monthly = pd.DataFrame(rollups["monthly"])
     fig_monthly = px.bar(monthly, x="mes", y="valor_total", title="Valor por mês")
     fig_monthly.update_traces(marker_color=branding["primary_color"])
     fig_monthly.update_layout(
@@ -114,7 +96,8 @@ with chart_1:
     st.plotly_chart(fig_monthly, width="stretch")
 
 with chart_2:
-    by_status = filtered.groupby("status_label", as_index=False)["valor_total"].sum()
+    by_status = pd.DataFrame(rollups["by_status"])
+    by_status["status_label"] = by_status["status"].map(STATUS_LABELS).fillna(by_status["status"])
     color_sequence = [
         branding["primary_color"],
         branding["accent_color"],
@@ -137,31 +120,26 @@ with chart_2:
     )
     st.plotly_chart(fig_status, width="stretch")
 
-consultant_summary = (
-    filtered.groupby("consultor", as_index=False)
-    .agg(
-        Propostas=("_id", "count"),
-        Valor_total=("valor_total", "sum"),
-        Ticket_medio=("valor_total", "mean"),
-        Pendentes=("status", lambda values: int((values == "pending_approval").sum())),
-    )
-    .sort_values("Valor_total", ascending=False)
-)
 st.markdown("### Desempenho por consultor")
 st.dataframe(
-    consultant_summary,
+    consultant_summary[["consultor", "propostas", "valor_total", "ticket_medio", "pendentes"]],
     width="stretch",
     hide_index=True,
     column_config={
         "consultor": "Consultor",
-        "Propostas": "Propostas",
-        "Pendentes": "Pendentes",
-        "Valor_total": st.column_config.NumberColumn("Valor total", format="R$ %.2f"),
-        "Ticket_medio": st.column_config.NumberColumn("Ticket médio", format="R$ %.2f"),
+        "propostas": "Propostas",
+        "pendentes": "Pendentes",
+        "valor_total": st.column_config.NumberColumn("Valor total", format="R$ %.2f"),
+        "ticket_medio": st.column_config.NumberColumn("Ticket médio", format="R$ %.2f"),
     },
 )
 
 st.markdown("### Histórico")
+cursor = page_cursor("dashboard_history_page", filters)
+history_page = db.get_proposal_history(*filters, **cursor, page_size=HISTORY_PAGE_SIZE)
+history = pd.DataFrame(history_page["items"], columns=["_id", *db.PROPOSAL_HISTORY_FIELDS])
+history["valor_total"] = pd.to_numeric(history["valor_total"], errors="coerce").fillna(0.0)
+history["status_label"] = history["status"].map(STATUS_LABELS).fillna(history["status"])
 history_columns = [
     "data_geracao",
     "consultor",
@@ -171,7 +149,7 @@ history_columns = [
     "valor_total",
 ]
 st.dataframe(
-    filtered[history_columns].sort_values("data_geracao", ascending=False),
+    history[history_columns],
     width="stretch",
     hide_index=True,
     column_config={
@@ -183,13 +161,23 @@ st.dataframe(
         "valor_total": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
     },
 )
+render_pager("dashboard_history_page", history_page)
 
 if st.session_state.get("role") == "admin":
     with st.expander("Excluir proposta"):
+        # Busca própria: qualquer proposta pode ser excluída, não só as da página atual.
+        term = st.text_input("Buscar proposta", placeholder="Cliente, consultor, código ou ID")
+        found = pd.DataFrame(db.search_proposals(term), columns=["_id", *db.PROPOSAL_HISTORY_FIELDS])
+        found["data_geracao"] = pd.to_datetime(found["data_geracao"], errors="coerce")
+        found["valor_total"] = pd.to_numeric(found["valor_total"], errors="coerce").fillna(0.0)
         options = {
-            f"{row['empresa']} — {row['tipo']} — {row['data_geracao'].strftime('%d/%m/%Y %H:%M')} — {money(row['valor_total'])}": row["_id"]
-            for _, row in filtered.iterrows()
+            f"{row['empresa']} — {row['tipo']} — "
+            f"{row['data_geracao'].strftime('%d/%m/%Y %H:%M') if pd.notna(row['data_geracao']) else 'sem data'} — "
+            f"{money(row['valor_total'])} — {row['_id']}": str(row["_id"])
+            for _, row in found.iterrows()
         }
+        if term.strip() and not options:
+            st.caption("Nenhuma proposta encontrada.")
         selected = st.selectbox("Proposta", list(options), index=None, placeholder="Selecione uma proposta")
         confirmation = st.checkbox("Confirmo a exclusão permanente")
         if st.button("Excluir proposta", type="primary", disabled=not selected or not confirmation):
@@ -1,16 +1,28 @@
 from __future__ import annotations
 
-import io
-import unicodedata
-from datetime import datetime, time, timedelta
+from datetime import date
+from functools import partial
 
 import pandas as pd
 import plotly.express as px
 import streamlit as st
-from fpdf import FPDF
 
 import user_management_db as db
 from app_core.auth import require_auth
+from app_core.exports import XLSX_MIME, write_xlsx
+from app_core.financeiro_mongo import period_display, previous_period
+from app_core.journey import (
+    MAX_CONTINUOUS_DRIVING_MINUTES,
+    MIN_INTERJOURNEY_MINUTES,
+    REPORT_COLUMNS,
+    analyze_compliance,
+    iter_batch_audit,
+    iter_journey_report,
+    journey_day_documents,
+    parse_journey_frame,
+    read_journey_sheet,
+)
+from app_core.journey_report import create_pdf_report, report_fingerprint
 from app_core.ui import apply_branding, configure_page, render_hero, render_sidebar
 
 configure_page("Análise de Jornada")
@@ -20,169 +32,273 @@ render_sidebar()
 render_hero("Análise de jornada", "Avalie direção contínua, interjornada e ocorrências indicativas de não conformidade.")
 st.caption("A análise é gerencial e indicativa. Casos trabalhistas devem ser validados pelas áreas jurídica e de recursos humanos.")
 
-
-def duration_to_minutes(value: object) -> int:
-    if value is None or pd.isna(value):
-        return 0
-    if isinstance(value, pd.Timedelta):
-        return max(0, int(value.total_seconds() // 60))
-    if isinstance(value, timedelta):
-        return max(0, int(value.total_seconds() // 60))
-    if isinstance(value, (datetime, time, pd.Timestamp)):
-        return int(value.hour * 60 + value.minute)
-    if isinstance(value, (float, int)):
-        # Valores de duração do Excel são frações de um dia.
-        return max(0, int(round(float(value) * 24 * 60)))
-
-    text = str(value).strip()
-    if not text or text.lower() in {"nan", "nat", "00:00:00"}:
-        return 0
-    try:
-        if "day" in text:
-            return max(0, int(pd.to_timedelta(text).total_seconds() // 60))
-        parts = text.split(":")
-        if len(parts) >= 2:
-            return max(0, int(float(parts[0])) * 60 + int(float(parts[1])))
-    except (TypeError, ValueError):
-        return 0
-    return 0
+# CSVs acima deste tamanho são lidos em blocos, direto do arquivo enviado.
+STREAMING_MIN_BYTES = 20 * 1024 * 1024
 
 
 @st.cache_data(show_spinner=False)
 def process_report(file_bytes: bytes, filename: str) -> pd.DataFrame:
-    buffer = io.BytesIO(file_bytes)
-    if filename.lower().endswith(".csv"):
-        try:
-            raw = pd.read_csv(buffer, header=None, encoding="utf-8", sep=None, engine="python")
-        except UnicodeDecodeError:
-            buffer.seek(0)
-            raw = pd.read_csv(buffer, header=None, encoding="latin-1", sep=None, engine="python")
+    return parse_journey_frame(read_journey_sheet(file_bytes, filename))
+
+
+def stream_report(uploaded) -> pd.DataFrame:
+    """Processa CSVs grandes bloco a bloco, sem duplicar o arquivo em memória."""
+    cached = st.session_state.get("journey_stream_cache")
+    if cached and cached["file_id"] == uploaded.file_id:
+        return cached["frame"]
+
+    progress = st.progress(0.0, text="Lendo relatório em blocos...")
+    frames: list[pd.DataFrame] = []
+    days = 0
+    uploaded.seek(0)
+    for frame in iter_journey_report(uploaded, uploaded.name):
+        frames.append(frame)
+        days += len(frame)
+        progress.progress(min(uploaded.tell() / max(uploaded.size, 1), 1.0), text=f"{days:,} dias lidos".replace(",", "."))
+    progress.empty()
+
+    flat = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=REPORT_COLUMNS)
+    st.session_state.journey_stream_cache = {"file_id": uploaded.file_id, "frame": flat}
+    return flat
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_pdf_report(fingerprint: str, _critical: pd.DataFrame, _attention: pd.DataFrame, total_days: int, total_drivers: int) -> bytes:
+    # A chave do cache é a impressão digital do conteúdo; os DataFrames não são
+    # hasheados pelo Streamlit a cada execução.
+    return create_pdf_report(_critical, _attention, total_days, total_drivers)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_batch_excel(batch_key: str, _summary: pd.DataFrame, _critical: pd.DataFrame, _attention: pd.DataFrame) -> bytes:
+    return write_xlsx(
+        [
+            ("Resumo_Arquivos", _summary),
+            ("Ocorrencias_Criticas", _critical[["Arquivo", "Motorista", "Data de referência", "Ocorrência crítica"]]),
+            ("Pontos_Atencao", _attention[["Arquivo", "Motorista", "Data de referência", "Ponto de atenção"]]),
+        ],
+        column_width=28,
+        freeze_header=True,
+    )
+
+
+def _with_file_label(frame: pd.DataFrame) -> pd.DataFrame:
+    # No PDF consolidado, o arquivo distingue motoristas homônimos de clientes diferentes.
+    labeled = frame.copy()
+    labeled["Motorista"] = labeled["Motorista"].astype(str) + " (" + labeled["Arquivo"].astype(str) + ")"
+    return labeled
+
+
+def render_batch_audit(uploads: list, max_continuous_minutes: int, min_interjourney_minutes: int) -> None:
+    batch_key = (tuple(sorted(upload.file_id for upload in uploads)), max_continuous_minutes, min_interjourney_minutes)
+    cached = st.session_state.get("journey_batch")
+    if cached and cached["key"] == batch_key:
+        summary, consolidated = cached["summary"], cached["analysis"]
     else:
-        raw = pd.read_excel(buffer, header=None)
-
-    records: list[dict] = []
-    current_driver: str | None = None
-    for _, row in raw.iterrows():
-        values = ["" if pd.isna(value) else str(value).strip() for value in row.values]
-        if len(values) > 2 and values[1] and values[1].lower() not in {"dia do mês", "nome", "jornada de motorista"}:
-            if not values[1][0].isdigit() and values[2] == "":
-                current_driver = values[1]
-                continue
-        if len(values) > 13 and current_driver:
-            day = values[1]
-            if day.isdigit() and 1 <= int(day) <= 31:
-                records.append(
-                    {
-                        "Motorista": current_driver,
-                        "Dia": int(day),
-                        "Semana": values[2],
-                        "Início da jornada": values[3],
-                        "Fim da jornada": values[4],
-                        "Jornada total": values[5],
-                        "Condução total": values[6],
-                        "Máxima condução contínua": values[9],
-                        "Espera": values[10],
-                        "Refeição": values[11],
-                        "Descanso": values[12],
-                        "Interjornada": values[13],
-                    }
-                )
-    return pd.DataFrame(records)
-
-
-def analyze_compliance(frame: pd.DataFrame) -> pd.DataFrame:
-    records: list[dict] = []
-    for _, row in frame.iterrows():
-        continuous_minutes = duration_to_minutes(row["Máxima condução contínua"])
-        interjourney_minutes = duration_to_minutes(row["Interjornada"])
-        journey_minutes = duration_to_minutes(row["Jornada total"])
-
-        critical_message = ""
-        attention_message = ""
-        status = "Conforme"
-        if continuous_minutes > 330:
-            critical_message = f"Direção contínua de {row['Máxima condução contínua']} — referência de 5h30 excedida"
-            status = "Crítico"
-        if 0 < interjourney_minutes < 660:
-            attention_message = f"Interjornada de {row['Interjornada']} — referência mínima de 11h não atingida"
-            if status == "Conforme":
-                status = "Atenção"
-
-        records.append(
+        progress = st.progress(0.0, text="Processando relatórios...")
+        live_table = st.empty()
+        summary_rows: list[dict] = []
+        frames: list[pd.DataFrame] = []
+        results = iter_batch_audit(
+            [(upload.name, upload.getvalue()) for upload in uploads],
+            max_continuous_minutes=max_continuous_minutes,
+            min_interjourney_minutes=min_interjourney_minutes,
+        )
+        for done, (filename, analysis, error) in enumerate(results, start=1):
+            if not error and analysis.empty:
+                error = "Nenhuma linha de jornada identificada."
+            summary_rows.append(
+                {
+                    "Arquivo": filename,
+                    "Motoristas": analysis["Motorista"].nunique(),
+                    "Dias analisados": len(analysis),
+                    "Ocorrências críticas": int(analysis["Tem crítica"].sum()),
+                    "Pontos de atenção": int(analysis["Tem atenção"].sum()),
+                    "Erro": error,
+                }
+            )
+            if not analysis.empty:
+                frames.append(analysis.assign(Arquivo=filename))
+            progress.progress(done / len(uploads), text=f"{done} de {len(uploads)} arquivos processados")
+            live_table.dataframe(pd.DataFrame(summary_rows), width="stretch", hide_index=True)
+        progress.empty()
+        live_table.empty()
+
+        summary = pd.DataFrame(summary_rows).sort_values("Arquivo", ignore_index=True)
+        consolidated = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        st.session_state.journey_batch = {"key": batch_key, "summary": summary, "analysis": consolidated}
+        db.add_log(
+            st.session_state.get("username", "sistema"),
+            "Analisou jornada em lote",
             {
-                "Motorista": row["Motorista"],
-                "Data de referência": f"{row['Dia']} ({row['Semana']})",
-                "Status": status,
-                "Ocorrência crítica": critical_message,
-                "Ponto de atenção": attention_message,
-                "Tem crítica": bool(critical_message),
-                "Tem atenção": bool(attention_message),
-                "Jornada total (min)": journey_minutes,
-                "Condução contínua (min)": continuous_minutes,
-                "Máxima condução contínua": row["Máxima condução contínua"],
-                "Interjornada": row["Interjornada"],
-            }
+                "arquivos": len(uploads),
+                "falhas": int(summary["Erro"].ne("").sum()),
+                "dias": len(consolidated),
+                "criticas": int(summary["Ocorrências críticas"].sum()),
+                "atencao": int(summary["Pontos de atenção"].sum()),
+            },
         )
-    return pd.DataFrame(records)
-
-
-def _ascii(value: object) -> str:
-    text = unicodedata.normalize("NFKD", str(value)).encode("latin-1", "ignore").decode("latin-1")
-    return text
-
-
-def create_pdf_report(critical: pd.DataFrame, attention: pd.DataFrame, total_days: int, total_drivers: int) -> bytes:
-    class PDF(FPDF):
-        def header(self):
-            self.set_font("helvetica", "B", 14)
-            self.cell(0, 10, "Relatorio de Auditoria de Jornada", new_x="LMARGIN", new_y="NEXT", align="C")
-            self.ln(3)
-
-        def footer(self):
-            self.set_y(-15)
-            self.set_font("helvetica", "I", 8)
-            self.cell(0, 10, f"Pagina {self.page_no()}", align="C")
-
-    pdf = PDF()
-    pdf.add_page()
-    pdf.set_font("helvetica", "B", 12)
-    pdf.cell(0, 9, "Resumo executivo", new_x="LMARGIN", new_y="NEXT")
-    pdf.set_font("helvetica", size=10)
-    for line in (
-        f"Dias analisados: {total_days}",
-        f"Motoristas auditados: {total_drivers}",
-        f"Ocorrencias criticas: {len(critical)}",
-        f"Pontos de atencao: {len(attention)}",
-    ):
-        pdf.cell(0, 7, line, new_x="LMARGIN", new_y="NEXT")
-    pdf.ln(5)
-
-    def add_section(title: str, frame: pd.DataFrame, message_column: str) -> None:
-        if frame.empty:
-            return
-        pdf.set_font("helvetica", "B", 11)
-        pdf.cell(0, 8, _ascii(title), new_x="LMARGIN", new_y="NEXT")
-        pdf.set_font("helvetica", size=8)
-        for _, row in frame.iterrows():
-            line = f"{_ascii(row['Motorista'])} | {_ascii(row['Data de referência'])} | {_ascii(row[message_column])}"
-            pdf.multi_cell(0, 6, line, border=1)
-        pdf.ln(4)
-
-    add_section("Ocorrencias criticas", critical, "Ocorrência crítica")
-    add_section("Pontos de atencao", attention, "Ponto de atenção")
-    return bytes(pdf.output())
-
-
-uploaded = st.file_uploader("Relatório de jornada", type=["xlsx", "csv"])
+
+    failures = summary[summary["Erro"] != ""]
+    metrics = st.columns(4)
+    metrics[0].metric("Arquivos processados", len(summary) - len(failures))
+    metrics[1].metric("Dias analisados", int(summary["Dias analisados"].sum()))
+    metrics[2].metric("Ocorrências críticas", int(summary["Ocorrências críticas"].sum()))
+    metrics[3].metric("Pontos de atenção", int(summary["Pontos de atenção"].sum()))
+    if not failures.empty:
+        st.warning(f"{len(failures)} arquivo(s) não puderam ser analisados.")
+
+    st.markdown("#### Consolidado por arquivo")
+    st.dataframe(summary, width="stretch", hide_index=True)
+    if consolidated.empty:
+        return
+
+    critical = consolidated[consolidated["Tem crítica"]]
+    attention = consolidated[consolidated["Tem atenção"]]
+    st.markdown("#### Ocorrências")
+    st.dataframe(
+        consolidated[consolidated["Status"] != "Conforme"][
+            ["Arquivo", "Motorista", "Data de referência", "Status", "Ocorrência crítica", "Ponto de atenção"]
+        ],
+        width="stretch",
+        hide_index=True,
+    )
+
+    pdf_critical = _with_file_label(critical)
+    pdf_attention = _with_file_label(attention)
+    total_drivers = int(summary["Motoristas"].sum())
+    fingerprint = report_fingerprint(pdf_critical, pdf_attention, len(consolidated), total_drivers)
+    pdf_col, excel_col = st.columns(2)
+    pdf_col.download_button(
+        "Baixar relatório consolidado em PDF",
+        data=partial(build_pdf_report, fingerprint, pdf_critical, pdf_attention, len(consolidated), total_drivers),
+        file_name="relatorio_auditoria_jornada_lote.pdf",
+        mime="application/pdf",
+        type="primary",
+        width="stretch",
+    )
+    excel_col.download_button(
+        "Baixar consolidado em Excel",
+        data=partial(build_batch_excel, repr(batch_key), summary, critical, attention),
+        file_name="auditoria_jornada_lote.xlsx",
+        mime=XLSX_MIME,
+        width="stretch",
+    )
+
+
+def recent_periods(count: int = 24) -> list[str]:
+    periods = [date.today().strftime("%Y-%m")]
+    while len(periods) < count:
+        periods.append(previous_period(periods[-1]))
+    return periods
+
+
+def render_history_tab(flat: pd.DataFrame, analysis: pd.DataFrame) -> None:
+    period_col, save_col = st.columns([2, 1])
+    period_key = period_col.selectbox(
+        "Mês de referência do relatório",
+        recent_periods(),
+        index=1,
+        format_func=period_display,
+        key="journey_history_period",
+    )
+    if save_col.button("Salvar no histórico", type="primary", width="stretch"):
+        with st.spinner("Gravando dias alterados..."):
+            counts = db.save_journey_days(period_key, journey_day_documents(flat, analysis, period_key))
+        if counts is None:
+            st.error("Não foi possível gravar o histórico de jornada.")
+        else:
+            st.success(
+                f"{counts['inseridos']} dias novos, {counts['atualizados']} atualizados "
+                f"e {counts['inalterados']} sem alteração em {period_display(period_key)}."
+            )
+            db.add_log(
+                st.session_state.get("username", "sistema"),
+                "Salvou histórico de jornada",
+                {"periodo": period_key, **counts},
+            )
+
+    drivers = sorted(analysis["Motorista"].unique().tolist())
+    history = pd.DataFrame(db.get_journey_driver_months(tuple(drivers)))
+    if history.empty:
+        st.info("Nenhum mês salvo no histórico para os motoristas deste relatório.")
+        return
+
+    history["Mês"] = history["periodo"].map(period_display)
+    totals = history.groupby(["periodo", "Mês"], as_index=False)[["criticas", "atencao"]].sum()
+    trend = px.line(
+        totals.melt(id_vars=["periodo", "Mês"], var_name="Tipo", value_name="Dias").replace(
+            {"Tipo": {"criticas": "Ocorrências críticas", "atencao": "Pontos de atenção"}}
+        ),
+        x="Mês",
+        y="Dias",
+        color="Tipo",
+        markers=True,
+        title="Evolução mensal dos motoristas deste relatório",
+    )
+    st.plotly_chart(trend, width="stretch")
+    recurring = (
+        history[history["criticas"] > 0]
+        .groupby("motorista")
+        .agg(meses=("periodo", "nunique"), criticas=("criticas", "sum"))
+        .query("meses > 1")
+        .sort_values(["meses", "criticas"], ascending=False)
+        .rename_axis("Motorista")
+        .reset_index()
+        .rename(columns={"meses": "Meses com ocorrência", "criticas": "Dias críticos"})
+    )
+    st.markdown("#### Reincidência entre meses")
+    if recurring.empty:
+        st.success("Nenhum motorista com ocorrências críticas em mais de um mês.")
+    else:
+        st.dataframe(recurring, width="stretch", hide_index=True)
+
+
+batch_mode = st.toggle("Auditar vários relatórios em lote", key="journey_batch_mode")
+continuous_col, interjourney_col, upload_col = st.columns([1, 1, 2])
+max_continuous = continuous_col.number_input(
+    "Condução contínua máxima (min)",
+    min_value=30,
+    max_value=1_440,
+    value=MAX_CONTINUOUS_DRIVING_MINUTES,
+    step=15,
+)
+min_interjourney = interjourney_col.number_input(
+    "Interjornada mínima (min)",
+    min_value=30,
+    max_value=1_440,
+    value=MIN_INTERJOURNEY_MINUTES,
+    step=15,
+)
+if batch_mode:
+    uploads = upload_col.file_uploader(
+        "Relatórios de jornada",
+        type=["xlsx", "csv"],
+        accept_multiple_files=True,
+        key="journey_batch_upload",
+    )
+    if uploads:
+        render_batch_audit(uploads, int(max_continuous), int(min_interjourney))
+    else:
+        st.caption("Carregue os relatórios em XLSX ou CSV para iniciar a auditoria em lote.")
+    st.stop()
+
+uploaded = upload_col.file_uploader("Relatório de jornada", type=["xlsx", "csv"])
 if uploaded:
     try:
-        file_bytes = uploaded.getvalue()
-        flat = process_report(file_bytes, uploaded.name)
+        if uploaded.name.lower().endswith(".csv") and uploaded.size >= STREAMING_MIN_BYTES:
+            flat = stream_report(uploaded)
+        else:
+            flat = process_report(uploaded.getvalue(), uploaded.name)
         if flat.empty:
             st.error("Nenhuma linha de jornada foi identificada. Verifique a estrutura do relatório.")
             st.stop()
 
-        analysis = analyze_compliance(flat)
+        analysis = analyze_compliance(
+            flat,
+            max_continuous_minutes=int(max_continuous),
+            min_interjourney_minutes=int(min_interjourney),
+        )
         critical = analysis[analysis["Tem crítica"]]
         attention = analysis[analysis["Tem atenção"]]
 
@@ -192,8 +308,8 @@ if uploaded:
         metrics[2].metric("Ocorrências críticas", len(critical))
         metrics[3].metric("Pontos de atenção", len(attention))
 
-        tab_risk, tab_charts, tab_data, tab_communication = st.tabs(
-            ["Gestão de risco", "Inteligência de dados", "Lista detalhada", "Comunicação"]
+        tab_risk, tab_charts, tab_data, tab_communication, tab_history = st.tabs(
+            ["Gestão de risco", "Inteligência de dados", "Lista detalhada", "Comunicação", "Histórico"]
         )
 
         with tab_risk:
@@ -232,7 +348,7 @@ if uploaded:
                     hover_data=["Motorista", "Data de referência", "Máxima condução contínua"],
                     title="Jornada total versus condução contínua",
                 )
-                figure.add_hline(y=330, line_dash="dash", annotation_text="Referência de 5h30")
+                figure.add_hline(y=int(max_continuous), line_dash="dash", annotation_text=f"Referência de {int(max_continuous)} min")
                 st.plotly_chart(figure, width="stretch")
             with rank_col:
                 ranking = critical["Motorista"].value_counts().head(10).rename_axis("Motorista").reset_index(name="Ocorrências")
@@ -274,17 +390,21 @@ Equipe de Gestão de Frotas"""
             with communication_col:
                 st.text_area("Texto sugerido", value=email_body, height=330)
             with report_col:
-                pdf_bytes = create_pdf_report(critical, attention, len(analysis), analysis["Motorista"].nunique())
+                total_drivers = analysis["Motorista"].nunique()
+                fingerprint = report_fingerprint(critical, attention, len(analysis), total_drivers)
                 st.download_button(
                     "Baixar relatório em PDF",
-                    data=pdf_bytes,
+                    data=partial(build_pdf_report, fingerprint, critical, attention, len(analysis), total_drivers),
                     file_name="relatorio_auditoria_jornada.pdf",
                     mime="application/pdf",
                     type="primary",
                     width="stretch",
                 )
 
-        signature = f"{uploaded.name}:{len(file_bytes)}"
+        with tab_history:
+            render_history_tab(flat, analysis)
+
+        signature = f"{uploaded.name}:{uploaded.size}:{max_continuous}:{min_interjourney}"
         if st.session_state.get("journey_analysis_logged") != signature:
             db.add_log(
                 st.session_state.get("username", "sistema"),
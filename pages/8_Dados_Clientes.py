@@ -1,13 +1,15 @@
 from __future__ import annotations
 
-import io
-import re
+from functools import partial
 
 import pandas as pd
 import streamlit as st
 
 import user_management_db as db
 from app_core.auth import require_auth
+from app_core.customers import normalize_customer_columns, organize_customers
+from app_core.exports import EXPORT_FORMATS, export_formats, export_frame
+from app_core.spreadsheet import TABLE_HEADER_ROW, read_excel_sheet
 from app_core.ui import apply_branding, configure_page, render_hero, render_sidebar
 
 configure_page("Organizador de Dados de Clientes")
@@ -16,93 +18,18 @@ require_auth()
 render_sidebar()
 render_hero("Organizador de dados de clientes", "Transforme o relatório exportado pelo sistema em uma base consolidada de clientes PF e PJ.")
 
-EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
-
-
-def is_valid_email(value: object) -> bool:
-    if not isinstance(value, str):
-        return False
-    text = value.strip()
-    return bool(text and text.lower() not in {"e-mail", "email", "cpf/cnpj"} and EMAIL_RE.fullmatch(text))
-
 
 @st.cache_data(show_spinner=False)
 def process_spreadsheet(file_bytes: bytes) -> pd.DataFrame:
-    frame = pd.read_excel(io.BytesIO(file_bytes), header=11)
-    frame = frame.loc[:, ~frame.columns.astype(str).str.contains(r"^Unnamed", na=False)]
-    frame.dropna(axis="rows", how="all", inplace=True)
-    frame.columns = frame.columns.astype(str).str.strip().str.lower()
-    frame.rename(
-        columns={
-            "razão social": "nome_cliente",
-            "nome do cliente": "nome_cliente",
-            "cnpj": "cpf_cnpj",
-            "cpf/cnpj": "cpf_cnpj",
-            "tipo cliente": "tipo_cliente",
-            "tipo de cliente": "tipo_cliente",
-            "tipo": "tipo_cliente",
-            "telefone": "telefone",
-            "fone": "telefone",
-        },
-        inplace=True,
-    )
-
-    required = {"nome_cliente", "cpf_cnpj", "tipo_cliente"}
-    missing = required - set(frame.columns)
-    if missing:
-        raise ValueError(f"Colunas obrigatórias não encontradas: {', '.join(sorted(missing))}.")
-
-    frame["tipo_cliente"] = frame["tipo_cliente"].astype(str).str.strip()
-    starts_client = frame["tipo_cliente"].str.contains(r"Jurídica|Jurídico|Física|Físico", case=False, na=False)
-    if not starts_client.any():
-        raise ValueError("Nenhum marcador de Pessoa Física ou Pessoa Jurídica foi encontrado na coluna de tipo.")
+    frame = normalize_customer_columns(read_excel_sheet(file_bytes, header=TABLE_HEADER_ROW))
+    return organize_customers(frame)
 
-    frame["client_group_id"] = starts_client.cumsum()
-    clients: list[dict] = []
-    for _, group in frame[frame["client_group_id"] > 0].groupby("client_group_id"):
-        if group.empty:
-            continue
-        main = group.iloc[0]
-        type_text = str(main.get("tipo_cliente", "")).lower()
-        client = {
-            "Nome do Cliente": main.get("nome_cliente"),
-            "CPF/CNPJ": main.get("cpf_cnpj"),
-            "Tipo Cliente": "Pessoa Física" if "fís" in type_text or "fis" in type_text else "Pessoa Jurídica",
-            "Telefone": main.get("telefone", ""),
-        }
-        emails: list[str] = []
-        for _, row in group.iloc[1:].iterrows():
-            candidate = row.get("cpf_cnpj")
-            if is_valid_email(candidate):
-                normalized = str(candidate).strip().lower()
-                if normalized not in emails:
-                    emails.append(normalized)
-        for index, email in enumerate(emails, start=1):
-            client[f"E-mail Usuário {index}"] = email
-        clients.append(client)
 
-    if not clients:
-        raise ValueError("Nenhum cliente válido foi identificado no arquivo.")
-
-    result = pd.DataFrame(clients)
-    base_columns = ["Nome do Cliente", "CPF/CNPJ", "Tipo Cliente", "Telefone"]
-    email_columns = sorted(
-        [column for column in result.columns if column.startswith("E-mail Usuário")],
-        key=lambda column: int(column.rsplit(" ", 1)[-1]),
-    )
-    return result[base_columns + email_columns]
-
-
-@st.cache_data(show_spinner=False)
-def to_excel(frame: pd.DataFrame) -> bytes:
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        frame.to_excel(writer, index=False, sheet_name="Clientes_Organizados")
-        worksheet = writer.sheets["Clientes_Organizados"]
-        for index, column in enumerate(frame.columns):
-            width = min(max(len(str(column)) + 2, frame[column].astype(str).map(len).max() + 2), 50)
-            worksheet.set_column(index, index, width)
-    return output.getvalue()
+@st.cache_data(show_spinner=False, max_entries=4)
+def export_customers(file_bytes: bytes, export_format: str) -> bytes:
+    # Chamada apenas no clique do download; a chave do cache é o arquivo
+    # original, e a tabela organizada vem do cache de process_spreadsheet.
+    return export_frame(process_spreadsheet(file_bytes), export_format, sheet_name="Clientes_Organizados")
 
 
 st.info("O arquivo deve possuir o cabeçalho da tabela na linha 12, conforme o relatório original do sistema.")
@@ -127,11 +54,18 @@ if uploaded:
             )
             st.session_state.customer_file_logged = signature
 
+        formats = export_formats(len(result))
+        export_format = st.radio(
+            "Formato do arquivo",
+            formats,
+            format_func=lambda key: EXPORT_FORMATS[key][0],
+            horizontal=True,
+        )
         st.download_button(
             "Baixar planilha organizada",
-            data=to_excel(result),
-            file_name="relatorio_clientes_organizados.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            data=partial(export_customers, file_bytes, export_format),
+            file_name=f"relatorio_clientes_organizados.{export_format}",
+            mime=EXPORT_FORMATS[export_format][1],
             type="primary",
         )
     except Exception as exc:
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
 import json
+from datetime import date
+from functools import partial
 
 import pandas as pd
 import streamlit as st
 
 import user_management_db as db
 from app_core.auth import require_auth
-from app_core.ui import apply_branding, configure_page, render_hero, render_sidebar
+from app_core.exports import CSV_MIME, to_csv_bytes
+from app_core.ui import apply_branding, configure_page, page_cursor, render_hero, render_pager, render_sidebar
 
 configure_page("Auditoria e Logs")
 apply_branding()
@@ -15,39 +18,65 @@ require_auth("admin")
 render_sidebar()
 render_hero("Auditoria e logs", "Consulte as ações registradas na plataforma e exporte os dados para análise.")
 
-limit = st.selectbox("Quantidade máxima de registros", [500, 1_000, 2_000, 5_000], index=2)
-logs = db.get_all_logs(limit=limit)
-if not logs:
+LOG_COLUMNS = ["timestamp", "user", "action", "details_text"]
+
+
+def _details_text(value: object) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (dict, list)) else str(value or "")
+
+
+options = db.get_log_filter_options()
+if not options:
     st.info("Nenhuma atividade foi registrada.")
     st.stop()
 
-frame = pd.DataFrame(logs)
-frame["_id"] = frame["_id"].astype(str)
-frame["timestamp"] = pd.to_datetime(frame["timestamp"], errors="coerce")
-frame["details_text"] = frame["details"].apply(lambda value: json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (dict, list)) else str(value or ""))
-
 filter_1, filter_2, filter_3 = st.columns(3)
-users = sorted(frame["user"].dropna().astype(str).unique().tolist())
-actions = sorted(frame["action"].dropna().astype(str).unique().tolist())
+users = options["users"]
+actions = options["actions"]
 selected_users = filter_1.multiselect("Usuários", users, default=users)
 selected_actions = filter_2.multiselect("Ações", actions, default=actions)
-search = filter_3.text_input("Pesquisar nos detalhes")
+# As opções ficam em cache; o período vai até hoje para incluir os logs mais novos.
+last_date = max(options["fim"], date.today())
+selected_dates = filter_3.date_input(
+    "Período",
+    value=(options["inicio"], last_date),
+    min_value=options["inicio"],
+    max_value=last_date,
+)
+search_col, size_col = st.columns([3, 1])
+search = search_col.text_input("Pesquisar na ação e nos detalhes", help="Busca por palavras inteiras, sem diferenciar acentos.")
+page_size = size_col.selectbox("Registros por página", [200, 500, 1_000, 2_000], index=1)
+
+# Os filtros são aplicados no MongoDB; com todos os valores marcados, o campo não é filtrado.
+filters = {
+    "users": None if set(selected_users) == set(users) else tuple(selected_users),
+    "actions": None if set(selected_actions) == set(actions) else tuple(selected_actions),
+    "search": search.strip(),
+}
+if isinstance(selected_dates, tuple) and len(selected_dates) == 2:
+    # O período completo não filtra: a contagem usa a estimativa da coleção.
+    start, end = selected_dates
+    filters["start"] = None if start <= options["inicio"] else start
+    filters["end"] = None if end >= last_date else end
+scope = (page_size, tuple(sorted(filters.items())))
+logs_page = db.get_logs_page(**filters, **page_cursor("logs_page", scope), page_size=page_size, with_total=True)
+if not logs_page["items"]:
+    st.warning("Nenhum registro corresponde aos filtros selecionados.")
+    st.stop()
 
-filtered = frame[frame["user"].isin(selected_users) & frame["action"].isin(selected_actions)].copy()
-if search.strip():
-    term = search.strip().casefold()
-    filtered = filtered[
-        filtered["details_text"].str.casefold().str.contains(term, regex=False)
-        | filtered["action"].astype(str).str.casefold().str.contains(term, regex=False)
-    ]
+# Só as linhas da página atual são convertidas para texto.
+frame = pd.DataFrame(logs_page["items"])
+frame["timestamp"] = pd.to_datetime(frame["timestamp"], errors="coerce")
+frame["details_text"] = [_details_text(value) for value in frame["details"]]
 
-metric_1, metric_2, metric_3 = st.columns(3)
-metric_1.metric("Registros exibidos", len(filtered))
-metric_2.metric("Usuários distintos", filtered["user"].nunique())
-metric_3.metric("Tipos de ação", filtered["action"].nunique())
+metric_1, metric_2, metric_3, metric_4 = st.columns(4)
+metric_1.metric("Registros na página", len(frame))
+metric_2.metric("Registros encontrados", f"{logs_page['total']:,}".replace(",", "."))
+metric_3.metric("Usuários na página", frame["user"].nunique())
+metric_4.metric("Ações na página", frame["action"].nunique())
 
 st.dataframe(
-    filtered[["timestamp", "user", "action", "details_text"]],
+    frame[LOG_COLUMNS],
     width="stretch",
     hide_index=True,
     column_config={
@@ -57,20 +86,24 @@ st.dataframe(
         "details_text": "Detalhes",
     },
 )
+render_pager("logs_page", logs_page)
+
+labels = {
+    f"{row['timestamp'].strftime('%d/%m/%Y %H:%M:%S')} — {row['user']} — {row['action']}": index
+    for index, row in frame.iterrows()
+    if pd.notna(row["timestamp"])
+}
+selected = st.selectbox("Detalhes de um registro", list(labels), index=None, placeholder="Selecione um registro")
+if selected:
+    details = frame.loc[labels[selected], "details"]
+    if isinstance(details, (dict, list)):
+        st.json(details, expanded=True)
+    else:
+        st.code(str(details or "Sem detalhes"), language="text")
 
-if not filtered.empty:
-    labels = {
-        f"{row['timestamp'].strftime('%d/%m/%Y %H:%M:%S')} — {row['user']} — {row['action']}": index
-        for index, row in filtered.iterrows()
-        if pd.notna(row["timestamp"])
-    }
-    selected = st.selectbox("Detalhes de um registro", list(labels), index=None, placeholder="Selecione um registro")
-    if selected:
-        details = filtered.loc[labels[selected], "details"]
-        if isinstance(details, (dict, list)):
-            st.json(details, expanded=True)
-        else:
-            st.code(str(details or "Sem detalhes"), language="text")
-
-csv = filtered[["timestamp", "user", "action", "details_text"]].to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
-st.download_button("Exportar logs em CSV", csv, "auditoria_simulador.csv", "text/csv")
+st.download_button(
+    "Exportar página em CSV",
+    data=partial(to_csv_bytes, frame[LOG_COLUMNS], sep=","),
+    file_name="auditoria_simulador.csv",
+    mime=CSV_MIME,
+)
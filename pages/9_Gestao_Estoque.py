@@ -8,6 +8,8 @@ import streamlit as st
 
 import user_management_db as db
 from app_core.auth import require_auth
+from app_core.spreadsheet import TABLE_HEADER_ROW, read_excel_sheet
+from app_core.stock import ledger_documents, ledger_reconciliation, normalize_serials, reconcile_stock
 from app_core.ui import apply_branding, configure_page, render_hero, render_sidebar
 
 configure_page("Gestão de Estoque")
@@ -19,14 +21,14 @@ render_hero("Gestão de estoque", "Concilie o estoque registrado no sistema com
 
 @st.cache_data(show_spinner=False)
 def read_system_stock(file_bytes: bytes) -> pd.DataFrame:
-    frame = pd.read_excel(io.BytesIO(file_bytes), header=11, engine="openpyxl")
+    frame = read_excel_sheet(file_bytes, header=TABLE_HEADER_ROW)
     frame.rename(columns={"Nº Série": "Serial", "N° Série": "Serial"}, inplace=True)
     required = {"Serial", "Status", "Modelo"}
     missing = required - set(frame.columns)
     if missing:
         raise ValueError(f"Colunas ausentes no relatório do sistema: {', '.join(sorted(missing))}.")
     frame = frame.dropna(subset=["Serial"]).copy()
-    frame["Serial"] = frame["Serial"].astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+    frame["Serial"] = normalize_serials(frame["Serial"])
     frame = frame[frame["Serial"] != ""]
     return frame
 
@@ -41,12 +43,12 @@ def read_physical_stock(file_bytes: bytes, filename: str) -> pd.DataFrame:
             buffer.seek(0)
             frame = pd.read_csv(buffer, sep=None, engine="python", encoding="latin-1")
     else:
-        frame = pd.read_excel(buffer)
+        frame = read_excel_sheet(file_bytes)
     if frame.empty:
         raise ValueError("A planilha de estoque físico está vazia.")
     serial_column = next((column for column in frame.columns if str(column).strip().lower() in {"serial", "nº série", "n° série", "numero de serie"}), frame.columns[0])
     result = frame[[serial_column]].rename(columns={serial_column: "Serial"}).copy()
-    result["Serial"] = result["Serial"].astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+    result["Serial"] = normalize_serials(result["Serial"])
     result = result[(result["Serial"] != "") & (result["Serial"].str.lower() != "nan")]
     return result.drop_duplicates("Serial")
 
@@ -56,6 +58,124 @@ def to_csv(frame: pd.DataFrame) -> bytes:
     return frame.to_csv(index=False, sep=";", encoding="utf-8-sig").encode("utf-8-sig")
 
 
+def render_reconciliation(reconciled: pd.DataFrame, unknown_system: pd.DataFrame, missing_physical: pd.DataFrame) -> None:
+    chart_col, model_col = st.columns(2)
+    with chart_col:
+        status_counts = reconciled["Status"].value_counts().rename_axis("Status").reset_index(name="Quantidade")
+        fig_status = px.pie(status_counts, names="Status", values="Quantidade", hole=0.5, title="Distribuição por status")
+        st.plotly_chart(fig_status, width="stretch")
+    with model_col:
+        model_counts = reconciled["Modelo"].value_counts().head(12).rename_axis("Modelo").reset_index(name="Quantidade")
+        fig_models = px.bar(model_counts, x="Modelo", y="Quantidade", title="Modelos no estoque físico")
+        fig_models.update_traces(marker_color=branding["primary_color"])
+        st.plotly_chart(fig_models, width="stretch")
+
+    tab_reconciliation, tab_unknown, tab_missing = st.tabs(["Conciliação", "Não cadastrados", "Faltando no físico"])
+    with tab_reconciliation:
+        st.dataframe(reconciled, width="stretch", hide_index=True)
+    with tab_unknown:
+        if unknown_system.empty:
+            st.success("Todos os seriais físicos foram encontrados no sistema.")
+        else:
+            st.warning(f"{len(unknown_system)} serial(is) da contagem física não foram encontrados no sistema.")
+            st.dataframe(unknown_system[["Serial"]], width="stretch", hide_index=True)
+            st.download_button("Exportar não cadastrados", to_csv(unknown_system[["Serial"]]), "seriais_nao_cadastrados.csv", "text/csv")
+    with tab_missing:
+        if missing_physical.empty:
+            st.success("Todos os equipamentos esperados foram localizados na contagem física.")
+        else:
+            visible = [column for column in ["Serial", "Status", "Modelo", "Última Transmissão"] if column in missing_physical.columns]
+            st.error(f"{len(missing_physical)} equipamento(s) esperados não aparecem na contagem física.")
+            st.dataframe(missing_physical[visible], width="stretch", hide_index=True)
+            st.download_button("Exportar faltantes", to_csv(missing_physical[visible]), "equipamentos_faltantes.csv", "text/csv")
+
+
+def render_ledger() -> None:
+    username = st.session_state.get("username", "sistema")
+    sync_col, count_col = st.columns(2)
+    with sync_col:
+        st.markdown("#### Base do sistema")
+        st.caption("Sincronize o relatório do sistema sempre que houver movimentações. Só os seriais alterados são gravados.")
+        system_file = st.file_uploader("Relatório do sistema", type=["xlsx"], key="ledger_system_stock")
+        if st.button("Sincronizar base", disabled=system_file is None, width="stretch"):
+            try:
+                documents = ledger_documents(read_system_stock(system_file.getvalue()))
+            except Exception as exc:
+                st.error(f"Não foi possível ler o relatório do sistema: {exc}")
+            else:
+                counts = db.sync_inventory_system(documents)
+                if counts is None:
+                    st.error("Não foi possível sincronizar o inventário.")
+                else:
+                    st.success(
+                        f"{counts['inseridos']} seriais novos, {counts['atualizados']} atualizados, "
+                        f"{counts['inalterados']} sem alteração e {counts['removidos']} fora do sistema."
+                    )
+                    db.add_log(username, "Sincronizou inventário", {"arquivo": system_file.name, **counts})
+    with count_col:
+        st.markdown("#### Contagem parcial")
+        st.caption("Registre um local por vez. A recontagem de um local substitui a contagem anterior dele.")
+        location = st.text_input("Local da contagem", placeholder="Depósito A / Prateleira 3", key="ledger_location")
+        physical_file = st.file_uploader("Seriais contados", type=["xlsx", "csv"], key="ledger_physical_stock")
+        if st.button("Registrar contagem", type="primary", disabled=physical_file is None or not location.strip(), width="stretch"):
+            try:
+                serials = read_physical_stock(physical_file.getvalue(), physical_file.name)["Serial"].tolist()
+            except Exception as exc:
+                st.error(f"Não foi possível ler a contagem física: {exc}")
+            else:
+                counts = db.apply_inventory_count(location, serials, username)
+                if counts is None:
+                    st.error("Não foi possível registrar a contagem.")
+                else:
+                    st.success(f"{counts['contados']} seriais registrados em {location.strip()}; {counts['liberados']} voltaram a ficar pendentes.")
+                    db.add_log(username, "Registrou contagem de inventário", {"local": location.strip(), **counts})
+
+    locations = pd.DataFrame(db.get_inventory_locations())
+    if locations.empty:
+        st.info("Nenhum local contado no inventário em andamento.")
+        return
+
+    st.markdown("#### Locais contados")
+    st.dataframe(
+        locations.assign(contado_por=locations["contado_por"].map(", ".join)).rename(
+            columns={
+                "local": "Local",
+                "seriais": "Seriais",
+                "nao_cadastrados": "Não cadastrados",
+                "ultima_contagem": "Última contagem",
+                "contado_por": "Contado por",
+            }
+        ),
+        width="stretch",
+        hide_index=True,
+        column_config={"Última contagem": st.column_config.DatetimeColumn("Última contagem", format="DD/MM/YYYY HH:mm")},
+    )
+    selected = st.selectbox("Local", locations["local"].tolist(), key="ledger_selected_location")
+    reconciled, unknown_system, missing_physical = ledger_reconciliation(
+        db.get_inventory_location(selected),
+        db.get_inventory_pending(),
+    )
+    metrics = st.columns(4)
+    metrics[0].metric("Contados no local", len(reconciled))
+    metrics[1].metric("Locais contados", len(locations))
+    metrics[2].metric("Não cadastrados", len(unknown_system))
+    metrics[3].metric("Pendentes de contagem", len(missing_physical))
+    render_reconciliation(reconciled, unknown_system, missing_physical)
+
+    with st.expander("Novo inventário"):
+        st.caption("Zera os locais contados; todos os seriais esperados voltam a ficar pendentes.")
+        confirmed = st.checkbox("Confirmo o início de um novo inventário", key="ledger_new_cycle")
+        if st.button("Iniciar novo inventário", disabled=not confirmed):
+            if db.start_inventory_cycle():
+                db.add_log(username, "Iniciou novo inventário", {"locais": len(locations)})
+                st.rerun()
+            st.error("Não foi possível iniciar um novo inventário.")
+
+
+if st.toggle("Inventário contínuo", key="stock_ledger_mode", help="Registra contagens parciais por local em vez de comparar dois arquivos completos."):
+    render_ledger()
+    st.stop()
+
 system_col, physical_col = st.columns(2)
 with system_col:
     st.markdown("#### Estoque do sistema")
@@ -71,14 +191,7 @@ if system_file and physical_file:
         system_stock = read_system_stock(system_file.getvalue())
         physical_stock = read_physical_stock(physical_file.getvalue(), physical_file.name)
 
-        reconciled = physical_stock.merge(system_stock[["Serial", "Status", "Modelo"]], on="Serial", how="left")
-        reconciled["Status"] = reconciled["Status"].fillna("Não encontrado no sistema")
-        reconciled["Modelo"] = reconciled["Modelo"].fillna("Não identificado")
-
-        expected_in_stock = system_stock[~system_stock["Status"].astype(str).str.casefold().eq("indisponível")]
-        missing_serials = set(expected_in_stock["Serial"]) - set(physical_stock["Serial"])
-        missing_physical = expected_in_stock[expected_in_stock["Serial"].isin(missing_serials)].copy()
-        unknown_system = reconciled[reconciled["Status"] == "Não encontrado no sistema"].copy()
+        reconciled, unknown_system, missing_physical = reconcile_stock(system_stock, physical_stock)
 
         metrics = st.columns(4)
         metrics[0].metric("Contagem física", len(physical_stock))
@@ -86,35 +199,7 @@ if system_file and physical_file:
         metrics[2].metric("Não cadastrados", len(unknown_system))
         metrics[3].metric("Faltando no físico", len(missing_physical))
 
-        chart_col, model_col = st.columns(2)
-        with chart_col:
-            status_counts = reconciled["Status"].value_counts().rename_axis("Status").reset_index(name="Quantidade")
-            fig_status = px.pie(status_counts, names="Status", values="Quantidade", hole=0.5, title="Distribuição por status")
-            st.plotly_chart(fig_status, width="stretch")
-        with model_col:
-            model_counts = reconciled["Modelo"].value_counts().head(12).rename_axis("Modelo").reset_index(name="Quantidade")
-            fig_models = px.bar(model_counts, x="Modelo", y="Quantidade", title="Modelos no estoque físico")
-            fig_models.update_traces(marker_color=branding["primary_color"])
-            st.plotly_chart(fig_models, width="stretch")
-
-        tab_reconciliation, tab_unknown, tab_missing = st.tabs(["Conciliação", "Não cadastrados", "Faltando no físico"])
-        with tab_reconciliation:
-            st.dataframe(reconciled, width="stretch", hide_index=True)
-        with tab_unknown:
-            if unknown_system.empty:
-                st.success("Todos os seriais físicos foram encontrados no sistema.")
-            else:
-                st.warning(f"{len(unknown_system)} serial(is) da contagem física não foram encontrados no sistema.")
-                st.dataframe(unknown_system[["Serial"]], width="stretch", hide_index=True)
-                st.download_button("Exportar não cadastrados", to_csv(unknown_system[["Serial"]]), "seriais_nao_cadastrados.csv", "text/csv")
-        with tab_missing:
-            if missing_physical.empty:
-                st.success("Todos os equipamentos esperados foram localizados na contagem física.")
-            else:
-                visible = [column for column in ["Serial", "Status", "Modelo", "Última Transmissão"] if column in missing_physical.columns]
-                st.error(f"{len(missing_physical)} equipamento(s) esperados não aparecem na contagem física.")
-                st.dataframe(missing_physical[visible], width="stretch", hide_index=True)
-                st.download_button("Exportar faltantes", to_csv(missing_physical[visible]), "equipamentos_faltantes.csv", "text/csv")
+        render_reconciliation(reconciled, unknown_system, missing_physical)
 
         signature = f"{system_file.name}:{len(system_file.getvalue())}:{physical_file.name}:{len(physical_file.getvalue())}"
         if st.session_state.get("stock_reconciliation_logged") != signature:
@@ -0,0 +1,68 @@
+import threading
+
+from app_core.audit import enqueue_event, flush_events, start_audit_writer
+
+
+def test_events_are_written_in_batches():
+    batches = []
+    writer = start_audit_writer(batches.append, batch_size=3, flush_seconds=60)
+    for number in range(7):
+        assert enqueue_event(writer, {"n": number})
+    assert flush_events(writer, timeout=2)
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert [event["n"] for batch in batches for event in batch] == list(range(7))
+    assert writer["written"] == 7
+
+
+def test_partial_batch_is_written_after_the_time_threshold():
+    written = threading.Event()
+    writer = start_audit_writer(lambda batch: written.set(), batch_size=100, flush_seconds=0.05)
+    enqueue_event(writer, {"n": 1})
+    assert written.wait(2)
+
+
+def test_failed_batch_is_retried():
+    attempts = []
+
+    def flaky(batch):
+        attempts.append(len(batch))
+        if len(attempts) == 1:
+            raise ConnectionError("sem conexão")
+
+    writer = start_audit_writer(flaky, flush_seconds=0, retry_seconds=0)
+    enqueue_event(writer, {"n": 1})
+    assert flush_events(writer, timeout=2)
+    assert attempts == [1, 1]
+    assert (writer["written"], writer["dropped"]) == (1, 0)
+
+
+def test_discarded_events_are_counted_without_retry():
+    attempts = []
+
+    def partial(batch):
+        attempts.append(len(batch))
+        return 1
+
+    writer = start_audit_writer(partial, flush_seconds=0, retry_seconds=0)
+    enqueue_event(writer, {"n": 1})
+    enqueue_event(writer, {"n": 2})
+    assert flush_events(writer, timeout=2)
+    assert sum(attempts) == 2
+    assert writer["written"] + writer["dropped"] == 2
+    assert writer["dropped"] == len(attempts)
+
+
+def test_full_queue_drops_instead_of_blocking():
+    writing, release = threading.Event(), threading.Event()
+
+    def slow(batch):
+        writing.set()
+        release.wait(2)
+
+    writer = start_audit_writer(slow, batch_size=1, queue_size=1, put_timeout=0.01)
+    assert enqueue_event(writer, {"n": 0})
+    assert writing.wait(2)
+    # Um evento ocupa a fila enquanto o banco está lento; os seguintes são descartados.
+    assert [enqueue_event(writer, {"n": number}) for number in range(1, 4)] == [True, False, False]
+    assert writer["dropped"] == 2
+    release.set()
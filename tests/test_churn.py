@@ -0,0 +1,172 @@
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app_core.churn import (
+    build_metrics_model,
+    classification_documents,
+    classify_period,
+    metrics_frame,
+    period_metrics,
+    period_totals,
+    stale_periods,
+)
+from app_core.financeiro_mongo import previous_period
+
+
+def _metric(period: str, client: str, active: int, revenue: float, **extra) -> dict:
+    return {"period_key": period, "cliente": client, "veiculos_ativos_fim_mes": active, "receita": revenue, **extra}
+
+
+def _metrics() -> list[dict]:
+    return [
+        _metric("2024-01", "Volta", 4, 400.0),
+        _metric("2024-02", "Volta", 0, 0.0),
+        _metric("2024-02", "Saída", 5, 500.0),
+        _metric("2024-02", "Cresce", 2, 200.0),
+        _metric("2024-02", "Cai", 6, 600.0),
+        _metric("2024-02", "Igual", 3, 300.0),
+        _metric("2024-03", "Volta", 2, 200.0, ativacoes=2),
+        _metric("2024-03", "Novo", 1, 100.0, ativacoes=1),
+        _metric("2024-03", "Cresce", 2, 260.0),
+        _metric("2024-03", "Cai", 4, 420.0, desativacoes=2),
+        _metric("2024-03", "Igual", 3, 300.5),
+    ]
+
+
+def _legacy_classification(metrics, period, is_closed):
+    """Classificação feita anteriormente pela página, cliente a cliente."""
+    by_key = {(item["period_key"], item["cliente"]): item for item in metrics}
+    active_periods = defaultdict(set)
+    for item in metrics:
+        if item["veiculos_ativos_fim_mes"] > 0:
+            active_periods[item["cliente"]].add(item["period_key"])
+    prior = previous_period(period)
+    clients = {item["cliente"] for item in metrics if item["period_key"] in (period, prior)}
+    result = {}
+    for client in sorted(clients):
+        current = by_key.get((period, client), {})
+        previous = by_key.get((prior, client), {})
+        current_active = current.get("veiculos_ativos_fim_mes", 0)
+        previous_active = previous.get("veiculos_ativos_fim_mes", 0)
+        current_revenue = current.get("receita", 0.0)
+        previous_revenue = previous.get("receita", 0.0)
+        if previous_active > 0 and current_active <= 0:
+            result[client] = "Churn total" if is_closed else "Sem dados no mês"
+        elif previous_active <= 0 and current_active > 0:
+            older = {item for item in active_periods[client] if item < period} - {prior}
+            result[client] = "Reativação" if older else "Novo cliente"
+        elif previous_active > 0 and current_active > 0:
+            if current_active > previous_active or current_revenue > previous_revenue * 1.005:
+                result[client] = "Expansão"
+            elif current_active < previous_active or current_revenue < previous_revenue * 0.995:
+                result[client] = "Contração"
+            else:
+                result[client] = "Estável"
+        else:
+            result[client] = "Sem movimento"
+    return result
+
+
+def test_period_classification_by_client():
+    model = build_metrics_model(_metrics(), {})
+    classified = classify_period(model, "2024-03", is_closed=True)
+    assert dict(zip(classified["cliente"], classified["classificacao"])) == {
+        "Cai": "Contração",
+        "Cresce": "Expansão",
+        "Igual": "Estável",
+        "Novo": "Novo cliente",
+        "Saída": "Churn total",
+        "Volta": "Reativação",
+    }
+    cai = classified.set_index("cliente").loc["Cai"]
+    assert (cai["delta_receita"], cai["delta_veiculos"], cai["desativacoes"]) == (-180.0, -2, 2)
+    assert cai["delta_receita_pct"] == pytest.approx(-30.0)
+    assert np.isnan(classified.set_index("cliente").loc["Novo", "delta_receita_pct"])
+
+    # Sem fechamento, a ausência no mês não é tratada como churn.
+    open_period = classify_period(model, "2024-03", is_closed=False)
+    assert open_period.set_index("cliente").loc["Saída", "classificacao"] == "Sem dados no mês"
+    assert classify_period(model, "2030-01", is_closed=True).empty
+
+
+def test_vectorized_classification_matches_client_loop():
+    rng = np.random.default_rng(5)
+    periods = [f"{year}-{month:02d}" for year in (2022, 2023) for month in range(1, 13)]
+    metrics = [
+        _metric(period, f"Cliente {client:03d}", int(rng.choice([0, 0, 1, 2, 3])), float(rng.choice([0, 100, 100.4, 150])))
+        for period in periods
+        for client in range(60)
+        if rng.random() < 0.8
+    ]
+    model = build_metrics_model(metrics, {})
+    for period in periods:
+        classified = classify_period(model, period, is_closed=True)
+        assert dict(zip(classified["cliente"], classified["classificacao"])) == _legacy_classification(metrics, period, True)
+
+
+def test_metrics_frame_normalizes_records():
+    frame = metrics_frame(
+        [
+            {"period_key": "2024-02", "cliente": " Beta ", "receita": None, "valor_total": 90, "ativacoes": "2"},
+            {"period_key": "2024-01", "cliente": "Alfa", "valor_total": "150.5", "veiculos_ativos_fim_mes": 2.6},
+            {"period_key": "", "cliente": "Sem período"},
+        ]
+    )
+    assert frame["period_key"].tolist() == ["2024-01", "2024-02"]
+    assert frame["cliente"].tolist() == ["Alfa", "Beta"]
+    assert frame["receita"].tolist() == [150.5, 0.0]
+    assert frame["veiculos_ativos_fim_mes"].tolist() == [3, 0]
+    assert frame["ativacoes"].tolist() == [0, 2]
+    assert frame["data_quality"].tolist() == ["não informado", "não informado"]
+
+
+def test_model_slices_and_monthly_totals():
+    model = build_metrics_model(_metrics(), {})
+    assert list(model["periods"]) == ["2024-01", "2024-02", "2024-03"]
+    assert period_metrics(model, "2024-02")["cliente"].tolist() == ["Cai", "Cresce", "Igual", "Saída", "Volta"]
+    assert period_metrics(model, "2030-01").empty
+    march = period_totals(model, "2024-03")
+    assert march == {
+        "receita": 1280.5,
+        "veiculos_ativos_fim_mes": 12,
+        "ativacoes": 3,
+        "desativacoes": 2,
+        "suspensoes": 0,
+        "clientes_ativos": 5,
+    }
+    assert period_totals(model, "2030-01")["receita"] == 0.0
+    assert period_totals(model, "2024-02")["clientes_ativos"] == 4
+
+
+def test_signatures_flag_changed_period_and_following_months():
+    metrics = _metrics()
+    closures = {"2024-02": {"status": "closed", "updated_at": "2024-03-05T10:00:00"}}
+    signatures = build_metrics_model(metrics, closures)["signatures"]
+    assert build_metrics_model(list(reversed(metrics)), closures)["signatures"] == signatures
+    assert stale_periods(signatures, signatures) == []
+
+    changed = [dict(item) for item in metrics]
+    changed[2]["receita"] = 550.0
+    assert stale_periods(build_metrics_model(changed, closures)["signatures"], signatures) == ["2024-02", "2024-03"]
+
+    reclosed = {"2024-02": {"status": "closed", "updated_at": "2024-03-09T08:00:00"}}
+    assert stale_periods(build_metrics_model(metrics, reclosed)["signatures"], signatures) == ["2024-02", "2024-03"]
+    assert stale_periods(signatures, {"2024-01": signatures["2024-01"]}) == ["2024-02", "2024-03"]
+
+
+def test_classification_documents_hash_only_changes_with_content():
+    classified = classify_period(build_metrics_model(_metrics(), {}), "2024-03", is_closed=True)
+    documents = classification_documents(classified)
+    assert [item["cliente"] for item in documents] == classified["cliente"].tolist()
+    assert documents[3]["delta_receita_pct"] is None
+    assert type(documents[0]["veiculos_atual"]) is int
+
+    changed = classified.copy()
+    changed.loc[0, "receita_atual"] += 1
+    hashes = [item["row_hash"] for item in classification_documents(changed)]
+    assert hashes[0] != documents[0]["row_hash"]
+    assert hashes[1:] == [item["row_hash"] for item in documents[1:]]
+    assert classification_documents(pd.DataFrame()) == []
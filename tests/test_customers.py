@@ -0,0 +1,117 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app_core.customers import normalize_customer_columns, organize_customers
+
+EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+
+def _is_valid_email(value: object) -> bool:
+    if not isinstance(value, str):
+        return False
+    text = value.strip()
+    return bool(text and text.lower() not in {"e-mail", "email", "cpf/cnpj"} and EMAIL_RE.fullmatch(text))
+
+
+def _legacy_organize(frame: pd.DataFrame) -> pd.DataFrame:
+    """Agrupamento linha a linha usado antes da versão vetorizada."""
+    frame = frame.copy()
+    frame["tipo_cliente"] = frame["tipo_cliente"].astype(str).str.strip()
+    starts_client = frame["tipo_cliente"].str.contains(r"Jurídica|Jurídico|Física|Físico", case=False, na=False)
+    frame["client_group_id"] = starts_client.cumsum()
+    clients = []
+    for _, group in frame[frame["client_group_id"] > 0].groupby("client_group_id"):
+        main = group.iloc[0]
+        type_text = str(main.get("tipo_cliente", "")).lower()
+        client = {
+            "Nome do Cliente": main.get("nome_cliente"),
+            "CPF/CNPJ": main.get("cpf_cnpj"),
+            "Tipo Cliente": "Pessoa Física" if "fís" in type_text or "fis" in type_text else "Pessoa Jurídica",
+            "Telefone": main.get("telefone", ""),
+        }
+        emails = []
+        for _, row in group.iloc[1:].iterrows():
+            candidate = row.get("cpf_cnpj")
+            if _is_valid_email(candidate):
+                normalized = str(candidate).strip().lower()
+                if normalized not in emails:
+                    emails.append(normalized)
+        for index, email in enumerate(emails, start=1):
+            client[f"E-mail Usuário {index}"] = email
+        clients.append(client)
+    result = pd.DataFrame(clients)
+    email_columns = sorted(
+        [column for column in result.columns if column.startswith("E-mail Usuário")],
+        key=lambda column: int(column.rsplit(" ", 1)[-1]),
+    )
+    return result[["Nome do Cliente", "CPF/CNPJ", "Tipo Cliente", "Telefone"] + email_columns]
+
+
+def _report() -> pd.DataFrame:
+    rows = [
+        ("Cabeçalho solto", "x", "Relatório", None),
+        ("Transportes Alfa", 12345678000190, "Pessoa Jurídica", "6999990000"),
+        (None, "E-mail", None, None),
+        (None, " Ana@Alfa.com.br ", None, None),
+        (None, "ana@alfa.com.br", None, None),
+        (None, "sem arroba", None, None),
+        (None, 42, None, None),
+        (None, "bruno@alfa.com", None, None),
+        ("Maria Souza", "123.456.789-00", " pessoa física ", np.nan),
+        ("Logística Beta", "98.765.432/0001-10", "Jurídico", "6932221111"),
+        (None, "contato@beta.com", None, None),
+        (None, "financeiro@beta.com", None, None),
+        (None, "ti@beta.com", None, None),
+    ]
+    return pd.DataFrame(rows, columns=["nome_cliente", "cpf_cnpj", "tipo_cliente", "telefone"])
+
+
+def test_vectorized_grouping_matches_row_by_row_version():
+    result = organize_customers(_report())
+    pd.testing.assert_frame_equal(result, _legacy_organize(_report()))
+    assert result.loc[0, ["E-mail Usuário 1", "E-mail Usuário 2"]].tolist() == ["ana@alfa.com.br", "bruno@alfa.com"]
+    assert result["Tipo Cliente"].tolist() == ["Pessoa Jurídica", "Pessoa Física", "Pessoa Jurídica"]
+
+
+def test_grouping_without_emails_or_phone_column():
+    report = _report().drop(columns="telefone")
+    report = report[~report["cpf_cnpj"].astype(str).str.contains("@")]
+    result = organize_customers(report)
+    pd.testing.assert_frame_equal(result, _legacy_organize(report))
+    assert result.columns.tolist() == ["Nome do Cliente", "CPF/CNPJ", "Tipo Cliente", "Telefone"]
+
+
+def test_grouping_with_numeric_document_column():
+    report = pd.DataFrame(
+        {
+            "nome_cliente": ["Transportes Alfa", None, "Logística Beta"],
+            "cpf_cnpj": [12345678000190, np.nan, 98765432000110],
+            "tipo_cliente": ["Pessoa Jurídica", None, "Pessoa Jurídica"],
+            "telefone": ["6999990000", None, "6932221111"],
+        }
+    )
+    result = organize_customers(report)
+    pd.testing.assert_frame_equal(result, _legacy_organize(report))
+    assert result.columns.tolist() == ["Nome do Cliente", "CPF/CNPJ", "Tipo Cliente", "Telefone"]
+
+
+def test_grouping_on_large_random_report_matches_row_by_row_version():
+    rng = np.random.default_rng(5)
+    rows = []
+    for client in range(300):
+        rows.append((f"Cliente {client}", f"{client:014d}", rng.choice(["Pessoa Jurídica", "Pessoa Física"]), None))
+        for _ in range(rng.integers(0, 6)):
+            rows.append((None, f"usuario{rng.integers(0, 4)}@cliente{client}.com", None, None))
+    report = pd.DataFrame(rows, columns=["nome_cliente", "cpf_cnpj", "tipo_cliente", "telefone"])
+    pd.testing.assert_frame_equal(organize_customers(report), _legacy_organize(report))
+
+
+def test_report_requires_client_markers_and_columns():
+    with pytest.raises(ValueError, match="marcador"):
+        organize_customers(_report().assign(tipo_cliente="Outro"))
+    raw = pd.DataFrame({"Razão Social": ["A"], "Tipo": ["Pessoa Física"], "Unnamed: 3": [None]})
+    with pytest.raises(ValueError, match="cpf_cnpj"):
+        normalize_customer_columns(raw)
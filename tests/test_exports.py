@@ -0,0 +1,81 @@
+import io
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from app_core.exports import (
+    LARGE_EXPORT_ROWS,
+    estimate_column_widths,
+    export_formats,
+    export_frame,
+    parquet_available,
+    write_xlsx,
+)
+
+
+def _customers() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Nome do Cliente": ["Transportes Exemplo", "=SOMA(A1)", "Maria"],
+            "Quantidade": [3, 12, 0],
+            "Receita": [1500.5, np.nan, 20.0],
+            "Cadastro": [datetime(2024, 5, 10, 8, 0), pd.NaT, datetime(2023, 1, 2)],
+            "E-mail Usuário 1": ["a@exemplo.com", None, "https://exemplo.com"],
+        }
+    )
+
+
+def test_xlsx_round_trip_keeps_values_and_types():
+    frame = _customers()
+    data = write_xlsx([("Clientes", frame), ("Resumo", frame.head(1))])
+    clients = pd.read_excel(io.BytesIO(data), sheet_name="Clientes")
+    expected = frame.assign(**{"E-mail Usuário 1": ["a@exemplo.com", np.nan, "https://exemplo.com"]})
+    pd.testing.assert_frame_equal(clients, expected)
+    assert len(pd.read_excel(io.BytesIO(data), sheet_name="Resumo")) == 1
+
+    sheet = load_workbook(io.BytesIO(data))["Clientes"]
+    # Textos continuam texto: nada vira fórmula ou link.
+    assert sheet["A3"].data_type == "s"
+    assert sheet["E4"].hyperlink is None
+
+
+def test_xlsx_layout_options():
+    frame = _customers()
+    data = write_xlsx([("Churn", frame)], column_width=18, freeze_header=True, autofilter=True)
+    sheet = load_workbook(io.BytesIO(data))["Churn"]
+    assert sheet.freeze_panes == "A2"
+    assert sheet.auto_filter.ref == "A1:E4"
+    # O xlsxwriter grava a largura de A:E em um único intervalo.
+    assert sheet.column_dimensions["A"].width == pytest.approx(18, abs=1)
+    assert sheet.column_dimensions["A"].max == 5
+
+
+def test_column_widths_from_sample():
+    frame = pd.DataFrame({"Cliente": ["x" * 80] + ["abc"] * 9, "Id": range(10)})
+    assert estimate_column_widths(frame) == [50, 4]
+    # A amostra inclui a primeira e a última linha.
+    long_tail = pd.DataFrame({"Nome": ["ab"] * 4_999 + ["x" * 20]})
+    assert estimate_column_widths(long_tail, sample_rows=100) == [22]
+    assert estimate_column_widths(pd.DataFrame(columns=["Vazio"])) == [7]
+
+
+def test_export_formats_prefer_csv_for_large_tables():
+    assert export_formats(10)[:2] == ["xlsx", "csv"]
+    assert export_formats(LARGE_EXPORT_ROWS)[:2] == ["csv", "xlsx"]
+    assert "xlsx" not in export_formats(2_000_000)
+
+
+def test_csv_and_parquet_exports():
+    frame = _customers()
+    csv = export_frame(frame, "csv", sheet_name="Clientes")
+    assert csv.startswith("﻿".encode("utf-8"))
+    assert pd.read_csv(io.BytesIO(csv), sep=";", encoding="utf-8-sig")["Quantidade"].tolist() == [3, 12, 0]
+    if parquet_available():
+        restored = pd.read_parquet(io.BytesIO(export_frame(frame, "parquet", sheet_name="Clientes")))
+        assert restored["Nome do Cliente"].tolist() == frame["Nome do Cliente"].tolist()
+        assert restored["E-mail Usuário 1"].isna().tolist() == [False, True, False]
+    with pytest.raises(ValueError, match="desconhecido"):
+        export_frame(frame, "ods", sheet_name="Clientes")
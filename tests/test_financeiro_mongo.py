@@ -0,0 +1,333 @@
+import re
+import threading
+import unicodedata
+
+import pytest
+from pymongo.errors import PyMongoError
+
+from app_core import financeiro_mongo
+from app_core.financeiro_mongo import (
+    ACTIVATED_PATTERN,
+    DEACTIVATED_PATTERN,
+    METRIC_FIELDS,
+    SUSPENDED_PATTERN,
+    _legacy_history_pipeline,
+    _stream_collection,
+    connection_diagnostics,
+    finance_watermark,
+    missing_finance_indexes,
+    _strip_accents,
+    get_client_terminal_snapshots,
+    get_latest_run_ids,
+    legacy_history_metric,
+    sync_finance_cache,
+)
+
+
+def _legacy_flags(category: str) -> tuple[bool, bool, bool]:
+    text = _strip_accents(category.strip()).lower()
+    return (
+        "ativado no mes" in text or "ativado e desativado" in text,
+        text == "desativado" or "ativado e desativado" in text,
+        text == "suspenso",
+    )
+
+
+@pytest.mark.parametrize(
+    "category",
+    [
+        "Ativado no Mês",
+        "ATIVADO NO MÊS",
+        unicodedata.normalize("NFD", "Ativado no Mês"),
+        "Ativado no mes",
+        "Ativado e Desativado",
+        "Desativado",
+        " desativado ",
+        "Desativado parcialmente",
+        "Suspenso",
+        "Suspenso parcial",
+        "Cheio",
+        "",
+    ],
+)
+def test_category_patterns_match_accent_stripped_rules(category):
+    # O $regexMatch do MongoDB usa PCRE; para estes padrões o re do Python
+    # tem o mesmo comportamento.
+    flags = tuple(
+        re.search(pattern, category, re.IGNORECASE) is not None
+        for pattern in (ACTIVATED_PATTERN, DEACTIVATED_PATTERN, SUSPENDED_PATTERN)
+    )
+    assert flags == _legacy_flags(category)
+
+
+def test_pipeline_keeps_detail_items_on_the_server():
+    pipeline = _legacy_history_pipeline(30_000)
+    assert pipeline[0] == {"$limit": 30_000}
+    projected = pipeline[1]["$project"]
+    assert "itens_detalhados" not in projected
+    assert set(pipeline[-1]["$project"]) == {"_id", "ordem"}
+
+
+def test_metric_from_detailed_summary():
+    metric = legacy_history_metric(
+        {
+            "periodo_relatorio": "Faturamento de Março de 2024",
+            "cliente": " Transportes Exemplo ",
+            "valor_total": "1.234,50",
+            "terminais_cheio": 9,
+            "resumo": {"itens": 10, "ativacoes": 2, "desativacoes": 3, "suspensoes": 1},
+        }
+    )
+    assert metric["period_key"] == "2024-03"
+    assert metric["cliente"] == "Transportes Exemplo"
+    assert metric["receita"] == pytest.approx(1234.5)
+    assert (metric["veiculos_faturados"], metric["veiculos_ativos_fim_mes"]) == (10, 7)
+    assert (metric["ativacoes"], metric["desativacoes"], metric["suspensoes"]) == (2, 3, 1)
+    assert metric["data_quality"] == "historico_detalhado"
+
+
+def test_metric_from_summary_without_details():
+    metric = legacy_history_metric(
+        {
+            "period_key": "2024-04",
+            "cliente": "Transportes Exemplo",
+            "terminais_cheio": "5",
+            "terminais_proporcional": 2,
+            "terminais_suspensos": 1,
+            "resumo": {"itens": 0, "ativacoes": 0, "desativacoes": 0, "suspensoes": 0},
+        }
+    )
+    assert (metric["veiculos_faturados"], metric["veiculos_ativos_fim_mes"]) == (8, 8)
+    assert metric["data_quality"] == "resumo_legado"
+    assert metric["periodo_relatorio"] == "Abr/2024"
+    assert legacy_history_metric({"period_key": "2024-04", "cliente": ""}) is None
+
+
+class _Cursor(list):
+    def sort(self, sort):
+        return self
+
+    def limit(self, limit):
+        return _Cursor(self[:limit])
+
+
+class _Collection:
+    def __init__(self, documents):
+        self.documents = documents
+        self.calls = []
+
+    def find(self, query, projection=None, **kwargs):
+        self.calls.append((query, projection, kwargs))
+        return _Cursor(self.documents)
+
+
+def test_stream_collection_projects_declared_fields(monkeypatch):
+    collection = _Collection([{"period_key": "2024-05", "cliente": "A"}] * 3)
+    monkeypatch.setattr(financeiro_mongo, "get_finance_db", lambda: {"billing_monthly_metrics": collection})
+
+    documents = _stream_collection("billing_monthly_metrics", 2, fields=METRIC_FIELDS)
+    assert documents == [{"period_key": "2024-05", "cliente": "A"}] * 2
+    _, projection, options = collection.calls[-1]
+    assert projection["_id"] == 0 and set(projection) - {"_id"} == set(METRIC_FIELDS)
+    assert options == {"batch_size": 2}
+
+    collection.documents = [{"_id": 7, "__mongo_meta": 1, "cliente": "A"}]
+    assert _stream_collection("billing_monthly_metrics", 10) == [{"_id": "7", "cliente": "A"}]
+    assert collection.calls[-1][1] is None
+
+
+def test_client_snapshots_query_only_the_latest_run(monkeypatch):
+    metrics = _Collection(
+        [
+            {"period_key": "2024-05", "cliente": " Transportes Exemplo ", "source_run_id": "run-2"},
+            # Métrica antiga, sem period_key: o período vem do rótulo.
+            {"periodo_relatorio": "Maio de 2024", "cliente": "Logística (Sul)", "source_run_id": "run-7"},
+            {"periodo_relatorio": "Abril de 2024", "cliente": "Outro Cliente", "source_run_id": "run-1"},
+        ]
+    )
+    snapshots = _Collection([{"cliente": "Transportes Exemplo ", "run_id": "run-2", "terminal": "1001"}])
+    monkeypatch.setattr(
+        financeiro_mongo,
+        "get_finance_db",
+        lambda: {"billing_monthly_metrics": metrics, "billing_terminal_snapshots": snapshots},
+    )
+    get_latest_run_ids.clear()
+    get_client_terminal_snapshots.clear()
+
+    assert get_latest_run_ids("2024-05") == {"Transportes Exemplo": "run-2", "Logística (Sul)": "run-7"}
+    assert get_client_terminal_snapshots("2024-05", "Transportes Exemplo ")[0]["terminal"] == "1001"
+    query = snapshots.calls[-1][0]
+    assert query["run_id"] == "run-2"
+    assert re.search(query["cliente"]["$regex"], "  Transportes Exemplo ")
+    assert not re.search(query["cliente"]["$regex"], "Transportes Exemplo Ltda")
+
+    get_client_terminal_snapshots("2024-05", "Logística (Sul)")
+    query = snapshots.calls[-1][0]
+    assert query["run_id"] == "run-7" and re.search(query["cliente"]["$regex"], "Logística (Sul)")
+
+    get_client_terminal_snapshots("2024-05", "Outro Cliente")
+    assert "run_id" not in snapshots.calls[-1][0]
+    assert len(metrics.calls) == 1
+
+
+class _WatchedCollection(_Collection):
+    def __init__(self, documents, indexes):
+        super().__init__(documents)
+        self.indexes = indexes
+
+    def index_information(self):
+        return {name: {} for name in self.indexes}
+
+    def find_one(self, query, projection=None, **kwargs):
+        self.calls.append((query, projection, kwargs))
+        return self.documents[0] if self.documents else None
+
+    def estimated_document_count(self):
+        return len(self.documents)
+
+
+def test_watermark_reads_updated_at_only_through_the_index(monkeypatch):
+    indexed = _WatchedCollection([{"updated_at": "2024-05-02"}], ["_id_", "ix_updated_at"])
+    bare = _WatchedCollection([{"updated_at": "2024-05-03"}] * 2, ["_id_"])
+    collections = {name: bare for name in financeiro_mongo.WATCHED_COLLECTIONS}
+    collections["billing_month_closures"] = indexed
+    monkeypatch.setattr(financeiro_mongo, "get_finance_db", lambda: collections)
+
+    marks = {name: tuple(mark) for name, *mark in finance_watermark()}
+    assert marks["billing_month_closures"] == (1, "2024-05-02", True)
+    assert marks["billing_history"] == (2, None, False)
+    assert len(indexed.calls) == 1 and bare.calls == []
+
+
+def test_missing_finance_indexes_are_listed_without_creating_them(monkeypatch):
+    indexed = _WatchedCollection([], ["_id_", "ix_updated_at", "ix_metrics_period_client"])
+    bare = _WatchedCollection([], ["_id_"])
+    collections = {name: bare for name in financeiro_mongo.WATCHED_COLLECTIONS}
+    collections["billing_monthly_metrics"] = indexed
+    monkeypatch.setattr(financeiro_mongo, "get_finance_db", lambda: collections)
+
+    assert missing_finance_indexes() == [
+        "billing_terminal_snapshots.ix_snapshots_period_client_run",
+        "billing_month_closures.ix_updated_at",
+        "billing_terminal_snapshots.ix_updated_at",
+        "billing_history.ix_updated_at",
+    ]
+
+
+def test_finance_cache_cleared_only_when_watermark_changes(monkeypatch):
+    watermarks = iter([(("a", 1, None, True),), (("a", 1, None, True),), (("a", 2, None, True),), (("a", 2, None, True),)])
+    cleared = []
+    monkeypatch.setattr(financeiro_mongo, "WATERMARK_POLL_SECONDS", 0)
+    monkeypatch.setattr(financeiro_mongo, "_start_change_watcher", lambda: None)
+    monkeypatch.setattr(financeiro_mongo, "finance_watermark", lambda: next(watermarks))
+    monkeypatch.setattr(financeiro_mongo, "clear_finance_cache", lambda: cleared.append(True))
+    financeiro_mongo._finance_cache_state.clear()
+
+    assert [sync_finance_cache() for _ in range(4)] == [0, 0, 1, 1]
+    assert len(cleared) == 1
+
+
+def test_change_stream_event_invalidates_before_the_next_poll(monkeypatch):
+    cleared = []
+    monkeypatch.setattr(financeiro_mongo, "WATERMARK_POLL_SECONDS", 3600)
+    monkeypatch.setattr(financeiro_mongo, "_start_change_watcher", lambda: None)
+    monkeypatch.setattr(financeiro_mongo, "finance_watermark", lambda: (("a", 1, None, True),))
+    monkeypatch.setattr(financeiro_mongo, "clear_finance_cache", lambda: cleared.append(True))
+    financeiro_mongo._finance_cache_state.clear()
+
+    assert sync_finance_cache() == 0
+    assert sync_finance_cache() == 0
+    financeiro_mongo._finance_cache_state()["events"] += 1
+    assert sync_finance_cache() == 1
+    assert sync_finance_cache() == 1
+    assert len(cleared) == 1
+
+
+def test_cache_expires_without_index_and_change_stream(monkeypatch):
+    cleared = []
+    blind = (("billing_month_closures", 3, None, False),)
+    monkeypatch.setattr(financeiro_mongo, "WATERMARK_POLL_SECONDS", 0)
+    monkeypatch.setattr(financeiro_mongo, "FALLBACK_CACHE_SECONDS", 0)
+    monkeypatch.setattr(financeiro_mongo, "_start_change_watcher", lambda: None)
+    monkeypatch.setattr(financeiro_mongo, "finance_watermark", lambda: blind)
+    monkeypatch.setattr(financeiro_mongo, "clear_finance_cache", lambda: cleared.append(True))
+    financeiro_mongo._finance_cache_state.clear()
+
+    # A contagem não muda em alterações no lugar: o cache expira pelo prazo curto.
+    assert [sync_finance_cache() for _ in range(3)] == [1, 2, 3]
+    # Com o change stream ativo, só os eventos e a marca d'água limpam o cache.
+    financeiro_mongo._finance_cache_state()["stream_live"] = True
+    assert [sync_finance_cache() for _ in range(2)] == [3, 3]
+    assert len(cleared) == 3
+
+
+class _ChangeStream:
+    def __init__(self, changes, done):
+        self.changes, self.done = changes, done
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        yield from self.changes
+        self.done.set()
+        threading.Event().wait()
+
+
+def test_change_watcher_reopens_the_stream_after_a_failure(monkeypatch):
+    done = threading.Event()
+    attempts = []
+
+    class _Database:
+        def watch(self, pipeline):
+            attempts.append(pipeline)
+            if len(attempts) == 1:
+                raise PyMongoError("stream caiu")
+            return _ChangeStream([{"op": "update"}], done)
+
+    monkeypatch.setattr(financeiro_mongo, "WATCH_RETRY_SECONDS", 0)
+    monkeypatch.setattr(financeiro_mongo, "get_finance_db", lambda: _Database())
+    financeiro_mongo._finance_cache_state.clear()
+    financeiro_mongo._start_change_watcher.clear()
+    try:
+        financeiro_mongo._start_change_watcher()
+        assert done.wait(2)
+        state = financeiro_mongo._finance_cache_state()
+        assert len(attempts) == 2 and state["stream_live"]
+        # Um evento pela reabertura (mudanças perdidas na queda) e um pela alteração.
+        assert state["events"] == 2
+    finally:
+        financeiro_mongo._start_change_watcher.clear()
+
+
+def test_failed_health_check_opens_the_circuit(monkeypatch):
+    probes = []
+    outcomes = iter([False, True])
+
+    def probe():
+        probes.append(True)
+        return {"ok": next(outcomes), "database": "financeiro_verdio"}
+
+    monkeypatch.setattr(financeiro_mongo, "_probe_connection", probe)
+    # A renovação roda na mesma thread para o teste ser determinístico.
+    monkeypatch.setattr(
+        financeiro_mongo,
+        "_probe_in_background",
+        lambda state: financeiro_mongo._record_probe(state, financeiro_mongo._probe_connection()),
+    )
+    financeiro_mongo._health_state.clear()
+
+    assert connection_diagnostics()["ok"] is False
+    # Circuito aberto: a falha volta sem nova tentativa.
+    assert connection_diagnostics() == {"ok": False, "database": "financeiro_verdio", "failures": 1}
+    assert len(probes) == 1
+
+    state = financeiro_mongo._health_state()
+    state["retry_at"] = 0.0
+    connection_diagnostics()
+    assert len(probes) == 2
+    assert connection_diagnostics()["ok"] is True
+    assert state["failures"] == 0 and len(probes) == 2
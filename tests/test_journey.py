@@ -0,0 +1,238 @@
+import io
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app_core.journey import (
+    REPORT_COLUMNS,
+    analyze_compliance,
+    duration_to_minutes,
+    durations_to_minutes,
+    iter_batch_audit,
+    iter_journey_report,
+    journey_day_documents,
+    parse_journey_frame,
+    read_journey_sheet,
+    sniff_csv_format,
+)
+
+
+def _legacy_parse(raw: pd.DataFrame) -> pd.DataFrame:
+    """Parser linha a linha usado antes da versão vetorizada."""
+    records = []
+    current_driver = None
+    for _, row in raw.iterrows():
+        values = ["" if pd.isna(value) else str(value).strip() for value in row.values]
+        if len(values) > 2 and values[1] and values[1].lower() not in {"dia do mês", "nome", "jornada de motorista"}:
+            if not values[1][0].isdigit() and values[2] == "":
+                current_driver = values[1]
+                continue
+        if len(values) > 13 and current_driver:
+            day = values[1]
+            if day.isdigit() and 1 <= int(day) <= 31:
+                records.append(
+                    {
+                        "Motorista": current_driver,
+                        "Dia": int(day),
+                        "Semana": values[2],
+                        "Início da jornada": values[3],
+                        "Fim da jornada": values[4],
+                        "Jornada total": values[5],
+                        "Condução total": values[6],
+                        "Máxima condução contínua": values[9],
+                        "Espera": values[10],
+                        "Refeição": values[11],
+                        "Descanso": values[12],
+                        "Interjornada": values[13],
+                    }
+                )
+    return pd.DataFrame(records)
+
+
+def _sample_report() -> pd.DataFrame:
+    blank = [None] * 14
+    rows = [
+        [None, "Jornada de motorista", None, *blank[3:]],
+        [None, "Nome", None, *blank[3:]],
+        [None, "02 linhas antes do motorista", "x", *blank[3:]],
+        [None, "João da Silva", None, *blank[3:]],
+        [None, "Dia do mês", "Semana", *blank[3:]],
+        [None, 1, "Seg", "07:00", "17:00", "10:00", "08:00", None, None, "06:10", "00:30", "01:00", "00:20", "10:15"],
+        [None, "2", " Ter ", "07:00", "16:00", "09:00", "07:00", None, None, "04:00", None, "01:00", None, "12:00"],
+        [None, "32", "Qua", "07:00", "16:00", "09:00", "07:00", None, None, "04:00", None, "01:00", None, "12:00"],
+        [None, "Total", None, *blank[3:]],
+        [None, "Maria Souza", None, *blank[3:]],
+        [None, 3.0, "Qui", "08:00", "18:00", "10:00", "08:00", None, None, "05:00", None, "01:00", None, "09:30"],
+        [None, "31", "Sex", "08:00", "18:00", "10:00", "08:00", None, None, "05:45", None, "01:00", None, "11:00"],
+    ]
+    return pd.DataFrame(rows)
+
+
+def test_vectorized_parser_matches_row_by_row_parser():
+    raw = _sample_report()
+    expected = _legacy_parse(raw)
+    result = parse_journey_frame(raw)
+    pd.testing.assert_frame_equal(result, expected)
+    assert result["Motorista"].tolist() == ["João da Silva", "João da Silva", "Maria Souza"]
+    assert result["Semana"].tolist() == ["Seg", "Ter", "Sex"]
+
+
+def test_parser_ignores_day_rows_before_first_driver():
+    raw = _sample_report().iloc[5:8]
+    result = parse_journey_frame(raw)
+    assert result.empty
+    assert list(result.columns) == REPORT_COLUMNS
+
+
+def test_parser_requires_all_report_columns():
+    raw = _sample_report().iloc[:, :10]
+    assert parse_journey_frame(raw).empty
+
+
+def test_vectorized_durations_match_scalar_conversion():
+    values = [
+        "05:30",
+        " 06:10:00 ",
+        "00:00:00",
+        "11:00",
+        "-01:00",
+        "1 days 02:15:00",
+        "0 days 04:59:59",
+        "texto",
+        "",
+        "nan",
+        None,
+        np.nan,
+        0.25,
+        1,
+        timedelta(hours=3, minutes=20),
+        pd.Timedelta(minutes=-5),
+        time(7, 45),
+        datetime(2024, 5, 1, 8, 30),
+        pd.NaT,
+    ]
+    series = pd.Series(values, dtype=object)
+    expected = [duration_to_minutes(value) for value in values]
+    assert durations_to_minutes(series).tolist() == expected
+    assert durations_to_minutes(series.iloc[:10]).tolist() == expected[:10]
+
+
+def test_durations_support_native_dtypes():
+    assert durations_to_minutes(pd.Series([0.5, np.nan, -0.1])).tolist() == [720, 0, 0]
+    assert durations_to_minutes(pd.to_timedelta(["01:30:00", None])).tolist() == [90, 0]
+    assert durations_to_minutes(pd.Series(pd.to_datetime(["2024-01-01 10:15"]))).tolist() == [615]
+
+
+def _journey_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Motorista": ["Ana", "Ana", "Bruno", "Bruno"],
+            "Dia": [1, 2, 1, 2],
+            "Semana": ["Seg", "Ter", "Seg", "Ter"],
+            "Jornada total": ["10:00", "09:00", "08:00", ""],
+            "Máxima condução contínua": ["06:10", "05:30", "07:00", "02:00"],
+            "Interjornada": ["10:15", "12:00", "09:00", ""],
+        }
+    )
+
+
+def test_compliance_classifies_critical_and_attention_days():
+    result = analyze_compliance(_journey_frame())
+    assert result["Status"].tolist() == ["Crítico", "Conforme", "Crítico", "Conforme"]
+    assert result["Tem crítica"].tolist() == [True, False, True, False]
+    assert result["Tem atenção"].tolist() == [True, False, True, False]
+    assert result.loc[0, "Ocorrência crítica"] == "Direção contínua de 06:10 — referência de 5h30 excedida"
+    assert result.loc[0, "Ponto de atenção"] == "Interjornada de 10:15 — referência mínima de 11h não atingida"
+    assert result.loc[1, "Ocorrência crítica"] == ""
+    assert result["Data de referência"].tolist() == ["1 (Seg)", "2 (Ter)", "1 (Seg)", "2 (Ter)"]
+    assert result["Jornada total (min)"].tolist() == [600, 540, 480, 0]
+
+
+def test_compliance_thresholds_are_configurable():
+    result = analyze_compliance(_journey_frame(), max_continuous_minutes=400, min_interjourney_minutes=600)
+    assert result["Status"].tolist() == ["Conforme", "Conforme", "Crítico", "Conforme"]
+    assert result["Tem atenção"].tolist() == [False, False, True, False]
+    assert result.loc[2, "Ocorrência crítica"].endswith("referência de 6h40 excedida")
+    assert result.loc[2, "Ponto de atenção"].endswith("referência mínima de 10h não atingida")
+
+
+def _sample_csv(separator: str = ";", encoding: str = "utf-8") -> bytes:
+    return _sample_report().to_csv(sep=separator, header=False, index=False).encode(encoding)
+
+
+def test_csv_format_is_sniffed_from_sample():
+    assert sniff_csv_format(_sample_csv(";")) == (";", "utf-8")
+    assert sniff_csv_format(_sample_csv(",", "latin-1")) == (",", "latin-1")
+    assert sniff_csv_format(b"\xef\xbb\xbf" + _sample_csv("\t")) == ("\t", "utf-8-sig")
+
+
+def test_csv_report_matches_in_memory_parse():
+    expected = parse_journey_frame(_sample_report())
+    for separator, encoding in ((";", "utf-8"), (",", "latin-1")):
+        result = read_journey_sheet(_sample_csv(separator, encoding), "jornada.csv")
+        pd.testing.assert_frame_equal(parse_journey_frame(result), expected)
+
+
+def test_streaming_keeps_driver_across_chunk_boundaries():
+    expected = parse_journey_frame(_sample_report())
+    chunks = list(iter_journey_report(io.BytesIO(_sample_csv()), "jornada.csv", chunk_rows=2))
+    assert len(chunks) > 1
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+
+def test_streaming_xlsx_uses_the_sheet_reader():
+    buffer = io.BytesIO()
+    _sample_report().to_excel(buffer, header=False, index=False)
+    data = buffer.getvalue()
+    chunks = list(iter_journey_report(io.BytesIO(data), "jornada.xlsx"))
+    assert len(chunks) == 1
+    pd.testing.assert_frame_equal(chunks[0], parse_journey_frame(read_journey_sheet(data, "jornada.xlsx")))
+
+
+def test_streaming_empty_csv_yields_nothing():
+    assert list(iter_journey_report(io.BytesIO(b""), "vazio.csv")) == []
+
+
+def test_batch_audit_runs_files_in_parallel_and_reports_failures():
+    files = [
+        ("cliente_a.csv", _sample_csv(";")),
+        ("cliente_b.csv", _sample_csv(",", "latin-1")),
+        ("corrompido.xlsx", b"not a workbook"),
+    ]
+    results = {filename: (analysis, error) for filename, analysis, error in iter_batch_audit(files, workers=2)}
+    expected = analyze_compliance(parse_journey_frame(_sample_report()))
+    assert set(results) == {"cliente_a.csv", "cliente_b.csv", "corrompido.xlsx"}
+    for name in ("cliente_a.csv", "cliente_b.csv"):
+        analysis, error = results[name]
+        assert error == ""
+        pd.testing.assert_frame_equal(analysis, expected)
+    analysis, error = results["corrompido.xlsx"]
+    assert error
+    assert analysis.empty
+
+
+def test_batch_audit_single_worker_runs_inline():
+    results = list(iter_batch_audit([("a.csv", _sample_csv())], max_continuous_minutes=400, workers=1))
+    assert len(results) == 1
+    filename, analysis, error = results[0]
+    assert (filename, error) == ("a.csv", "")
+    assert analysis["Tem crítica"].sum() == 0
+
+
+def test_day_documents_hash_changes_only_for_edited_days():
+    flat = parse_journey_frame(_sample_report())
+    documents = journey_day_documents(flat, analyze_compliance(flat), "2024-05")
+    assert [(item["motorista"], item["periodo"], item["dia"]) for item in documents] == [
+        ("João da Silva", "2024-05", 1),
+        ("João da Silva", "2024-05", 2),
+        ("Maria Souza", "2024-05", 31),
+    ]
+    assert documents[0]["tem_critica"] is True
+    assert documents[0]["conducao_continua_min"] == 370
+
+    edited = flat.copy()
+    edited.loc[1, "Interjornada"] = "10:00"
+    edited_documents = journey_day_documents(edited, analyze_compliance(edited), "2024-05")
+    changed = [old["dia"] for old, new in zip(documents, edited_documents) if old["row_hash"] != new["row_hash"]]
+    assert changed == [2]
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from app_core.journey_report import create_pdf_report, report_fingerprint
+
+
+def _occurrences(count: int, column: str) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Motorista": [f"Motorista {index % 7} com um nome bem mais longo que a coluna" for index in range(count)],
+            "Data de referência": [f"{index % 31 + 1} (Sáb)" for index in range(count)],
+            column: [f"Direção contínua de 06:{index % 60:02d} — referência de 5h30 excedida" for index in range(count)],
+        }
+    )
+
+
+def test_pdf_report_renders_multiple_pages_of_occurrences():
+    critical = _occurrences(250, "Ocorrência crítica")
+    attention = _occurrences(3, "Ponto de atenção")
+    content = create_pdf_report(critical, attention, 400, 7)
+    assert content.startswith(b"%PDF")
+    assert content.count(b"/Type /Page\n") > 3
+
+
+def test_pdf_report_without_occurrences():
+    empty = pd.DataFrame(columns=["Motorista", "Data de referência", "Ocorrência crítica", "Ponto de atenção"])
+    assert create_pdf_report(empty, empty, 10, 1).startswith(b"%PDF")
+
+
+def test_fingerprint_changes_only_with_report_content():
+    critical = _occurrences(20, "Ocorrência crítica")
+    attention = _occurrences(5, "Ponto de atenção")
+    fingerprint = report_fingerprint(critical, attention, 100, 7)
+    assert fingerprint == report_fingerprint(critical.copy(), attention.copy(), 100, 7)
+    assert fingerprint == report_fingerprint(critical.set_axis(range(100, 120)), attention, 100, 7)
+    assert fingerprint != report_fingerprint(critical.iloc[:-1], attention, 100, 7)
+    assert fingerprint != report_fingerprint(critical, attention, 101, 7)
+    changed = critical.copy()
+    changed.loc[0, "Ocorrência crítica"] = "outra mensagem"
+    assert fingerprint != report_fingerprint(changed, attention, 100, 7)
@@ -0,0 +1,73 @@
+import io
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from app_core.spreadsheet import CLIENT_INFO_ROW, TABLE_HEADER_ROW, read_excel_sheet, read_sheet_grid
+
+
+def _exported_report() -> bytes:
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet["A1"] = "Lista de terminais"
+    sheet["D9"] = "Cliente:"
+    sheet["E9"] = "Transportes Exemplo"
+    sheet.append([])
+    sheet.append([])
+    sheet.append(["Terminal", "Placa", "Última Transmissão", "Nº Série", "Valor", "Ativo", None, "Observação"])
+    sheet.append([1001, "ABC1234", datetime(2024, 5, 1, 8, 30), 8000123.0, 10.5, True, None, "#N/A"])
+    sheet.append([1002, "DEF5678", datetime(2024, 4, 2, 17, 0), 8000124.0, 7, False])
+    sheet.append([])
+    sheet.append([1003, None, None, None, None, None, None, "sem placa"])
+    sheet["B16"] = "=1/0"
+    sheet.append([])
+    sheet.append([])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"header": TABLE_HEADER_ROW},
+        {"header": None, "skiprows": CLIENT_INFO_ROW, "nrows": 1},
+        {"header": None},
+        {"header": 0},
+    ],
+)
+def test_streaming_reader_matches_read_excel(options):
+    data = _exported_report()
+    expected = pd.read_excel(io.BytesIO(data), engine="openpyxl", **options)
+    pd.testing.assert_frame_equal(read_excel_sheet(data, engine="openpyxl", **options), expected)
+
+
+def test_streaming_reader_keeps_report_types():
+    frame = read_excel_sheet(_exported_report(), header=TABLE_HEADER_ROW, engine="openpyxl")
+    assert frame["Terminal"].iloc[[0, 1, 3]].tolist() == [1001, 1002, 1003]
+    assert frame["Terminal"].isna().tolist() == [False, False, True, False]
+    assert frame["Nº Série"].iloc[0] == 8000123
+    # Fórmula sem valor calculado é lida como célula vazia.
+    assert frame["Placa"].iloc[1] == "DEF5678"
+    assert pd.isna(frame["Placa"].iloc[3])
+    assert frame["Última Transmissão"].iloc[0] == pd.Timestamp(2024, 5, 1, 8, 30)
+    assert pd.isna(frame["Observação"].iloc[0])
+
+
+def test_grid_stops_after_requested_rows():
+    grid = read_sheet_grid(_exported_report(), max_rows=CLIENT_INFO_ROW + 1)
+    assert len(grid) == CLIENT_INFO_ROW + 1
+    assert grid[CLIENT_INFO_ROW][3:5] == ["Cliente:", "Transportes Exemplo"]
+
+
+def test_empty_workbook_returns_empty_frame():
+    buffer = io.BytesIO()
+    Workbook().save(buffer)
+    assert read_excel_sheet(buffer.getvalue(), engine="openpyxl").empty
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        read_excel_sheet(_exported_report(), engine="xlrd")
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from app_core.stock import ledger_documents, ledger_reconciliation, normalize_serials, reconcile_stock
+
+
+def _legacy_normalize(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+
+
+def _legacy_reconcile(system_stock: pd.DataFrame, physical_stock: pd.DataFrame):
+    """Conciliação usada pela página de estoque antes do motor por chaves."""
+    reconciled = physical_stock.merge(system_stock[["Serial", "Status", "Modelo"]], on="Serial", how="left")
+    reconciled["Status"] = reconciled["Status"].fillna("Não encontrado no sistema")
+    reconciled["Modelo"] = reconciled["Modelo"].fillna("Não identificado")
+    expected_in_stock = system_stock[~system_stock["Status"].astype(str).str.casefold().eq("indisponível")]
+    missing_serials = set(expected_in_stock["Serial"]) - set(physical_stock["Serial"])
+    missing_physical = expected_in_stock[expected_in_stock["Serial"].isin(missing_serials)].copy()
+    unknown_system = reconciled[reconciled["Status"] == "Não encontrado no sistema"].copy()
+    return reconciled, unknown_system, missing_physical
+
+
+def _system_stock() -> pd.DataFrame:
+    frame = pd.DataFrame(
+        {
+            "Serial": ["1001", "1002", "1003", "1004", "A-77", "1002", "1006"],
+            "Status": ["Disponível", "Em uso", "INDISPONÍVEL", "Disponível", None, "Manutenção", "Disponível"],
+            "Modelo": ["ST-340", "ST-340", "ST-390", None, "J16", "ST-340", "J16"],
+            "Última Transmissão": pd.date_range("2024-05-01", periods=7, freq="D"),
+        },
+        index=[12, 13, 15, 16, 17, 18, 20],
+    )
+    return frame
+
+
+def _physical_stock() -> pd.DataFrame:
+    return pd.DataFrame({"Serial": ["9999", "1002", "A-77", "1004", "1003"]}, index=[0, 1, 3, 4, 6])
+
+
+def test_serial_normalization_matches_regex_version():
+    values = pd.Series([" 1001 ", 1002.0, 1003, "A-77.0", "10.05", np.nan, "", "x.0.0", 1.5])
+    pd.testing.assert_series_equal(normalize_serials(values), _legacy_normalize(values))
+
+
+def test_reconciliation_matches_previous_output():
+    result = reconcile_stock(_system_stock(), _physical_stock())
+    expected = _legacy_reconcile(_system_stock(), _physical_stock())
+    for actual, legacy in zip(result, expected):
+        pd.testing.assert_frame_equal(actual, legacy)
+
+    reconciled, unknown, missing = result
+    assert reconciled["Serial"].tolist() == ["9999", "1002", "1002", "A-77", "1004", "1003"]
+    assert unknown["Serial"].tolist() == ["9999", "A-77"]
+    assert missing["Serial"].tolist() == ["1001", "1006"]
+
+
+def test_reconciliation_with_disjoint_and_empty_sides():
+    system = _system_stock()
+    for physical in (pd.DataFrame({"Serial": ["X1", "X2"]}), pd.DataFrame({"Serial": pd.Series([], dtype=object)})):
+        for actual, legacy in zip(reconcile_stock(system, physical), _legacy_reconcile(system, physical)):
+            pd.testing.assert_frame_equal(actual, legacy, check_dtype=False, check_index_type=False)
+
+
+def test_reconciliation_on_random_inventory_matches_previous_output():
+    rng = np.random.default_rng(3)
+    serials = np.array([f"{value:08d}" for value in rng.choice(50_000, 4_000, replace=False)], dtype=object)
+    system = pd.DataFrame(
+        {
+            "Serial": serials[:3_000],
+            "Status": rng.choice(["Disponível", "Indisponível", "Em uso"], 3_000),
+            "Modelo": rng.choice(["ST-340", "ST-390", "J16"], 3_000),
+        }
+    )
+    physical = pd.DataFrame({"Serial": rng.permutation(serials[1_000:])}).drop_duplicates("Serial")
+    for actual, legacy in zip(reconcile_stock(system, physical), _legacy_reconcile(system, physical)):
+        pd.testing.assert_frame_equal(actual, legacy)
+
+
+def test_ledger_documents_keep_one_entry_per_serial():
+    documents = ledger_documents(_system_stock())
+    assert [item["serial"] for item in documents] == ["1001", "1003", "1004", "A-77", "1002", "1006"]
+    by_serial = {item["serial"]: item for item in documents}
+    assert by_serial["1002"]["status"] == "Manutenção"
+    assert by_serial["1003"]["esperado"] is False
+    assert by_serial["A-77"]["status"] is None and by_serial["A-77"]["esperado"] is True
+    assert by_serial["1004"]["modelo"] is None
+
+    edited = _system_stock()
+    edited.loc[12, "Status"] = "Em uso"
+    changed = [
+        old["serial"]
+        for old, new in zip(documents, ledger_documents(edited))
+        if old["row_hash"] != new["row_hash"]
+    ]
+    assert changed == ["1001"]
+
+
+def test_ledger_reconciliation_for_one_location():
+    counted = [
+        {"serial": "1002", "no_sistema": True, "status": "Em uso", "modelo": "ST-340", "local": "Prateleira 1"},
+        {"serial": "9999", "no_sistema": False, "local": "Prateleira 1"},
+        {"serial": "A-77", "no_sistema": True, "status": None, "modelo": "J16", "local": "Prateleira 1"},
+    ]
+    pending = [{"serial": "1001", "status": "Disponível", "modelo": "ST-340"}]
+    reconciled, unknown, missing = ledger_reconciliation(counted, pending)
+    assert reconciled.columns.tolist() == ["Serial", "Local", "Status", "Modelo"]
+    assert reconciled["Status"].tolist() == ["Em uso", "Não encontrado no sistema", "Não encontrado no sistema"]
+    assert unknown["Serial"].tolist() == ["9999", "A-77"]
+    assert missing.to_dict("records") == [{"Serial": "1001", "Status": "Disponível", "Modelo": "ST-340"}]
+
+    reconciled, unknown, missing = ledger_reconciliation([], [])
+    assert reconciled.empty and unknown.empty and missing.empty
@@ -0,0 +1,123 @@
+import io
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from app_core.spreadsheet import read_report_sheet
+from app_core.terminals import (
+    CHANGE_NEWLY_STALE,
+    CHANGE_RECOVERED,
+    CHANGE_STILL_STALE,
+    UNKNOWN_CLIENT,
+    classify_transmissions,
+    compare_with_snapshot,
+    parse_terminal_report,
+    snapshot_documents,
+)
+
+
+def _terminal_report(client: str | None = "Transportes Exemplo", header: tuple = ()) -> bytes:
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet["A1"] = "Lista de terminais"
+    sheet["D9"] = "Cliente:"
+    if client:
+        sheet["E9"] = client
+    sheet.append([])
+    sheet.append([])
+    sheet.append(list(header or ("Terminal", "Placa", "Rastreador", "Rastreador Modelo", "Última Transmissão")))
+    sheet.append([1001, "ABC1234", "R1", "ST-340", datetime(2024, 5, 10, 8, 0)])
+    sheet.append([1002, "DEF5678", "R2", "ST-340", "01/05/2024 09:30"])
+    sheet.append([None, "SEM0000", "R3", "ST-340", datetime(2024, 5, 10)])
+    sheet.append([1004, "GHI9012", "R4", "ST-390", "sem data"])
+    sheet.append([1005, "JKL3456", "R5", "ST-390", datetime(2024, 4, 1, 23, 0)])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def test_single_pass_matches_separate_reads():
+    data = _terminal_report()
+    info, table = read_report_sheet(data, engine="openpyxl")
+    client_row = pd.read_excel(io.BytesIO(data), header=None, skiprows=8, nrows=1, engine="openpyxl")
+    assert info[4] == client_row.iloc[0, 4]
+    pd.testing.assert_frame_equal(table, pd.read_excel(io.BytesIO(data), header=11, engine="openpyxl"))
+    info, pandas_table = read_report_sheet(data, engine="pandas")
+    assert info[4] == "Transportes Exemplo"
+    pd.testing.assert_frame_equal(pandas_table, table)
+
+
+def test_terminal_report_reads_client_and_valid_rows():
+    client, terminals = parse_terminal_report(_terminal_report())
+    assert client == "Transportes Exemplo"
+    assert terminals["Terminal"].tolist() == [1001, 1002, 1005]
+    assert "Modelo" in terminals.columns
+    assert terminals["Data Transmissão"].tolist() == [
+        pd.Timestamp(2024, 5, 10, 8, 0),
+        pd.Timestamp(2024, 5, 1, 9, 30),
+        pd.Timestamp(2024, 4, 1, 23, 0),
+    ]
+
+
+def test_terminal_report_without_client_name():
+    client, _ = parse_terminal_report(_terminal_report(client=None))
+    assert client == UNKNOWN_CLIENT
+
+
+def test_terminal_report_requires_columns():
+    with pytest.raises(ValueError, match="Modelo"):
+        parse_terminal_report(_terminal_report(header=("Terminal", "Placa", "Rastreador", "Tipo", "Última Transmissão")))
+
+
+def test_transmissions_are_classified_against_threshold():
+    _, terminals = parse_terminal_report(_terminal_report())
+    result = classify_transmissions(terminals, 10, now=datetime(2024, 5, 11, 10, 0))
+    assert result["Status"].tolist() == ["Atualizado", "Desatualizado", "Desatualizado"]
+    assert result["Dias sem transmitir"].tolist() == [1, 10, 39]
+    assert "Status" not in terminals.columns
+
+    # Exatamente no limite o terminal ainda é considerado atualizado.
+    limit = classify_transmissions(terminals, 10, now=datetime(2024, 5, 11, 9, 30))
+    assert limit["Status"].tolist() == ["Atualizado", "Atualizado", "Desatualizado"]
+
+
+def _classified(now: datetime = datetime(2024, 5, 11, 10, 0)) -> pd.DataFrame:
+    _, terminals = parse_terminal_report(_terminal_report())
+    return classify_transmissions(terminals, 10, now=now)
+
+
+def test_snapshot_diff_splits_newly_stale_recovered_and_still_stale():
+    previous = pd.DataFrame(
+        {
+            "terminal": ["1001", "1002", "9999"],
+            "status": ["Desatualizado", "Desatualizado", "Desatualizado"],
+        }
+    )
+    result = compare_with_snapshot(_classified(), previous)
+    assert result["Mudança"].tolist() == [CHANGE_RECOVERED, CHANGE_STILL_STALE, CHANGE_NEWLY_STALE]
+
+    first_upload = compare_with_snapshot(_classified(), pd.DataFrame())
+    assert first_upload["Mudança"].tolist() == ["", CHANGE_NEWLY_STALE, CHANGE_NEWLY_STALE]
+
+
+def test_snapshot_documents_hash_tracks_status_changes():
+    documents = snapshot_documents("Transportes Exemplo", _classified(), 10)
+    assert [item["terminal"] for item in documents] == ["1001", "1002", "1005"]
+    assert documents[0]["cliente"] == "Transportes Exemplo"
+    assert documents[0]["data_transmissao"] == datetime(2024, 5, 10, 8, 0)
+
+    later = snapshot_documents("Transportes Exemplo", _classified(now=datetime(2024, 5, 25)), 10)
+    changed = [old["terminal"] for old, new in zip(documents, later) if old["row_hash"] != new["row_hash"]]
+    assert changed == ["1001"]
+
+
+def test_snapshot_hash_ignores_the_transmission_time():
+    analysis = _classified()
+    documents = snapshot_documents("Transportes Exemplo", analysis, 10)
+    # Nova exportação: os terminais transmitiram de novo sem mudar de status.
+    shifted = analysis.assign(**{"Data Transmissão": analysis["Data Transmissão"] + pd.Timedelta(hours=1)})
+    later = snapshot_documents("Transportes Exemplo", shifted, 10)
+    assert [item["row_hash"] for item in later] == [item["row_hash"] for item in documents]
+    assert later[0]["data_transmissao"] == datetime(2024, 5, 10, 9, 0)
@@ -0,0 +1,432 @@
+from datetime import date, datetime, timedelta
+
+import bson
+import numpy as np
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+import user_management_db
+from user_management_db import (
+    _PROPOSAL_VALUE,
+    _insert_audit_events,
+    _keyset_page,
+    _log_filter,
+    _normalize_proposal_dates,
+    get_billing_history_page,
+    initialize_database,
+    _proposal_filter,
+    get_log_filter_options,
+    get_proposal_rollups,
+    save_terminal_snapshot,
+    search_proposals,
+)
+
+
+def _matches(document: dict, query: dict) -> bool:
+    """Subconjunto dos operadores do MongoDB usado pelas consultas paginadas."""
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(_matches(document, part) for part in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(_matches(document, part) for part in condition):
+                return False
+            continue
+        value = document.get(key)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for operator, argument in condition.items():
+            if operator == "$type":
+                ok = isinstance(value, datetime)
+            elif operator == "$in":
+                ok = value in argument
+            elif value is None:
+                ok = False
+            else:
+                ok = {
+                    "$lt": value < argument,
+                    "$lte": value <= argument,
+                    "$gt": value > argument,
+                    "$gte": value >= argument,
+                }[operator]
+            if not ok:
+                return False
+    return True
+
+
+class _Cursor(list):
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.sort_key(field, direction)
+        return self
+
+    def sort_key(self, field, direction):
+        self[:] = sorted(self, key=lambda document: document[field], reverse=direction == -1)
+
+    def limit(self, limit):
+        return _Cursor(self[:limit])
+
+
+class _Collection:
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return _Cursor(document for document in self.documents if _matches(document, query))
+
+    def count_documents(self, query):
+        return sum(1 for document in self.documents if _matches(document, query))
+
+    def estimated_document_count(self):
+        return len(self.documents)
+
+
+def _logs(count: int) -> list[dict]:
+    start = datetime(2024, 1, 1)
+    # Três registros por minuto: o _id desempata registros com a mesma data.
+    logs = [{"_id": ObjectId(), "timestamp": start + timedelta(minutes=number // 3), "user": "ana"} for number in range(count)]
+    return logs + [{"_id": ObjectId(), "timestamp": None, "user": "ana"}]
+
+
+def _newest_first(documents: list[dict]) -> list[dict]:
+    dated = [document for document in documents if document["timestamp"] is not None]
+    return sorted(dated, key=lambda document: (document["timestamp"], document["_id"]), reverse=True)
+
+
+def test_pages_walk_forward_and_back_in_order():
+    collection = _Collection(_logs(23))
+    pages = [_keyset_page(collection, {}, "timestamp", page_size=5)]
+    while pages[-1]["next"]:
+        pages.append(_keyset_page(collection, {}, "timestamp", after=pages[-1]["next"], page_size=5))
+
+    assert [document for page in pages for document in page["items"]] == _newest_first(collection.documents)
+    assert [len(page["items"]) for page in pages] == [5, 5, 5, 5, 3]
+    assert pages[0]["previous"] is None and pages[-1]["next"] is None
+
+    page, back = pages[-1], []
+    while page["previous"]:
+        page = _keyset_page(collection, {}, "timestamp", before=page["previous"], page_size=5)
+        back.append(page["items"])
+    assert back == [page["items"] for page in pages[-2::-1]]
+    assert page["next"] == pages[0]["next"]
+
+
+def test_last_full_page_has_no_next_cursor():
+    collection = _Collection(_logs(10))
+    first = _keyset_page(collection, {}, "timestamp", page_size=5)
+    second = _keyset_page(collection, {}, "timestamp", after=first["next"], page_size=5)
+    assert second["next"] is None and second["previous"] is not None
+    assert second["items"] == _newest_first(collection.documents)[5:]
+
+
+def test_filter_and_totals():
+    collection = _Collection(_logs(12))
+    for document in collection.documents[:12:2]:
+        document["user"] = "bruno"
+    page = _keyset_page(collection, {"user": {"$in": ["bruno"]}}, "timestamp", page_size=4, with_total=True)
+    assert {document["user"] for document in page["items"]} == {"bruno"}
+    assert page["total"] == 6
+    # Sem filtro o total vem da contagem estimada da coleção.
+    assert _keyset_page(collection, {}, "timestamp", page_size=4, with_total=True)["total"] == 13
+
+
+def test_restarts_from_first_page_when_cursor_documents_are_gone():
+    collection = _Collection(_logs(10))
+    first = _keyset_page(collection, {}, "timestamp", page_size=5)
+    second = _keyset_page(collection, {}, "timestamp", after=first["next"], page_size=5)
+    # Tudo o que era mais recente que a segunda página foi removido.
+    collection.documents = [document for document in collection.documents if document not in first["items"]]
+    restarted = _keyset_page(collection, {}, "timestamp", before=second["previous"], page_size=5)
+    assert restarted["items"] == second["items"]
+    assert restarted["previous"] is None
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        _keyset_page(_Collection(_logs(3)), {}, "timestamp", after="não é um cursor")
+    with pytest.raises(ValueError):
+        _keyset_page(_Collection(_logs(3)), {}, "timestamp", after="2024-01-01T00:00:00|xyz")
+
+
+class _LogCollection:
+    """Grava só o que o driver conseguiria converter para BSON."""
+
+    def __init__(self):
+        self.documents = []
+
+    def insert_many(self, documents, ordered=True):
+        for document in documents:
+            bson.encode(document)
+        self.documents.extend(documents)
+
+    def insert_one(self, document):
+        bson.encode(document)
+        self.documents.append(document)
+
+
+def test_invalid_audit_event_is_dropped_alone(monkeypatch):
+    collection = _LogCollection()
+    monkeypatch.setattr(user_management_db, "get_collection", lambda name: collection)
+    events = [
+        {"_id": ObjectId(), "action": "Login", "details": {"ok": True}},
+        {"_id": ObjectId(), "action": "Exportou", "details": {"linhas": np.int64(3)}},
+        {"_id": ObjectId(), "action": "Logout", "details": None},
+    ]
+    assert _insert_audit_events(events) == 1
+    assert [event["action"] for event in collection.documents] == ["Login", "Logout"]
+
+
+def test_log_filter_only_sets_the_chosen_fields():
+    assert _log_filter(None, None, None, None, "  ") == {}
+    query = _log_filter(["ana"], ("Login",), date(2024, 1, 1), date(2024, 1, 31), " exportou ")
+    assert query == {
+        "user": {"$in": ["ana"]},
+        "action": {"$in": ["Login"]},
+        "timestamp": {"$gte": datetime(2024, 1, 1), "$lte": datetime(2024, 1, 31, 23, 59, 59, 999999)},
+        "$text": {"$search": "exportou"},
+    }
+    assert _log_filter(None, None, None, date(2024, 1, 31), "") == {"timestamp": {"$lte": datetime(2024, 1, 31, 23, 59, 59, 999999)}}
+
+
+class _OptionsCollection(_Collection):
+    def find_one(self, query, projection=None, sort=None):
+        field, direction = sort[0]
+        documents = self.find(query).sort([(field, direction)])
+        return documents[0] if documents else None
+
+    def distinct(self, field):
+        return list({document.get(field) for document in self.documents})
+
+
+def test_log_filter_options(monkeypatch):
+    collection = _OptionsCollection(_logs(6) + [{"_id": ObjectId(), "timestamp": datetime(2023, 12, 31, 8), "user": None, "action": "Login"}])
+    for document in collection.documents[:6]:
+        document["action"] = "Exportou"
+    monkeypatch.setattr(user_management_db, "get_collection", lambda name: collection)
+    get_log_filter_options.clear()
+    try:
+        assert get_log_filter_options() == {
+            "users": ["ana"],
+            "actions": ["Exportou", "Login"],
+            "inicio": date(2023, 12, 31),
+            "fim": date(2024, 1, 1),
+        }
+        # Sem nenhum registro datado não há filtros a oferecer.
+        collection.documents = [{"_id": ObjectId(), "timestamp": None, "user": "ana", "action": "Login"}]
+        get_log_filter_options.clear()
+        assert get_log_filter_options() == {}
+    finally:
+        get_log_filter_options.clear()
+
+
+def _proposals() -> list[dict]:
+    return [
+        {"_id": 1, "data_geracao": datetime(2024, 3, 5), "consultor": "Ana", "tipo": "PJ", "status": "approved"},
+        {"_id": 2, "data_geracao": datetime(2024, 3, 9), "tipo": "PF"},
+        {"_id": 3, "data_geracao": datetime(2024, 4, 1), "consultor": "Bruno", "tipo": "PJ", "status": "pending_approval"},
+        {"_id": 4, "data_geracao": "2024-03-05", "consultor": "Ana", "tipo": "PJ", "status": "approved"},
+    ]
+
+
+def _selected(query: dict) -> list[int]:
+    return [document["_id"] for document in _proposals() if _matches(document, query)]
+
+
+def test_proposal_filter_fallback_labels_match_missing_fields():
+    assert _selected(_proposal_filter(None, None, None, None, None)) == [1, 2, 3]
+    assert _selected(_proposal_filter(("Não informado",), None, None, None, None)) == [2]
+    assert _selected(_proposal_filter(("Ana", "Não informado"), None, ("legacy",), None, None)) == [2]
+    assert _selected(_proposal_filter(("Ana",), ("PJ",), ("approved",), None, None)) == [1]
+    assert _selected(_proposal_filter(None, None, None, date(2024, 3, 9), date(2024, 3, 31))) == [2]
+    # O valor padrão não some do filtro: continua valendo para quem gravou o texto.
+    assert _proposal_filter(("Não informado",), None, None, None, None)["consultor"] == {"$in": ["Não informado", None]}
+
+
+def _convert(value, spec):
+    """Semântica do $convert para double usada em _PROPOSAL_VALUE."""
+    if value is None:
+        return spec["onNull"]
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return spec["onError"]
+
+
+class _ProposalCollection:
+    def __init__(self, documents):
+        self.documents = documents
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        spec = pipeline[1]["$project"]["valor_total"]["$convert"]
+        values = [_convert(document.get("valor_total"), spec) for document in self.documents]
+        return iter([{"totals": [{"propostas": len(values), "valor_total": sum(values), "pendentes": 0}], "monthly": [], "by_status": [], "by_consultant": []}])
+
+
+def test_proposal_rollups_convert_valor_total(monkeypatch):
+    collection = _ProposalCollection([{"valor_total": 100}, {"valor_total": "250.5"}, {"valor_total": "n/d"}, {"valor_total": None}, {}])
+    monkeypatch.setattr(user_management_db, "get_collection", lambda name: collection)
+    get_proposal_rollups.clear()
+    try:
+        rollups = get_proposal_rollups(("Ana",), ("PJ",), ("approved",))
+    finally:
+        get_proposal_rollups.clear()
+
+    assert rollups["totals"] == {"propostas": 5, "valor_total": 350.5, "pendentes": 0}
+    pipeline = collection.pipelines[0]
+    assert pipeline[0] == {"$match": _proposal_filter(("Ana",), ("PJ",), ("approved",), None, None)}
+    assert pipeline[1]["$project"]["valor_total"] == _PROPOSAL_VALUE
+    assert _PROPOSAL_VALUE["$convert"] == {"input": "$valor_total", "to": "double", "onError": 0.0, "onNull": 0.0}
+    # Todos os totais somam o valor já convertido, nunca o campo original.
+    sums = [
+        group["$sum"]
+        for facet in pipeline[2]["$facet"].values()
+        for stage in facet
+        for group in stage.get("$group", {}).values()
+        if isinstance(group, dict) and "$sum" in group and group["$sum"] != 1
+    ]
+    assert "$valor_total" in sums and all(value in {"$valor_total", "$pendente"} for value in sums)
+
+
+class _SnapshotCollection:
+    def __init__(self, documents):
+        self.documents = documents
+        self.operations = []
+
+    def find(self, query, projection=None):
+        return [document for document in self.documents if document["cliente"] == query["cliente"]]
+
+    def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+    def delete_many(self, query):
+        return type("Result", (), {"deleted_count": len(query["terminal"]["$in"])})()
+
+
+def test_terminal_snapshot_sets_transmission_time_without_counting_a_change(monkeypatch):
+    stored = [
+        {"cliente": "Frota", "terminal": "1", "row_hash": "a", "data_transmissao": datetime(2024, 5, 1)},
+        {"cliente": "Frota", "terminal": "2", "row_hash": "b", "data_transmissao": datetime(2024, 5, 1)},
+        {"cliente": "Frota", "terminal": "3", "row_hash": "c", "data_transmissao": datetime(2024, 5, 1)},
+    ]
+    collection = _SnapshotCollection(stored)
+    monkeypatch.setattr(user_management_db, "get_collection", lambda name: collection)
+    documents = [
+        {"terminal": "1", "row_hash": "a", "data_transmissao": datetime(2024, 5, 1)},
+        {"terminal": "2", "row_hash": "b", "data_transmissao": datetime(2024, 5, 2)},
+        {"terminal": "4", "row_hash": "d", "data_transmissao": datetime(2024, 5, 2)},
+    ]
+    counts = save_terminal_snapshot("Frota", documents)
+    assert counts == {"inseridos": 1, "atualizados": 0, "inalterados": 2, "removidos": 1}
+    updates = {operation._filter["terminal"]: operation._doc for operation in collection.operations}
+    assert set(updates) == {"2", "4"}
+    assert updates["2"] == {"$set": {"data_transmissao": datetime(2024, 5, 2)}}
+
+
+def test_terminal_snapshot_of_unknown_client_is_not_saved(monkeypatch):
+    collection = _SnapshotCollection([])
+    monkeypatch.setattr(user_management_db, "get_collection", lambda name: collection)
+    assert save_terminal_snapshot("Cliente não identificado", [{"terminal": "1", "row_hash": "a", "data_transmissao": None}]) is None
+    assert collection.operations == []
+
+
+class _DatesCollection:
+    def __init__(self, documents):
+        self.documents = documents
+        self.operations = []
+
+    def find(self, query, projection=None):
+        return [document for document in self.documents if isinstance(document.get("data_geracao"), str)]
+
+    def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+
+def test_text_proposal_dates_are_converted_like_the_old_dashboard():
+    collection = _DatesCollection(
+        [
+            {"_id": 1, "data_geracao": "2024-03-05 10:30:00"},
+            {"_id": 2, "data_geracao": datetime(2024, 3, 6)},
+            {"_id": 3, "data_geracao": "sem data"},
+            {"_id": 4},
+        ]
+    )
+    assert _normalize_proposal_dates(collection) == 1
+    (operation,) = collection.operations
+    assert operation._filter == {"_id": 1, "data_geracao": "2024-03-05 10:30:00"}
+    assert operation._doc == {"$set": {"data_geracao": datetime(2024, 3, 5, 10, 30)}}
+
+
+def test_search_proposals_by_id_or_text(monkeypatch):
+    queries = []
+
+    class _Found(list):
+        def sort(self, *args):
+            return self
+
+        def limit(self, limit):
+            return self
+
+    class _Proposals:
+        def find(self, query, projection=None):
+            queries.append(query)
+            return _Found([{"_id": 1}])
+
+    monkeypatch.setattr(user_management_db, "get_collection", lambda name: _Proposals())
+    proposal_id = ObjectId()
+    assert search_proposals(f" {proposal_id} ") == [{"_id": 1}]
+    assert queries[-1] == {"_id": proposal_id}
+
+    search_proposals("Frota (Sul)")
+    pattern = {"$regex": r"Frota\ \(Sul\)", "$options": "i"}
+    assert queries[-1] == {"$or": [{"empresa": pattern}, {"consultor": pattern}, {"proposal_code": pattern}]}
+    assert search_proposals("   ") == [] and len(queries) == 2
+
+
+def test_billing_history_is_paged_without_a_cap(monkeypatch):
+    documents = [{"_id": ObjectId(), "data_geracao": datetime(2024, 1, 1) + timedelta(hours=number)} for number in range(7)]
+    collection = _Collection(documents)
+    monkeypatch.setattr(user_management_db, "get_collection", lambda name: collection)
+
+    pages = [get_billing_history_page(page_size=3, with_total=True)]
+    while pages[-1]["next"]:
+        pages.append(get_billing_history_page(after=pages[-1]["next"], page_size=3))
+    assert [len(page["items"]) for page in pages] == [3, 3, 1]
+    assert pages[0]["total"] == 7
+    assert pages[0]["items"][0]["data_geracao"] == datetime(2024, 1, 1, 6)
+    assert get_billing_history_page(after="cursor inválido")["items"] == []
+
+
+class _IndexedDatabase:
+    def __init__(self):
+        self.created = []
+
+    def __getattr__(self, name):
+        database = self
+
+        class _Indexes:
+            def create_index(self, keys, name=None, **options):
+                if keys == [("$**", "text")]:
+                    raise OperationFailure("too many text indexes")
+                database.created.append(name)
+
+        return _Indexes()
+
+
+def test_text_index_failure_does_not_skip_other_indexes(monkeypatch):
+    database = _IndexedDatabase()
+    monkeypatch.setattr(user_management_db, "get_database", lambda: database)
+    initialize_database.clear()
+    try:
+        assert initialize_database() is True
+    finally:
+        initialize_database.clear()
+    assert {"uq_journey_driver_period_day", "uq_inventory_serial", "uq_churn_period_client", "uq_churn_month"} <= set(database.created)
+    assert "tx_logs_search" not in database.created
@@ -1,21 +1,26 @@
 from __future__ import annotations
 
+import atexit
 import base64
 import logging
 import re
-from datetime import datetime, time
+from datetime import date, datetime, time
 from typing import Any, Iterable
 
+import pandas as pd
 import pymongo
 import streamlit as st
 from bson import ObjectId
+from bson.errors import InvalidDocument
 from passlib.context import CryptContext
 from pymongo import ASCENDING, DESCENDING, UpdateOne
 from pymongo.collection import Collection
 from pymongo.database import Database
-from pymongo.errors import DuplicateKeyError, PyMongoError
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 
+from app_core.audit import enqueue_event, flush_events, start_audit_writer
 from app_core.settings import get_default_branding, normalize_branding
+from app_core.terminals import UNKNOWN_CLIENT
 from config import get_default_pricing, normalize_pricing_config
 
 log = logging.getLogger("SimuladorApp.database")
@@ -84,8 +89,11 @@ def initialize_database() -> bool:
         database.users.create_index([("username", ASCENDING)], unique=True, name="uq_users_username")
         database.users.create_index([("email", ASCENDING)], sparse=True, name="ix_users_email")
         database.activity_logs.create_index([("timestamp", DESCENDING)], name="ix_logs_timestamp")
+        database.activity_logs.create_index([("timestamp", DESCENDING), ("_id", DESCENDING)], name="ix_logs_timestamp_id")
         database.activity_logs.create_index([("user", ASCENDING), ("timestamp", DESCENDING)], name="ix_logs_user_timestamp")
+        database.activity_logs.create_index([("action", ASCENDING), ("timestamp", DESCENDING)], name="ix_logs_action_timestamp")
         database.proposals.create_index([("data_geracao", DESCENDING)], name="ix_proposals_date")
+        database.proposals.create_index([("data_geracao", DESCENDING), ("_id", DESCENDING)], name="ix_proposals_date_id")
         database.proposals.create_index(
             [("empresa", ASCENDING), ("consultor", ASCENDING), ("tipo", ASCENDING), ("data_geracao", DESCENDING)],
             name="ix_proposals_lookup",
@@ -105,6 +113,7 @@ def initialize_database() -> bool:
             name="uq_proposals_code",
         )
         database.billing_history.create_index([("data_geracao", DESCENDING)], name="ix_billing_date")
+        database.billing_history.create_index([("data_geracao", DESCENDING), ("_id", DESCENDING)], name="ix_billing_date_id")
         database.fipe_vehicles.create_index(
             [("codigoFipe", ASCENDING), ("anoModelo", ASCENDING), ("combustivel", ASCENDING)],
             unique=True,
@@ -112,11 +121,58 @@ def initialize_database() -> bool:
             name="uq_fipe_vehicle",
         )
         database.system_settings.create_index([("_id", ASCENDING)], unique=True, name="uq_system_settings")
-        return True
+        database.journey_days.create_index(
+            [("motorista", ASCENDING), ("periodo", ASCENDING), ("dia", ASCENDING)],
+            unique=True,
+            name="uq_journey_driver_period_day",
+        )
+        database.journey_days.create_index([("periodo", ASCENDING)], name="ix_journey_days_period")
+        database.journey_driver_months.create_index(
+            [("motorista", ASCENDING), ("periodo", ASCENDING)],
+            unique=True,
+            name="uq_journey_driver_month",
+        )
+        database.journey_driver_months.create_index([("periodo", DESCENDING)], name="ix_journey_months_period")
+        database.terminal_snapshots.create_index(
+            [("cliente", ASCENDING), ("terminal", ASCENDING)],
+            unique=True,
+            name="uq_terminal_snapshot",
+        )
+        database.terminal_snapshots.create_index(
+            [("status", ASCENDING), ("cliente", ASCENDING)],
+            name="ix_terminal_snapshots_status",
+        )
+        database.inventory_ledger.create_index([("serial", ASCENDING)], unique=True, name="uq_inventory_serial")
+        database.inventory_ledger.create_index([("local", ASCENDING), ("serial", ASCENDING)], name="ix_inventory_location")
+        database.inventory_ledger.create_index([("esperado", ASCENDING), ("local", ASCENDING)], name="ix_inventory_pending")
+        database.churn_classifications.create_index(
+            [("period_key", ASCENDING), ("cliente", ASCENDING)],
+            unique=True,
+            name="uq_churn_period_client",
+        )
+        database.churn_classifications.create_index(
+            [("period_key", ASCENDING), ("classificacao", ASCENDING)],
+            name="ix_churn_period_classification",
+        )
+        database.churn_monthly_totals.create_index([("period_key", ASCENDING)], unique=True, name="uq_churn_month")
     except PyMongoError:
         log.exception("Falha ao criar índices do MongoDB.")
         return False
 
+    # Índice de texto curinga: cobre a ação e todos os textos dentro de details.
+    # Fica por último e à parte: uma falha dele (outro índice de texto na
+    # coleção, limite do plano) só desativa a pesquisa dos logs.
+    try:
+        database.activity_logs.create_index(
+            [("$**", "text")],
+            default_language="portuguese",
+            language_override="idioma_texto",
+            name="tx_logs_search",
+        )
+    except PyMongoError:
+        log.exception("Falha ao criar o índice de texto dos logs; a pesquisa nos logs fica indisponível.")
+    return True
+
 
 def get_users_collection() -> Collection | None:
     return get_collection("users")
@@ -367,31 +423,208 @@ def reset_sidebar_logo() -> bool:
     return _reset_logo(sidebar=True)
 
 
-def add_log(user: str, action: str, details: Any = None) -> bool:
+def _insert_audit_events(events: list[dict[str, Any]]) -> int:
+    """Grava um lote de auditoria e devolve quantos eventos foram descartados."""
     collection = get_collection("activity_logs")
     if collection is None:
+        return 0
+    try:
+        collection.insert_many(events, ordered=False)
+    except InvalidDocument:
+        # Um valor que não vira BSON não é resolvido com novas tentativas e
+        # não pode levar o lote junto: grava evento a evento e descarta só ele.
+        dropped = 0
+        for event in events:
+            try:
+                collection.insert_one(event)
+            except DuplicateKeyError:
+                pass
+            except InvalidDocument as exc:
+                dropped += 1
+                log.error("Evento de auditoria %r descartado: %s", event.get("action"), exc)
+        return dropped
+    except BulkWriteError as exc:
+        # Os _id são gerados no registro: ao repetir um lote, os eventos já
+        # gravados voltam como chave duplicada e podem ser ignorados.
+        errors = [error for error in exc.details.get("writeErrors", []) if error.get("code") != 11000]
+        if errors:
+            log.error("Falha ao gravar %d eventos de auditoria: %s", len(errors), errors[0].get("errmsg"))
+        return len(errors)
+    return 0
+
+
+@st.cache_resource(show_spinner=False)
+def _audit_writer() -> dict[str, Any]:
+    writer = start_audit_writer(_insert_audit_events)
+    atexit.register(flush_events, writer)
+    return writer
+
+
+def add_log(user: str, action: str, details: Any = None) -> bool:
+    """Registra o evento de auditoria sem esperar o banco; a gravação é feita em lotes."""
+    if get_collection("activity_logs") is None:
         return False
+    return enqueue_event(
+        _audit_writer(),
+        {
+            "_id": ObjectId(),
+            "timestamp": datetime.now(),
+            "user": str(user or "sistema"),
+            "action": str(action),
+            "details": details if details is not None else {},
+        },
+    )
+
+
+MAX_PAGE_SIZE = 5_000
+
+
+def _page_cursor(document: dict[str, Any], field: str) -> str:
+    return f"{document[field].isoformat()}|{document['_id']}"
+
+
+def _decode_page_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    stamp, _, document_id = cursor.rpartition("|")
+    if not ObjectId.is_valid(document_id):
+        raise ValueError(f"Cursor de página inválido: {cursor}")
+    return datetime.fromisoformat(stamp), ObjectId(document_id)
+
+
+def _keyset_page(
+    collection: Collection,
+    query: dict[str, Any],
+    field: str,
+    *,
+    after: str | None = None,
+    before: str | None = None,
+    page_size: int = 500,
+    projection: dict[str, Any] | None = None,
+    with_total: bool = False,
+) -> dict[str, Any]:
+    """Página de ``collection`` do mais recente para o mais antigo, por ``(field, _id)``.
+
+    ``after`` é o cursor ``next`` da página anterior (registros mais antigos) e
+    ``before`` o cursor ``previous`` (registros mais recentes). Cada página lê
+    só ``page_size + 1`` documentos pelo índice ``(field, _id)``, qualquer que
+    seja a profundidade. ``total`` (opcional) é a contagem estimada da
+    coleção, ou a contagem exata quando há filtro.
+    """
+    size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    cursor = before or after
+    # Sem data o documento não tem posição na ordem das páginas.
+    conditions = [query, {field: {"$type": "date"}}] if query else [{field: {"$type": "date"}}]
+    if cursor:
+        stamp, document_id = _decode_page_cursor(cursor)
+        operator = "$gt" if before else "$lt"
+        conditions.append({"$or": [{field: {operator: stamp}}, {field: stamp, "_id": {operator: document_id}}]})
+    direction = ASCENDING if before else DESCENDING
+    documents = list(
+        collection.find({"$and": conditions} if len(conditions) > 1 else conditions[0], projection)
+        .sort([(field, direction), ("_id", direction)])
+        .limit(size + 1)
+    )
+    if cursor and not documents:
+        # Os registros em volta do cursor foram removidos: recomeça do início.
+        return _keyset_page(collection, query, field, page_size=size, projection=projection, with_total=with_total)
+    more = len(documents) > size
+    items = documents[:size]
+    if before:
+        items.reverse()
+    has_newer = more if before else bool(after)
+    has_older = bool(before) or more
+    page: dict[str, Any] = {
+        "items": items,
+        "previous": _page_cursor(items[0], field) if items and has_newer else None,
+        "next": _page_cursor(items[-1], field) if items and has_older else None,
+    }
+    if with_total:
+        page["total"] = int(collection.count_documents(query) if query else collection.estimated_document_count())
+    return page
+
+
+def _empty_page() -> dict[str, Any]:
+    return {"items": [], "previous": None, "next": None, "total": 0}
+
+
+def _log_filter(
+    users: Iterable[str] | None,
+    actions: Iterable[str] | None,
+    start: date | None,
+    end: date | None,
+    search: str,
+) -> dict[str, Any]:
+    query: dict[str, Any] = {}
+    if users is not None:
+        query["user"] = {"$in": list(users)}
+    if actions is not None:
+        query["action"] = {"$in": list(actions)}
+    period: dict[str, Any] = {}
+    if start is not None:
+        period["$gte"] = datetime.combine(start, time.min)
+    if end is not None:
+        period["$lte"] = datetime.combine(end, time.max)
+    if period:
+        query["timestamp"] = period
+    if search.strip():
+        query["$text"] = {"$search": search.strip()}
+    return query
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_log_filter_options() -> dict[str, Any]:
+    """Usuários, ações e intervalo de datas dos logs, lidos pelos índices."""
+    collection = get_collection("activity_logs")
+    if collection is None:
+        return {}
     try:
-        collection.insert_one(
-            {
-                "timestamp": datetime.now(),
-                "user": str(user or "sistema"),
-                "action": str(action),
-                "details": details if details is not None else {},
-            }
-        )
-        return True
+        first = collection.find_one({"timestamp": {"$type": "date"}}, {"timestamp": 1}, sort=[("timestamp", ASCENDING)])
+        last = collection.find_one({"timestamp": {"$type": "date"}}, {"timestamp": 1}, sort=[("timestamp", DESCENDING)])
+        if first is None or last is None:
+            return {}
+        return {
+            "users": sorted(str(value) for value in collection.distinct("user") if value is not None),
+            "actions": sorted(str(value) for value in collection.distinct("action") if value is not None),
+            "inicio": first["timestamp"].date(),
+            "fim": last["timestamp"].date(),
+        }
     except PyMongoError:
-        log.exception("Falha ao registrar log.")
-        return False
+        log.exception("Falha ao buscar os filtros dos logs.")
+        return {}
 
 
-def get_all_logs(limit: int = 2_000) -> list[dict[str, Any]]:
+def get_logs_page(
+    *,
+    users: Iterable[str] | None = None,
+    actions: Iterable[str] | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    search: str = "",
+    after: str | None = None,
+    before: str | None = None,
+    page_size: int = 500,
+    with_total: bool = False,
+) -> dict[str, Any]:
+    """Página dos logs filtrados no MongoDB; ``None`` em usuários ou ações não filtra.
+
+    A pesquisa usa o índice de texto ``tx_logs_search`` (palavras inteiras,
+    sem diferenciar acentos e maiúsculas) sobre a ação e os detalhes.
+    """
     collection = get_collection("activity_logs")
     if collection is None:
-        return []
-    safe_limit = max(1, min(int(limit), 10_000))
-    return list(collection.find({}).sort("timestamp", DESCENDING).limit(safe_limit))
+        return _empty_page()
+    try:
+        return _keyset_page(
+            collection,
+            _log_filter(users, actions, start, end, search),
+            "timestamp",
+            after=after,
+            before=before,
+            page_size=page_size,
+            with_total=with_total,
+        )
+    except (PyMongoError, ValueError):
+        log.exception("Falha ao buscar página de logs.")
+        return _empty_page()
 
 
 def upsert_proposal(proposal_data: dict[str, Any]) -> bool:
@@ -425,6 +658,7 @@ def upsert_proposal(proposal_data: dict[str, Any]) -> bool:
             },
             upsert=True,
         )
+        _clear_proposal_cache()
         return True
     except (PyMongoError, TypeError, ValueError):
         log.exception("Falha ao salvar proposta.")
@@ -486,17 +720,52 @@ def create_pj_proposal(proposal_data: dict[str, Any]) -> str | None:
                 )
 
         collection.insert_one(document)
+        _clear_proposal_cache()
         return str(proposal_id)
     except (PyMongoError, TypeError, ValueError):
         log.exception("Falha ao criar proposta PJ com aprovação.")
         return None
 
 
+# Campos de cada visão das propostas. Listagens nunca trazem os itens, o
+# contexto do documento nem o histórico de aprovação; o detalhe e o documento
+# são buscados por proposta selecionada.
+PROPOSAL_LIST_FIELDS = (
+    "proposal_code",
+    "data_geracao",
+    "empresa",
+    "consultor",
+    "tipo",
+    "status",
+    "valor_total",
+    "receita_total",
+    "margem_total",
+    "margem_percentual",
+    "quantidade_veiculos",
+    "instalacao",
+)
+PROPOSAL_VIEWS: dict[str, dict[str, int]] = {
+    "list": {field: 1 for field in PROPOSAL_LIST_FIELDS},
+    "detail": {"document_context": 0, "approval_history": 0},
+    "document": {"proposal_code": 1, "empresa": 1, "status": 1, "document_context": 1},
+}
+
+
+def _proposal_projection(view: str, projection: dict[str, Any] | None) -> dict[str, Any]:
+    if projection is not None:
+        return projection
+    if view not in PROPOSAL_VIEWS:
+        raise ValueError(f"Visão de proposta desconhecida: {view}")
+    return PROPOSAL_VIEWS[view]
+
+
 def get_commercial_proposals(
     *,
     status: str | None = None,
     submitted_by_username: str | None = None,
     limit: int = 5_000,
+    view: str = "list",
+    projection: dict[str, Any] | None = None,
 ) -> list[dict[str, Any]]:
     collection = get_collection("proposals")
     if collection is None:
@@ -512,15 +781,24 @@ def get_commercial_proposals(
         query["submitted_by_username"] = submitted_by_username.strip().lower()
 
     safe_limit = max(1, min(int(limit), 20_000))
-    return list(collection.find(query).sort("data_geracao", DESCENDING).limit(safe_limit))
+    cursor = collection.find(query, _proposal_projection(view, projection))
+    return list(cursor.sort("data_geracao", DESCENDING).limit(safe_limit))
 
 
-def get_commercial_proposal(proposal_id: str) -> dict[str, Any] | None:
+def get_commercial_proposal(
+    proposal_id: str,
+    *,
+    view: str = "detail",
+    projection: dict[str, Any] | None = None,
+) -> dict[str, Any] | None:
     collection = get_collection("proposals")
     if collection is None:
         return None
     try:
-        return collection.find_one({"_id": ObjectId(proposal_id), "approval_workflow_version": 1})
+        return collection.find_one(
+            {"_id": ObjectId(proposal_id), "approval_workflow_version": 1},
+            _proposal_projection(view, projection),
+        )
     except (PyMongoError, ValueError):
         return None
 
@@ -579,7 +857,10 @@ def decide_commercial_proposal(
                 },
             },
         )
-        return result.modified_count == 1
+        if result.modified_count != 1:
+            return False
+        _clear_proposal_cache()
+        return True
     except (PyMongoError, ValueError):
         log.exception("Falha ao decidir proposta comercial.")
         return False
@@ -601,16 +882,42 @@ def log_proposal(proposal_data: dict[str, Any]) -> bool:
     return upsert_proposal(proposal_data)
 
 
-def get_all_proposals(limit: int = 5_000) -> list[dict[str, Any]]:
+def get_all_proposals(
+    limit: int = 5_000,
+    *,
+    view: str = "list",
+    projection: dict[str, Any] | None = None,
+) -> list[dict[str, Any]]:
     collection = get_collection("proposals")
     if collection is None:
         return []
     safe_limit = max(1, min(int(limit), 20_000))
-    return list(collection.find({}).sort("data_geracao", DESCENDING).limit(safe_limit))
+    cursor = collection.find({}, _proposal_projection(view, projection))
+    return list(cursor.sort("data_geracao", DESCENDING).limit(safe_limit))
+
+
+def get_recent_proposals(limit: int = 10, *, view: str = "list") -> list[dict[str, Any]]:
+    return get_all_proposals(limit=limit, view=view)
 
 
-def get_recent_proposals(limit: int = 10) -> list[dict[str, Any]]:
-    return get_all_proposals(limit=limit)
+def search_proposals(term: str, limit: int = 20) -> list[dict[str, Any]]:
+    """Propostas pelo ID ou por parte do cliente, do consultor ou do código, mais recentes primeiro."""
+    collection = get_collection("proposals")
+    term = term.strip()
+    if collection is None or not term:
+        return []
+    if ObjectId.is_valid(term):
+        query: dict[str, Any] = {"_id": ObjectId(term)}
+    else:
+        pattern = {"$regex": re.escape(term), "$options": "i"}
+        query = {"$or": [{"empresa": pattern}, {"consultor": pattern}, {"proposal_code": pattern}]}
+    safe_limit = max(1, min(int(limit), 200))
+    try:
+        cursor = collection.find(query, PROPOSAL_VIEWS["list"])
+        return list(cursor.sort("data_geracao", DESCENDING).limit(safe_limit))
+    except PyMongoError:
+        log.exception("Falha ao pesquisar propostas.")
+        return []
 
 
 def delete_proposal(proposal_id: str) -> bool:
@@ -618,7 +925,10 @@ def delete_proposal(proposal_id: str) -> bool:
     if collection is None:
         return False
     try:
-        return collection.delete_one({"_id": ObjectId(proposal_id)}).deleted_count > 0
+        if collection.delete_one({"_id": ObjectId(proposal_id)}).deleted_count == 0:
+            return False
+        _clear_proposal_cache()
+        return True
     except (PyMongoError, ValueError):
         log.exception("Falha ao excluir proposta.")
         return False
@@ -650,6 +960,231 @@ def get_dashboard_summary() -> dict[str, Any]:
     }
 
 
+# Valor exibido pelo dashboard quando o campo não existe na proposta.
+PROPOSAL_FALLBACKS = {"consultor": "Não informado", "tipo": "Não informado", "empresa": "Não informado", "status": "legacy"}
+_PROPOSAL_VALUE = {"$convert": {"input": "$valor_total", "to": "double", "onError": 0.0, "onNull": 0.0}}
+PROPOSAL_HISTORY_FIELDS = ("data_geracao", "consultor", "empresa", "tipo", "status", "valor_total")
+
+
+def _proposal_field(field: str) -> dict[str, Any]:
+    return {"$ifNull": [f"${field}", PROPOSAL_FALLBACKS[field]]}
+
+
+def _proposal_filter(
+    consultants: Iterable[str] | None,
+    types: Iterable[str] | None,
+    statuses: Iterable[str] | None,
+    start: date | None,
+    end: date | None,
+) -> dict[str, Any]:
+    """Filtro do dashboard; selecionar o valor padrão inclui as propostas sem o campo."""
+    period: dict[str, Any] = {"$type": "date"}
+    if start is not None:
+        period["$gte"] = datetime.combine(start, time.min)
+    if end is not None:
+        period["$lte"] = datetime.combine(end, time.max)
+    query: dict[str, Any] = {"data_geracao": period}
+    for field, values in (("consultor", consultants), ("tipo", types), ("status", statuses)):
+        if values is None:
+            continue
+        selected: list[Any] = list(values)
+        if PROPOSAL_FALLBACKS[field] in selected:
+            selected.append(None)
+        query[field] = {"$in": selected}
+    return query
+
+
+def _normalize_proposal_dates(collection: Collection) -> int:
+    """Grava como data o ``data_geracao`` das propostas que o trazem em texto.
+
+    O dashboard filtra e pagina pelo índice de datas, que só ordena datas. O
+    texto é interpretado como o dashboard anterior fazia (``pd.to_datetime``);
+    o que não for data fica como está, fora do dashboard, como antes.
+    """
+    operations = []
+    for item in collection.find({"data_geracao": {"$type": "string"}}, {"data_geracao": 1}):
+        parsed = pd.to_datetime(item["data_geracao"], errors="coerce")
+        if pd.notna(parsed):
+            operations.append(
+                UpdateOne(
+                    {"_id": item["_id"], "data_geracao": item["data_geracao"]},
+                    {"$set": {"data_geracao": parsed.to_pydatetime()}},
+                )
+            )
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+        log.info("%d propostas com data em texto convertidas para data.", len(operations))
+    return len(operations)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_proposal_filter_options() -> dict[str, Any]:
+    """Valores distintos e intervalo de datas para os filtros do dashboard."""
+    collection = get_collection("proposals")
+    if collection is None:
+        return {}
+    try:
+        if _normalize_proposal_dates(collection):
+            get_proposal_rollups.clear()
+            get_proposal_history.clear()
+    except PyMongoError:
+        log.exception("Falha ao converter as datas em texto das propostas.")
+    pipeline = [
+        {"$match": {"data_geracao": {"$type": "date"}}},
+        {
+            "$group": {
+                "_id": None,
+                "consultores": {"$addToSet": _proposal_field("consultor")},
+                "tipos": {"$addToSet": _proposal_field("tipo")},
+                "status": {"$addToSet": _proposal_field("status")},
+                "inicio": {"$min": "$data_geracao"},
+                "fim": {"$max": "$data_geracao"},
+            }
+        },
+    ]
+    try:
+        aggregated = list(collection.aggregate(pipeline))
+    except PyMongoError:
+        log.exception("Falha ao buscar os filtros do dashboard de propostas.")
+        return {}
+    if not aggregated:
+        return {}
+    options = aggregated[0]
+    return {
+        "consultores": sorted(str(value) for value in options["consultores"]),
+        "tipos": sorted(str(value) for value in options["tipos"]),
+        "status": sorted(str(value) for value in options["status"]),
+        "inicio": options["inicio"].date(),
+        "fim": options["fim"].date(),
+    }
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_proposal_rollups(
+    consultants: tuple[str, ...],
+    types: tuple[str, ...],
+    statuses: tuple[str, ...],
+    start: date | None = None,
+    end: date | None = None,
+) -> dict[str, Any]:
+    """Totais, valor por mês, por status e por consultor das propostas filtradas.
+
+    Tudo é agrupado no MongoDB em uma única agregação; só os totais trafegam.
+    """
+    empty = {"totals": {"propostas": 0, "valor_total": 0.0, "pendentes": 0}, "monthly": [], "by_status": [], "by_consultant": []}
+    collection = get_collection("proposals")
+    if collection is None:
+        return empty
+    pipeline = [
+        {"$match": _proposal_filter(consultants, types, statuses, start, end)},
+        {
+            "$project": {
+                "_id": 0,
+                "mes": {"$dateToString": {"format": "%Y-%m", "date": "$data_geracao"}},
+                "consultor": _proposal_field("consultor"),
+                "status": _proposal_field("status"),
+                "valor_total": _PROPOSAL_VALUE,
+                "pendente": {"$cond": [{"$eq": ["$status", "pending_approval"]}, 1, 0]},
+            }
+        },
+        {
+            "$facet": {
+                "totals": [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "propostas": {"$sum": 1},
+                            "valor_total": {"$sum": "$valor_total"},
+                            "pendentes": {"$sum": "$pendente"},
+                        }
+                    }
+                ],
+                "monthly": [
+                    {"$group": {"_id": "$mes", "valor_total": {"$sum": "$valor_total"}}},
+                    {"$sort": {"_id": 1}},
+                ],
+                "by_status": [
+                    {"$group": {"_id": "$status", "valor_total": {"$sum": "$valor_total"}}},
+                    {"$sort": {"_id": 1}},
+                ],
+                "by_consultant": [
+                    {
+                        "$group": {
+                            "_id": "$consultor",
+                            "propostas": {"$sum": 1},
+                            "valor_total": {"$sum": "$valor_total"},
+                            "ticket_medio": {"$avg": "$valor_total"},
+                            "pendentes": {"$sum": "$pendente"},
+                        }
+                    },
+                    {"$sort": {"valor_total": -1, "_id": 1}},
+                ],
+            }
+        },
+    ]
+    try:
+        facets = next(collection.aggregate(pipeline), {})
+    except PyMongoError:
+        log.exception("Falha ao agregar o dashboard de propostas.")
+        return empty
+    totals = (facets.get("totals") or [{}])[0]
+    return {
+        "totals": {
+            "propostas": int(totals.get("propostas", 0)),
+            "valor_total": float(totals.get("valor_total", 0.0)),
+            "pendentes": int(totals.get("pendentes", 0)),
+        },
+        "monthly": [{"mes": item["_id"], "valor_total": item["valor_total"]} for item in facets.get("monthly", [])],
+        "by_status": [{"status": item["_id"], "valor_total": item["valor_total"]} for item in facets.get("by_status", [])],
+        "by_consultant": [
+            {"consultor": item.pop("_id"), **item} for item in facets.get("by_consultant", [])
+        ],
+    }
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_proposal_history(
+    consultants: tuple[str, ...],
+    types: tuple[str, ...],
+    statuses: tuple[str, ...],
+    start: date | None = None,
+    end: date | None = None,
+    *,
+    after: str | None = None,
+    before: str | None = None,
+    page_size: int = 50,
+) -> dict[str, Any]:
+    """Uma página do histórico filtrado, mais recente primeiro, só com os campos da tabela."""
+    collection = get_collection("proposals")
+    if collection is None:
+        return _empty_page()
+    projection = {field: 1 for field in PROPOSAL_HISTORY_FIELDS}
+    try:
+        page = _keyset_page(
+            collection,
+            _proposal_filter(consultants, types, statuses, start, end),
+            "data_geracao",
+            after=after,
+            before=before,
+            page_size=page_size,
+            projection=projection,
+        )
+    except (PyMongoError, ValueError):
+        log.exception("Falha ao buscar o histórico de propostas.")
+        return _empty_page()
+    page["items"] = [
+        {**PROPOSAL_FALLBACKS, **{key: value for key, value in item.items() if value is not None}, "_id": str(item["_id"])}
+        for item in page["items"]
+    ]
+    return page
+
+
+def _clear_proposal_cache() -> None:
+    get_proposal_filter_options.clear()
+    get_proposal_rollups.clear()
+    get_proposal_history.clear()
+
+
 def log_faturamento(faturamento_data: dict[str, Any]) -> bool:
     collection = get_collection("billing_history")
     if collection is None:
@@ -670,11 +1205,32 @@ def log_faturamento(faturamento_data: dict[str, Any]) -> bool:
         return False
 
 
-def get_billing_history(limit: int = 5_000) -> list[dict[str, Any]]:
+def get_billing_history_page(
+    *,
+    after: str | None = None,
+    before: str | None = None,
+    page_size: int = 200,
+    projection: dict[str, Any] | None = None,
+    with_total: bool = False,
+) -> dict[str, Any]:
+    """Uma página do histórico de faturamento, mais recente primeiro, sem limite total de registros."""
     collection = get_collection("billing_history")
     if collection is None:
-        return []
-    return list(collection.find({}).sort("data_geracao", DESCENDING).limit(max(1, min(limit, 20_000))))
+        return _empty_page()
+    try:
+        return _keyset_page(
+            collection,
+            {},
+            "data_geracao",
+            after=after,
+            before=before,
+            page_size=page_size,
+            projection=projection,
+            with_total=with_total,
+        )
+    except (PyMongoError, ValueError):
+        log.exception("Falha ao buscar página do histórico de faturamento.")
+        return _empty_page()
 
 
 def delete_billing_history(history_id: str) -> bool:
@@ -688,6 +1244,467 @@ def delete_billing_history(history_id: str) -> bool:
         return False
 
 
+def _refresh_journey_driver_months(period_key: str, drivers: list[str]) -> None:
+    """Recalcula no MongoDB os totais mensais dos motoristas alterados."""
+    collection = get_collection("journey_days")
+    if collection is None or not drivers:
+        return
+    collection.aggregate(
+        [
+            {"$match": {"periodo": period_key, "motorista": {"$in": drivers}}},
+            {
+                "$group": {
+                    "_id": {"motorista": "$motorista", "periodo": "$periodo"},
+                    "dias": {"$sum": 1},
+                    "criticas": {"$sum": {"$cond": ["$tem_critica", 1, 0]}},
+                    "atencao": {"$sum": {"$cond": ["$tem_atencao", 1, 0]}},
+                    "conducao_continua_max_min": {"$max": "$conducao_continua_min"},
+                    "jornada_media_min": {"$avg": "$jornada_total_min"},
+                }
+            },
+            {
+                "$project": {
+                    "_id": 0,
+                    "motorista": "$_id.motorista",
+                    "periodo": "$_id.periodo",
+                    "dias": 1,
+                    "criticas": 1,
+                    "atencao": 1,
+                    "conducao_continua_max_min": 1,
+                    "jornada_media_min": 1,
+                    "updated_at": "$$NOW",
+                }
+            },
+            {
+                "$merge": {
+                    "into": "journey_driver_months",
+                    "on": ["motorista", "periodo"],
+                    "whenMatched": "replace",
+                    "whenNotMatched": "insert",
+                }
+            },
+        ]
+    )
+
+
+def save_journey_days(period_key: str, documents: list[dict[str, Any]]) -> dict[str, int] | None:
+    """Grava o histórico de jornada regravando somente os dias alterados.
+
+    Os documentos vêm de ``app_core.journey.journey_day_documents``; dias cujo
+    ``row_hash`` já está salvo não geram escrita. Retorna as contagens de
+    inseridos, atualizados e inalterados, ou ``None`` em caso de falha.
+    """
+    collection = get_collection("journey_days")
+    if collection is None or not period_key:
+        return None
+
+    drivers = sorted({str(document["motorista"]) for document in documents})
+    try:
+        existing = {
+            (item["motorista"], item["dia"]): item.get("row_hash")
+            for item in collection.find(
+                {"periodo": period_key, "motorista": {"$in": drivers}},
+                {"_id": 0, "motorista": 1, "dia": 1, "row_hash": 1},
+            )
+        }
+        now = datetime.now()
+        counts = {"inseridos": 0, "atualizados": 0, "inalterados": 0}
+        changed_drivers: set[str] = set()
+        operations: list[UpdateOne] = []
+        for document in documents:
+            key = (document["motorista"], document["dia"])
+            if key in existing and existing[key] == document["row_hash"]:
+                counts["inalterados"] += 1
+                continue
+            counts["atualizados" if key in existing else "inseridos"] += 1
+            changed_drivers.add(document["motorista"])
+            operations.append(
+                UpdateOne(
+                    {"motorista": document["motorista"], "periodo": period_key, "dia": document["dia"]},
+                    {
+                        "$set": {**document, "periodo": period_key, "updated_at": now},
+                        "$setOnInsert": {"created_at": now},
+                    },
+                    upsert=True,
+                )
+            )
+
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+            _refresh_journey_driver_months(period_key, sorted(changed_drivers))
+            get_journey_driver_months.clear()
+        return counts
+    except PyMongoError:
+        log.exception("Falha ao salvar histórico de jornada.")
+        return None
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_journey_driver_months(drivers: tuple[str, ...] = (), limit: int = 5_000) -> list[dict[str, Any]]:
+    """Totais mensais pré-agregados por motorista, do período mais antigo ao mais recente."""
+    collection = get_collection("journey_driver_months")
+    if collection is None:
+        return []
+    query: dict[str, Any] = {"motorista": {"$in": list(drivers)}} if drivers else {}
+    safe_limit = max(1, min(int(limit), 20_000))
+    cursor = collection.find(query, {"_id": 0}).sort("periodo", DESCENDING).limit(safe_limit)
+    return sorted(cursor, key=lambda item: (item.get("periodo", ""), item.get("motorista", "")))
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_terminal_snapshots(clients: tuple[str, ...]) -> list[dict[str, Any]]:
+    """Último status gravado de cada terminal dos clientes informados."""
+    collection = get_collection("terminal_snapshots")
+    if collection is None or not clients:
+        return []
+    projection = {"_id": 0, "cliente": 1, "terminal": 1, "status": 1, "row_hash": 1}
+    return list(collection.find({"cliente": {"$in": list(clients)}}, projection))
+
+
+def save_terminal_snapshot(client_name: str, documents: list[dict[str, Any]]) -> dict[str, int] | None:
+    """Substitui o snapshot do cliente gravando somente os terminais alterados.
+
+    Terminais ausentes da nova carga saem do snapshot. A data da última
+    transmissão é atualizada sem contar como alteração. Relatórios sem
+    cliente identificado não são gravados: todos dividiriam o mesmo snapshot.
+    Retorna as contagens de inseridos, atualizados, inalterados e removidos,
+    ou ``None`` em falha.
+    """
+    collection = get_collection("terminal_snapshots")
+    if collection is None or not client_name or client_name == UNKNOWN_CLIENT:
+        return None
+
+    try:
+        existing = {
+            item["terminal"]: item
+            for item in collection.find(
+                {"cliente": client_name}, {"_id": 0, "terminal": 1, "row_hash": 1, "data_transmissao": 1}
+            )
+        }
+        now = datetime.now()
+        counts = {"inseridos": 0, "atualizados": 0, "inalterados": 0, "removidos": 0}
+        operations: list[UpdateOne] = []
+        for document in documents:
+            terminal = document["terminal"]
+            previous = existing.get(terminal)
+            if previous is not None and previous.get("row_hash") == document["row_hash"]:
+                counts["inalterados"] += 1
+                if previous.get("data_transmissao") != document["data_transmissao"]:
+                    operations.append(
+                        UpdateOne(
+                            {"cliente": client_name, "terminal": terminal},
+                            {"$set": {"data_transmissao": document["data_transmissao"]}},
+                        )
+                    )
+                continue
+            counts["atualizados" if terminal in existing else "inseridos"] += 1
+            operations.append(
+                UpdateOne(
+                    {"cliente": client_name, "terminal": terminal},
+                    {"$set": {**document, "cliente": client_name, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+                    upsert=True,
+                )
+            )
+
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+        removed = set(existing) - {document["terminal"] for document in documents}
+        if removed:
+            counts["removidos"] = collection.delete_many({"cliente": client_name, "terminal": {"$in": sorted(removed)}}).deleted_count
+        if counts["inseridos"] or counts["atualizados"] or removed:
+            get_terminal_snapshots.clear()
+            get_terminal_fleet_summary.clear()
+        return counts
+    except PyMongoError:
+        log.exception("Falha ao salvar snapshot de terminais.")
+        return None
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_terminal_fleet_summary() -> list[dict[str, Any]]:
+    """Totais por cliente a partir dos snapshots, para o painel de frotas."""
+    collection = get_collection("terminal_snapshots")
+    if collection is None:
+        return []
+    pipeline = [
+        {
+            "$group": {
+                "_id": "$cliente",
+                "terminais": {"$sum": 1},
+                "desatualizados": {"$sum": {"$cond": [{"$eq": ["$status", "Desatualizado"]}, 1, 0]}},
+                "ultima_alteracao": {"$max": "$updated_at"},
+            }
+        },
+        {"$project": {"_id": 0, "cliente": "$_id", "terminais": 1, "desatualizados": 1, "ultima_alteracao": 1}},
+        {"$sort": {"desatualizados": DESCENDING, "cliente": ASCENDING}},
+    ]
+    try:
+        return list(collection.aggregate(pipeline))
+    except PyMongoError:
+        log.exception("Falha ao resumir snapshots de terminais.")
+        return []
+
+
+def _bulk_write_retrying_duplicates(collection: Collection, operations: list[UpdateOne]) -> None:
+    """Executa upserts em paralelo com outras contagens.
+
+    Dois usuários podem inserir o mesmo serial ao mesmo tempo; o upsert que
+    perde a corrida falha no índice único e é repetido uma vez como atualização.
+    """
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        if not errors or any(error.get("code") != 11000 for error in errors):
+            raise
+        collection.bulk_write([operations[error["index"]] for error in errors], ordered=False)
+
+
+def sync_inventory_system(documents: list[dict[str, Any]]) -> dict[str, int] | None:
+    """Atualiza o inventário com o relatório do sistema, gravando só os seriais alterados.
+
+    Seriais que saíram do relatório continuam no inventário, marcados como
+    fora do sistema, para preservar a contagem física já registrada.
+    """
+    collection = get_collection("inventory_ledger")
+    if collection is None:
+        return None
+
+    try:
+        existing = {
+            item["serial"]: item.get("row_hash") if item.get("no_sistema") else None
+            for item in collection.find({}, {"_id": 0, "serial": 1, "row_hash": 1, "no_sistema": 1}).batch_size(10_000)
+        }
+        now = datetime.now()
+        counts = {"inseridos": 0, "atualizados": 0, "inalterados": 0, "removidos": 0}
+        operations: list[UpdateOne] = []
+        for document in documents:
+            serial = document["serial"]
+            if serial in existing and existing[serial] == document["row_hash"]:
+                counts["inalterados"] += 1
+                continue
+            counts["atualizados" if serial in existing else "inseridos"] += 1
+            operations.append(
+                UpdateOne(
+                    {"serial": serial},
+                    {"$set": {**document, "no_sistema": True, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+                    upsert=True,
+                )
+            )
+        current = {document["serial"] for document in documents}
+        for serial, row_hash in existing.items():
+            if row_hash is not None and serial not in current:
+                counts["removidos"] += 1
+                operations.append(
+                    UpdateOne(
+                        {"serial": serial},
+                        {"$set": {"no_sistema": False, "esperado": False, "row_hash": None, "updated_at": now}},
+                    )
+                )
+
+        if operations:
+            _bulk_write_retrying_duplicates(collection, operations)
+            get_inventory_locations.clear()
+        return counts
+    except PyMongoError:
+        log.exception("Falha ao sincronizar inventário com o sistema.")
+        return None
+
+
+def apply_inventory_count(location: str, serials: list[str], counted_by: str) -> dict[str, int] | None:
+    """Registra a contagem física de um local (depósito, prateleira...).
+
+    A contagem substitui a anterior do mesmo local: seriais contados passam a
+    pertencer a ele e os que estavam lá e não foram encontrados voltam a ficar
+    pendentes. Locais diferentes podem ser contados em paralelo.
+    """
+    collection = get_collection("inventory_ledger")
+    location = location.strip()
+    if collection is None or not location:
+        return None
+
+    unique_serials = list(dict.fromkeys(serials))
+    try:
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {"serial": serial},
+                {
+                    "$set": {"local": location, "contado_em": now, "contado_por": counted_by},
+                    "$setOnInsert": {"no_sistema": False, "esperado": False, "created_at": now},
+                },
+                upsert=True,
+            )
+            for serial in unique_serials
+        ]
+        if operations:
+            _bulk_write_retrying_duplicates(collection, operations)
+        released = collection.update_many(
+            {"local": location, "serial": {"$nin": unique_serials}},
+            {"$set": {"local": None, "updated_at": now}},
+        )
+        get_inventory_locations.clear()
+        return {"contados": len(operations), "liberados": released.modified_count}
+    except PyMongoError:
+        log.exception("Falha ao registrar contagem de inventário.")
+        return None
+
+
+def get_inventory_location(location: str) -> list[dict[str, Any]]:
+    collection = get_collection("inventory_ledger")
+    if collection is None:
+        return []
+    projection = {"_id": 0, "serial": 1, "no_sistema": 1, "status": 1, "modelo": 1, "local": 1}
+    return list(collection.find({"local": location}, projection).sort("serial", ASCENDING))
+
+
+def get_inventory_pending(limit: int = 50_000) -> list[dict[str, Any]]:
+    """Seriais esperados em estoque que ainda não foram contados em nenhum local."""
+    collection = get_collection("inventory_ledger")
+    if collection is None:
+        return []
+    safe_limit = max(1, min(int(limit), 200_000))
+    projection = {"_id": 0, "serial": 1, "status": 1, "modelo": 1}
+    return list(collection.find({"esperado": True, "local": None}, projection).limit(safe_limit))
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_inventory_locations() -> list[dict[str, Any]]:
+    """Resumo por local de contagem do inventário em andamento."""
+    collection = get_collection("inventory_ledger")
+    if collection is None:
+        return []
+    pipeline = [
+        {"$match": {"local": {"$ne": None}}},
+        {
+            "$group": {
+                "_id": "$local",
+                "seriais": {"$sum": 1},
+                "nao_cadastrados": {"$sum": {"$cond": ["$no_sistema", 0, 1]}},
+                "ultima_contagem": {"$max": "$contado_em"},
+                "contado_por": {"$addToSet": "$contado_por"},
+            }
+        },
+        {"$project": {"_id": 0, "local": "$_id", "seriais": 1, "nao_cadastrados": 1, "ultima_contagem": 1, "contado_por": 1}},
+        {"$sort": {"local": ASCENDING}},
+    ]
+    try:
+        return list(collection.aggregate(pipeline))
+    except PyMongoError:
+        log.exception("Falha ao resumir locais do inventário.")
+        return []
+
+
+def start_inventory_cycle() -> bool:
+    """Inicia um novo inventário: todos os seriais voltam a ficar pendentes de contagem."""
+    collection = get_collection("inventory_ledger")
+    if collection is None:
+        return False
+    try:
+        collection.delete_many({"no_sistema": False})
+        collection.update_many({"local": {"$ne": None}}, {"$set": {"local": None, "updated_at": datetime.now()}})
+        get_inventory_locations.clear()
+        return True
+    except PyMongoError:
+        log.exception("Falha ao iniciar novo inventário.")
+        return False
+
+
+def churn_storage_available() -> bool:
+    return get_collection("churn_classifications") is not None and get_collection("churn_monthly_totals") is not None
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_churn_signatures() -> dict[str, str]:
+    """Assinatura das métricas usadas na última classificação gravada de cada mês."""
+    collection = get_collection("churn_monthly_totals")
+    if collection is None:
+        return {}
+    return {item["period_key"]: item.get("signature", "") for item in collection.find({}, {"_id": 0, "period_key": 1, "signature": 1})}
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_churn_monthly_totals() -> list[dict[str, Any]]:
+    collection = get_collection("churn_monthly_totals")
+    if collection is None:
+        return []
+    return list(collection.find({}, {"_id": 0, "signature": 0}).sort("period_key", ASCENDING))
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_churn_classifications(period_key: str) -> list[dict[str, Any]]:
+    collection = get_collection("churn_classifications")
+    if collection is None or not period_key:
+        return []
+    projection = {"_id": 0, "period_key": 0, "row_hash": 0, "created_at": 0, "updated_at": 0}
+    return list(collection.find({"period_key": period_key}, projection).sort("cliente", ASCENDING))
+
+
+def _clear_churn_cache() -> None:
+    get_churn_signatures.clear()
+    get_churn_monthly_totals.clear()
+    get_churn_classifications.clear()
+
+
+def save_churn_period(period_key: str, signature: str, documents: list[dict[str, Any]], totals: dict[str, Any]) -> bool:
+    """Grava a classificação e os totais de um mês, regravando só os clientes alterados.
+
+    A assinatura é gravada por último, junto com os totais: se a gravação
+    falhar no meio, o mês continua marcado como desatualizado.
+    """
+    classifications = get_collection("churn_classifications")
+    monthly = get_collection("churn_monthly_totals")
+    if classifications is None or monthly is None or not period_key:
+        return False
+
+    try:
+        existing = {
+            item["cliente"]: item.get("row_hash")
+            for item in classifications.find({"period_key": period_key}, {"_id": 0, "cliente": 1, "row_hash": 1})
+        }
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {"period_key": period_key, "cliente": document["cliente"]},
+                {"$set": {**document, "period_key": period_key, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+                upsert=True,
+            )
+            for document in documents
+            if existing.get(document["cliente"]) != document["row_hash"]
+        ]
+        if operations:
+            classifications.bulk_write(operations, ordered=False)
+        removed = set(existing) - {document["cliente"] for document in documents}
+        if removed:
+            classifications.delete_many({"period_key": period_key, "cliente": {"$in": sorted(removed)}})
+        monthly.update_one(
+            {"period_key": period_key},
+            {"$set": {**totals, "period_key": period_key, "signature": signature, "updated_at": now}},
+            upsert=True,
+        )
+        _clear_churn_cache()
+        return True
+    except PyMongoError:
+        log.exception("Falha ao salvar a classificação de churn de %s.", period_key)
+        return False
+
+
+def delete_churn_periods(period_keys: list[str]) -> bool:
+    """Remove meses que não existem mais nas métricas financeiras."""
+    classifications = get_collection("churn_classifications")
+    monthly = get_collection("churn_monthly_totals")
+    if classifications is None or monthly is None or not period_keys:
+        return False
+    try:
+        classifications.delete_many({"period_key": {"$in": list(period_keys)}})
+        monthly.delete_many({"period_key": {"$in": list(period_keys)}})
+        _clear_churn_cache()
+        return True
+    except PyMongoError:
+        log.exception("Falha ao remover meses da classificação de churn.")
+        return False
+
+
 def get_fipe_collection() -> Collection | None:
     return get_collection("fipe_vehicles")
 